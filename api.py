@@ -1,14 +1,16 @@
 import os
 import json
+import base64
 import asyncio
 import logging
 from typing import Optional, List, Dict, Any, Union
+from uuid import uuid4
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
 import uvicorn
 
 # Load environment variables from .env file
@@ -24,9 +26,16 @@ from webui_core import (
     run_deep_search,
     list_recordings,
     close_global_browser,
+    get_browser_metrics,
+    get_current_frame_bus,
+    list_storage_profiles,
+    delete_storage_profile,
     _global_agent_state,
     _global_agent
 )
+from src.utils.research_session import validate_research_id
+from src.utils.secrets import SecretStore
+from src.browser.http_cache import validate_cache_dir
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -69,6 +78,20 @@ class ConfigModel(BaseModel):
     llm_temperature: float = 1.0
     llm_base_url: str = ""
     llm_api_key: str = ""
+    cascade_llm_provider: Optional[str] = None
+    cascade_llm_model_name: Optional[str] = None
+    cascade_llm_base_url: str = ""
+    cascade_llm_api_key: str = ""
+    cascade_deescalate_after: int = 3
+    resource_policy: str = "auto"
+    resource_allowed_domains: str = ""
+    http_cache: bool = False
+    http_cache_dir: str = "./tmp/http_cache"
+    http_cache_max_mb: int = 512
+    storage_profile: str = ""
+    use_jina_reader: bool = False
+    page_cache: bool = True
+    parallel_report_sections: bool = False
     use_own_browser: bool = False
     keep_browser_open: bool = False
     headless: bool = False
@@ -102,11 +125,13 @@ class DeepSearchRequest(BaseModel):
     research_task: str
     max_search_iterations: int = 3
     max_query_per_iteration: int = 1
+    resume_task_id: str = ""
     config: ConfigModel
 
 class DeepSearchResponse(BaseModel):
     markdown_content: str
     file_path: Optional[str] = None
+    research_id: Optional[str] = None
     status: str = "completed"
 
 class RecordingInfo(BaseModel):
@@ -117,6 +142,13 @@ class StatusResponse(BaseModel):
     status: str
     message: str
 
+def validate_config(config: ConfigModel):
+    """Reject settings that would let a client write outside the app's data directory"""
+    try:
+        validate_cache_dir(config.http_cache_dir)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Background task to run the agent
 async def run_agent_task(
     task_id: str,
@@ -149,7 +181,18 @@ async def run_agent_task(
             use_vision=config.use_vision,
             max_actions_per_step=config.max_actions_per_step,
             tool_calling_method=config.tool_calling_method,
-            chrome_cdp=""
+            chrome_cdp="",
+            cascade_llm_provider=config.cascade_llm_provider,
+            cascade_llm_model_name=config.cascade_llm_model_name,
+            cascade_llm_base_url=config.cascade_llm_base_url,
+            cascade_llm_api_key=config.cascade_llm_api_key,
+            cascade_deescalate_after=config.cascade_deescalate_after,
+            resource_policy=config.resource_policy,
+            resource_allowed_domains=config.resource_allowed_domains,
+            http_cache=config.http_cache,
+            http_cache_dir=config.http_cache_dir,
+            http_cache_max_mb=config.http_cache_max_mb,
+            storage_profile=config.storage_profile
         )
         
         # Correctly unpack all 10 values returned by run_browser_agent
@@ -202,6 +245,7 @@ async def start_agent_run(
     request: AgentRunRequest
 ):
     """Start an agent run in the background"""
+    validate_config(request.config)
     task_id = f"task_{len(running_tasks) + 1}"
     
     # Start the agent run in the background
@@ -283,13 +327,45 @@ async def stop_agent_run():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error stopping agent: {str(e)}")
 
+@app.get("/agent/live")
+async def get_agent_live_frame(after_version: int = 0, timeout: float = 10.0):
+    """
+    Latest screenshot of the current agent run.
+
+    Waits up to `timeout` seconds for a frame newer than `after_version`, pass the returned
+    X-Frame-Version header to poll for the next frame. Returns 204 if there is no new frame.
+    """
+    frame_bus = get_current_frame_bus()
+    if frame_bus is None:
+        raise HTTPException(status_code=404, detail="No agent run found")
+
+    frame = await frame_bus.wait_for_frame(after_version, timeout=min(timeout, 30.0))
+    if frame is None:
+        return Response(status_code=204)
+    return Response(
+        content=base64.b64decode(frame.data),
+        media_type=f"image/{frame.image_format}",
+        headers={
+            "X-Frame-Version": str(frame.version),
+            "X-Frame-Source": frame.source,
+            "Cache-Control": "no-store",
+        },
+    )
+
 @app.post("/deep-search/run", response_model=StatusResponse)
 async def start_deep_search(
     background_tasks: BackgroundTasks,
     request: DeepSearchRequest
 ):
     """Start a deep search in the background"""
+    validate_config(request.config)
     task_id = f"search_{len(running_tasks) + 1}"
+    # folder of the research under ./tmp/deep_research, pass it as resume_task_id to continue an interrupted run
+    research_id = request.resume_task_id or str(uuid4())
+    try:
+        validate_research_id(research_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Start the deep search in the background
     background_tasks.add_task(
@@ -298,17 +374,24 @@ async def start_deep_search(
         request.research_task,
         request.max_search_iterations,
         request.max_query_per_iteration,
-        request.config
+        request.config,
+        research_id,
+        request.resume_task_id
     )
     
-    running_tasks[task_id] = {"status": "running"}
+    running_tasks[task_id] = {"status": "running", "research_id": research_id}
     
-    return {"status": "started", "message": f"Deep search started with ID: {task_id}"}
+    return {"status": "started", "message": f"Deep search started with ID: {task_id}, research ID: {research_id}"}
 
-async def run_deep_search_background(task_id, research_task, max_search_iterations, max_query_per_iteration, config):
+async def run_deep_search_background(task_id, research_task, max_search_iterations, max_query_per_iteration, config,
+                                     research_id="", resume_task_id=""):
     """Run the deep search in the background and store the result"""
     try:
         logger.info(f"Starting deep search for task_id: {task_id}")
+
+        def on_report_progress(content):
+            running_tasks[task_id] = {"status": "running", "research_id": research_id, "partial_report": content}
+
         result = await run_deep_search(
             research_task=research_task,
             max_search_iteration_input=max_search_iterations,
@@ -322,7 +405,18 @@ async def run_deep_search_background(task_id, research_task, max_search_iteratio
             use_vision=config.use_vision,
             use_own_browser=config.use_own_browser,
             headless=config.headless,
-            chrome_cdp=""
+            chrome_cdp="",
+            resource_policy=config.resource_policy,
+            resource_allowed_domains=config.resource_allowed_domains,
+            http_cache=config.http_cache,
+            http_cache_dir=config.http_cache_dir,
+            http_cache_max_mb=config.http_cache_max_mb,
+            use_jina_reader=config.use_jina_reader,
+            page_cache=config.page_cache,
+            resume_task_id=resume_task_id,
+            research_id=research_id,
+            parallel_report_sections=config.parallel_report_sections,
+            report_callback=on_report_progress
         )
         
         # Correctly unpack all 5 values returned by run_deep_search
@@ -333,6 +427,7 @@ async def run_deep_search_background(task_id, research_task, max_search_iteratio
             "task_id": task_id,
             "markdown_content": markdown_content,
             "file_path": file_path,
+            "research_id": research_id,
             "status": "completed"
         }
     except Exception as e:
@@ -341,8 +436,9 @@ async def run_deep_search_background(task_id, research_task, max_search_iteratio
         logger.error(traceback.format_exc())
         running_tasks[task_id] = {
             "task_id": task_id,
-            "markdown_content": f"Error: {str(e)}",
+            "markdown_content": SecretStore().mask(f"Error: {str(e)}"),
             "file_path": None,
+            "research_id": research_id,
             "status": "error"
         }
 
@@ -356,8 +452,12 @@ async def get_deep_search_status(task_id: str):
         task_data = running_tasks[task_id]
         
         # If the task is just marked as running but has no other data yet
-        if isinstance(task_data, dict) and len(task_data) == 1 and "status" in task_data and task_data["status"] == "running":
-            return {"status": "running", "message": f"Task {task_id} is still initializing"}
+        if isinstance(task_data, dict) and task_data.get("status") == "running" and "markdown_content" not in task_data:
+            if task_data.get("partial_report"):
+                # the report is being written
+                return {"markdown_content": task_data["partial_report"], "research_id": task_data.get("research_id"),
+                        "status": "running"}
+            return {"status": "running", "message": f"Task {task_id} is still running, research ID: {task_data.get('research_id')}"}
         
         return task_data
     except Exception as e:
@@ -402,6 +502,25 @@ async def close_browser():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error closing browser: {str(e)}")
 
+@app.get("/metrics/browser")
+async def browser_metrics(last_samples: int = 100):
+    """Memory / page health samples of the kept open browser and the recycles they triggered"""
+    return get_browser_metrics(last_samples=last_samples)
+
+@app.get("/storage-profiles")
+async def get_storage_profiles():
+    """Saved storage profiles (logins) that agent runs can start from"""
+    return list_storage_profiles()
+
+@app.delete("/storage-profiles/{name}", response_model=StatusResponse)
+async def remove_storage_profile(name: str):
+    """Delete a storage profile, the next run using it logs in again"""
+    try:
+        delete_storage_profile(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "message": f"Storage profile {name} deleted"}
+
 @app.get("/agent/history/{filename}")
 async def get_agent_history(filename: str, path: str = "./tmp/agent_history"):
     """Get a specific agent history file"""
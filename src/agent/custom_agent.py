@@ -1,13 +1,10 @@
+import asyncio
 import json
 import logging
 import pdb
 import traceback
 from typing import Optional, Type, List, Dict, Any, Callable
-from PIL import Image, ImageDraw, ImageFont
-import os
-import base64
-import io
-import platform
+import time
 from browser_use.agent.prompts import SystemPrompt, AgentMessagePrompt
 from browser_use.agent.service import Agent
 from browser_use.agent.views import (
@@ -40,6 +37,12 @@ from src.utils.agent_state import AgentState
 
 from .custom_message_manager import CustomMessageManager
 from .custom_views import CustomAgentOutput, CustomAgentStepInfo
+from .element_pruning import ElementPruner
+from .loop_detector import LoopDetector, LOOP_HINT
+from .model_cascade import ModelCascade
+from ..utils.secrets import SecretStore
+from ..utils.frame_bus import FrameBus
+from ..utils.history_renderer import LOGO_PATH, RenderFrame, render_history, render_history_async
 
 logger = logging.getLogger(__name__)
 
@@ -90,19 +93,24 @@ class CustomAgent(Agent):
             page_extraction_llm: Optional[BaseChatModel] = None,
             planner_llm: Optional[BaseChatModel] = None,
             planner_interval: int = 1,  # Run planner every N steps
+            detect_loops: bool = True,
+            loop_detector: Optional[LoopDetector] = None,
+            cascade: Optional[ModelCascade] = None,
+            frame_bus: Optional[FrameBus] = None,
+            prune_elements: bool = True,
+            element_pruner: Optional[ElementPruner] = None,
     ):
 
-        # Load sensitive data from environment variables
-        env_sensitive_data = {}
-        for key, value in os.environ.items():
-            if key.startswith('SENSITIVE_'):
-                env_key = key.replace('SENSITIVE_', '', 1).lower()
-                env_sensitive_data[env_key] = value
-    
+        # Sensitive data from environment variables, loaded once by the secret store
+        secret_store = SecretStore()
+        # the agent's own secrets are masked until it finished its run
+        self._registered_secrets = dict(sensitive_data) if sensitive_data else None
+        secret_store.register(self._registered_secrets)
+
         # Merge environment variables with provided sensitive_data
         if sensitive_data is None:
             sensitive_data = {}
-        sensitive_data = {**env_sensitive_data, **sensitive_data}  # Provided data takes precedence
+        sensitive_data = {**secret_store.sensitive_data, **sensitive_data}  # Provided data takes precedence
 
 
         super().__init__(
@@ -149,6 +157,23 @@ class CustomAgent(Agent):
         self.extracted_content = ""
         # custom new info
         self.add_infos = add_infos
+        # loop and stall detection
+        if loop_detector is None and detect_loops:
+            loop_detector = LoopDetector()
+        self.loop_detector = loop_detector
+        self._loop_abort_reason = None
+        # why the last run stopped: done, max_steps, too_many_failures, loop_detected, stopped
+        self.stop_reason = None
+        # cheap-first model cascade, `llm` is the large model
+        self.cascade = cascade
+        # step screenshots are published here for the live views
+        self.frame_bus = frame_bus
+        # pending GIF/video rendering started at the end of `run` when generate_gif is set
+        self.history_render_task: Optional[asyncio.Task] = None
+        # offscreen / occluded elements are left out of the prompt
+        if element_pruner is None and prune_elements:
+            element_pruner = ElementPruner()
+        self.element_pruner = element_pruner
 
         self.agent_prompt_class = agent_prompt_class
         self.message_manager = CustomMessageManager(
@@ -162,7 +187,8 @@ class CustomAgent(Agent):
             max_error_length=self.max_error_length,
             max_actions_per_step=self.max_actions_per_step,
             message_context=self.message_context,
-            sensitive_data=self.sensitive_data
+            sensitive_data=self.sensitive_data,
+            element_pruner=self.element_pruner
         )
 
     def _setup_action_models(self) -> None:
@@ -224,7 +250,11 @@ class CustomAgent(Agent):
     async def get_next_action(self, input_messages: list[BaseMessage]) -> AgentOutput:
         """Get next action from LLM based on current state"""
 
-        ai_message = self.llm.invoke(input_messages)
+        llm = self.cascade.current_llm if self.cascade else self.llm
+        start_time = time.time()
+        ai_message = llm.invoke(input_messages)
+        if self.cascade:
+            self.cascade.record_call(time.time() - start_time)
         self.message_manager._add_message_with_tokens(ai_message)
 
         if hasattr(ai_message, "reasoning_content"):
@@ -237,15 +267,29 @@ class CustomAgent(Agent):
         else:
             ai_content = ai_message.content
 
-        ai_content = ai_content.replace("```json", "").replace("```", "")
-        ai_content = repair_json(ai_content)
-        parsed_json = json.loads(ai_content)
-        parsed: AgentOutput = self.AgentOutput(**parsed_json)
+        try:
+            ai_content = ai_content.replace("```json", "").replace("```", "")
+            ai_content = repair_json(ai_content)
+            parsed_json = json.loads(ai_content)
+            parsed: AgentOutput = self.AgentOutput(**parsed_json)
+        except Exception:
+            if self.cascade:
+                self.cascade.escalate("parse_error")
+            raise
 
         if parsed is None:
             logger.debug(ai_message.content)
+            if self.cascade:
+                self.cascade.escalate("parse_error")
             raise ValueError('Could not parse response.')
 
+        if self.cascade:
+            prev_action_evaluation = parsed.current_state.prev_action_evaluation
+            if "Failed" in prev_action_evaluation:
+                self.cascade.escalate("previous_action_failed")
+            elif self.n_steps > 1 and ("Unknown" in prev_action_evaluation or not parsed.action):
+                self.cascade.escalate("low_confidence")
+
         # Limit actions to maximum allowed per step
         parsed.action = parsed.action[: self.max_actions_per_step]
         self._log_response(parsed)
@@ -307,6 +351,14 @@ class CustomAgent(Agent):
             logger.debug(f'Error parsing planning analysis: {e}')
             logger.info(f'📋 Plans: {plan}')
 
+    def _needs_screenshot(self) -> bool:
+        """The state screenshot is only worth capturing if the LLM, the GIF or a live view uses it"""
+        if self.use_vision or self.generate_gif:
+            return True
+        if self.planner_llm and self.use_vision_for_planner:
+            return True
+        return bool(self.frame_bus and self.frame_bus.watched())
+
     @time_execution_async("--step")
     async def step(self, step_info: Optional[CustomAgentStepInfo] = None) -> None:
         """Execute one step of the task"""
@@ -315,9 +367,13 @@ class CustomAgent(Agent):
         model_output = None
         result: list[ActionResult] = []
         actions: list[ActionModel] = []
+        step_succeeded = False
 
         try:
+            self.browser_context.capture_screenshots = self._needs_screenshot()
             state = await self.browser_context.get_state()
+            if self.frame_bus and state.screenshot:
+                self.frame_bus.publish(state.screenshot, source="step", step=self.n_steps, url=state.url)
             self._check_if_stopped_or_paused()
 
             self.message_manager.add_state_message(state, self._last_actions, self._last_result, step_info,
@@ -366,6 +422,7 @@ class CustomAgent(Agent):
                     self.extracted_content += ret_.extracted_content
             self._last_result = result
             self._last_actions = actions
+            self._check_for_loop(state, actions, result, step_info)
             if len(result) > 0 and result[-1].is_done:
                 if not self.extracted_content:
                     self.extracted_content = step_info.memory
@@ -373,12 +430,17 @@ class CustomAgent(Agent):
                 logger.info(f"📄 Result: {result[-1].extracted_content}")
 
             self.consecutive_failures = 0
+            step_succeeded = not any(r.error for r in result)
+            if self.cascade and not step_succeeded:
+                self.cascade.escalate("action_failed")
 
         except Exception as e:
             result = await self._handle_step_error(e)
             self._last_result = result
 
         finally:
+            if self.cascade:
+                self.cascade.on_step_end(step_succeeded)
             actions = [a.model_dump(exclude_unset=True) for a in model_output.action] if model_output else []
             self.telemetry.capture(
                 AgentStepTelemetryEvent(
@@ -395,6 +457,46 @@ class CustomAgent(Agent):
             if state:
                 self._make_history_item(model_output, state, result)
 
+    def _check_for_loop(
+            self,
+            state,
+            actions: list[ActionModel],
+            result: list[ActionResult],
+            step_info: Optional[CustomAgentStepInfo] = None,
+    ) -> None:
+        """Feed the finished step into the loop detector and inject a hint or request an abort"""
+        if not self.loop_detector or not state:
+            return
+
+        made_progress = any(
+            ret_.is_done or (ret_.extracted_content and "Extracted page" in ret_.extracted_content)
+            for ret_ in result
+        )
+        status = self.loop_detector.record(
+            url=state.url,
+            element_digest=LoopDetector.element_digest(state),
+            actions=[a.model_dump(exclude_unset=True) for a in actions],
+            made_progress=made_progress,
+        )
+        if step_info is not None:
+            step_info.loop_hint = f"{LOOP_HINT} (Detected: {status.reason})" if status.is_looping else ""
+        if status.is_looping and self.cascade:
+            self.cascade.escalate("loop")
+        if status.level == 1:
+            logger.warning(f"🔁 Loop detected: {status.reason}. Injecting hint.")
+        elif status.level == 2:
+            logger.warning(f"🔁 Still looping after hint: {status.reason}.")
+            self._loop_abort_reason = status.reason
+
+    def _set_fallback_result(self, step_info: CustomAgentStepInfo) -> None:
+        """Use the collected content as final result when the task did not finish"""
+        if not self.history.history or not self.history.history[-1].result:
+            return
+        if not self.extracted_content:
+            self.history.history[-1].result[-1].extracted_content = step_info.memory
+        else:
+            self.history.history[-1].result[-1].extracted_content = self.extracted_content
+
     async def run(self, max_steps: int = 100) -> AgentHistoryList:
         """Execute the task with maximum number of steps"""
         try:
@@ -424,6 +526,11 @@ class CustomAgent(Agent):
 
             for step in range(max_steps):
                 if self._too_many_failures():
+                    self.stop_reason = "too_many_failures"
+                    break
+
+                if self._stopped:
+                    self.stop_reason = "stopped"
                     break
 
                 # 3) Do the step
@@ -437,17 +544,30 @@ class CustomAgent(Agent):
                             continue
 
                     logger.info("✅ Task completed successfully")
+                    self.stop_reason = "done"
+                    break
+
+                if self._loop_abort_reason:
+                    self.stop_reason = "loop_detected"
+                    self.loop_detector.mark_aborted(self._loop_abort_reason, step + 1, max_steps)
+                    logger.info(
+                        f"🔁 Aborting: agent is looping ({self._loop_abort_reason}). "
+                        f"Saved {self.loop_detector.stats.steps_saved} of {max_steps} steps"
+                    )
+                    self._set_fallback_result(step_info)
                     break
             else:
                 logger.info("❌ Failed to complete task in maximum steps")
-                if not self.extracted_content:
-                    self.history.history[-1].result[-1].extracted_content = step_info.memory
-                else:
-                    self.history.history[-1].result[-1].extracted_content = self.extracted_content
+                self.stop_reason = "max_steps"
+                self._set_fallback_result(step_info)
 
             return self.history
 
         finally:
+            SecretStore().unregister(self._registered_secrets)
+            self._registered_secrets = None
+            if self.cascade:
+                self.cascade.log_stats()
             self.telemetry.capture(
                 AgentEndTelemetryEvent(
                     agent_id=self.agent_id,
@@ -464,6 +584,33 @@ class CustomAgent(Agent):
             if not self.injected_browser and self.browser:
                 await self.browser.close()
 
+            if self.generate_gif:
+                output_path: str = 'agent_history.gif'
+                if isinstance(self.generate_gif, str):
+                    output_path = self.generate_gif
+                # rendered in a worker process, await `history_render_task` to get the path
+                self.history_render_task = asyncio.create_task(self.render_history(output_path=output_path))
+                self.history_render_task.add_done_callback(self._log_history_render)
+
+    @staticmethod
+    def _log_history_render(task: asyncio.Task):
+        if task.cancelled():
+            logger.warning('History rendering was cancelled')
+        elif task.exception() is not None:
+            logger.error(f'Failed to render history: {task.exception()}')
+        elif task.result():
+            logger.info(f'🎞️ History rendered to {task.result()}')
+
+    def _collect_render_frames(self) -> list[RenderFrame]:
+        """Screenshots and goals of the history, passed by reference (no decoding here)"""
+        frames = []
+        for i, item in enumerate(self.history.history, 1):
+            if not item.state.screenshot:
+                continue
+            goal_text = item.model_output.current_state.thought if item.model_output else None
+            frames.append(RenderFrame(screenshot=item.state.screenshot, step_number=i, goal_text=goal_text))
+        return frames
+
     def create_history_gif(
             self,
             output_path: str = 'agent_history.gif',
@@ -476,103 +623,54 @@ class CustomAgent(Agent):
             goal_font_size: int = 44,
             margin: int = 40,
             line_spacing: float = 1.5,
-    ) -> None:
-        """Create a GIF from the agent's history with overlaid task and goal text."""
-        if not self.history.history:
-            logger.warning('No history to create GIF from')
-            return
-
-        images = []
-        # if history is empty or first screenshot is None, we can't create a gif
+            max_frames: Optional[int] = None,
+            max_width: Optional[int] = None,
+    ) -> Optional[str]:
+        """Create a GIF (or WebP/MP4, by extension) from the agent's history, synchronously."""
         if not self.history.history or not self.history.history[0].state.screenshot:
             logger.warning('No history or first screenshot to create GIF from')
-            return
-
-        # Try to load nicer fonts
-        try:
-            # Try different font options in order of preference
-            font_options = ['Helvetica', 'Arial', 'DejaVuSans', 'Verdana']
-            font_loaded = False
-
-            for font_name in font_options:
-                try:
-                    if platform.system() == 'Windows':
-                        # Need to specify the abs font path on Windows
-                        font_name = os.path.join(os.getenv('WIN_FONT_DIR', 'C:\\Windows\\Fonts'), font_name + '.ttf')
-                    regular_font = ImageFont.truetype(font_name, font_size)
-                    title_font = ImageFont.truetype(font_name, title_font_size)
-                    goal_font = ImageFont.truetype(font_name, goal_font_size)
-                    font_loaded = True
-                    break
-                except OSError:
-                    continue
-
-            if not font_loaded:
-                raise OSError('No preferred fonts found')
-
-        except OSError:
-            regular_font = ImageFont.load_default()
-            title_font = ImageFont.load_default()
-
-            goal_font = regular_font
-
-        # Load logo if requested
-        logo = None
-        if show_logo:
-            try:
-                logo = Image.open('./static/browser-use.png')
-                # Resize logo to be small (e.g., 40px height)
-                logo_height = 150
-                aspect_ratio = logo.width / logo.height
-                logo_width = int(logo_height * aspect_ratio)
-                logo = logo.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
-            except Exception as e:
-                logger.warning(f'Could not load logo: {e}')
-
-        # Create task frame if requested
-        if show_task and self.task:
-            task_frame = self._create_task_frame(
-                self.task,
-                self.history.history[0].state.screenshot,
-                title_font,
-                regular_font,
-                logo,
-                line_spacing,
-            )
-            images.append(task_frame)
-
-        # Process each history item
-        for i, item in enumerate(self.history.history, 1):
-            if not item.state.screenshot:
-                continue
+            return None
 
-            # Convert base64 screenshot to PIL Image
-            img_data = base64.b64decode(item.state.screenshot)
-            image = Image.open(io.BytesIO(img_data))
-
-            if show_goals and item.model_output:
-                image = self._add_overlay_to_image(
-                    image=image,
-                    step_number=i,
-                    goal_text=item.model_output.current_state.thought,
-                    regular_font=regular_font,
-                    title_font=title_font,
-                    margin=margin,
-                    logo=logo,
-                )
+        return render_history(
+            self._collect_render_frames(),
+            output_path,
+            task=self.task,
+            duration=duration,
+            show_goals=show_goals,
+            show_task=show_task,
+            font_size=font_size,
+            title_font_size=title_font_size,
+            goal_font_size=goal_font_size,
+            margin=margin,
+            line_spacing=line_spacing,
+            max_frames=max_frames,
+            max_width=max_width,
+            logo_path=LOGO_PATH if show_logo else None,
+        )
 
-            images.append(image)
+    async def render_history(
+            self,
+            output_path: str = 'agent_history.gif',
+            output_format: Optional[str] = None,
+            max_frames: Optional[int] = 100,
+            max_width: Optional[int] = 1280,
+            **kwargs,
+    ) -> Optional[str]:
+        """Render the history in the render process pool and return the output path"""
+        if not self.history.history or not self.history.history[0].state.screenshot:
+            logger.warning('No history or first screenshot to render')
+            return None
 
-        if images:
-            # Save the GIF
-            images[0].save(
+        try:
+            return await render_history_async(
+                self._collect_render_frames(),
                 output_path,
-                save_all=True,
-                append_images=images[1:],
-                duration=duration,
-                loop=0,
-                optimize=False,
+                task=self.task,
+                output_format=output_format,
+                max_frames=max_frames,
+                max_width=max_width,
+                **kwargs,
             )
-            logger.info(f'Created GIF at {output_path}')
-        else:
-            logger.warning('No images found in history to create GIF')
+        except Exception as e:
+            logger.error(f'Failed to render history to {output_path}: {e}')
+            return None
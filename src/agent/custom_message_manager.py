@@ -20,6 +20,7 @@ from langchain_core.messages import (
 from langchain_openai import ChatOpenAI
 from ..utils.llm import DeepSeekR1ChatOpenAI
 from .custom_prompts import CustomAgentMessagePrompt
+from .element_pruning import ElementPruner
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +41,7 @@ class CustomMessageManager(MessageManager):
             max_actions_per_step: int = 10,
             message_context: Optional[str] = None,
             sensitive_data: Optional[Dict[str, str]] = None,
+            element_pruner: Optional[ElementPruner] = None,
     ):
         super().__init__(
             llm=llm,
@@ -56,6 +58,7 @@ class CustomMessageManager(MessageManager):
             sensitive_data=sensitive_data
         )
         self.agent_prompt_class = agent_prompt_class
+        self.element_pruner = element_pruner
         # Custom: Move Task info to state_message
         self.history = MessageHistory()
         self._add_message_with_tokens(self.system_prompt)
@@ -83,6 +86,9 @@ class CustomMessageManager(MessageManager):
     ) -> None:
         """Add browser state as human message"""
         # otherwise add state message and result to next message (which will not stay in memory)
+        prompt_kwargs = {}
+        if self.element_pruner and issubclass(self.agent_prompt_class, CustomAgentMessagePrompt):
+            prompt_kwargs['element_pruner'] = self.element_pruner
         state_message = self.agent_prompt_class(
             state,
             actions,
@@ -90,6 +96,7 @@ class CustomMessageManager(MessageManager):
             include_attributes=self.include_attributes,
             max_error_length=self.max_error_length,
             step_info=step_info,
+            **prompt_kwargs,
         ).get_user_message(use_vision)
         self._add_message_with_tokens(state_message)
     
@@ -8,6 +8,7 @@ from langchain_core.messages import HumanMessage, SystemMessage
 from datetime import datetime
 
 from .custom_views import CustomAgentStepInfo
+from .element_pruning import ElementPruner
 
 
 class CustomSystemPrompt(SystemPrompt):
@@ -124,6 +125,7 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
             include_attributes: list[str] = [],
             max_error_length: int = 400,
             step_info: Optional[CustomAgentStepInfo] = None,
+            element_pruner: Optional[ElementPruner] = None,
     ):
         super(CustomAgentMessagePrompt, self).__init__(state=state,
                                                        result=result,
@@ -132,6 +134,7 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
                                                        step_info=step_info
                                                        )
         self.actions = actions
+        self.element_pruner = element_pruner
 
     def get_user_message(self, use_vision: bool = True) -> HumanMessage:
         if self.step_info:
@@ -142,7 +145,12 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
         time_str = datetime.now().strftime("%Y-%m-%d %H:%M")
         step_info_description += f"Current date and time: {time_str}"
 
-        elements_text = self.state.element_tree.clickable_elements_to_string(include_attributes=self.include_attributes)
+        pruned = None
+        if self.element_pruner:
+            pruned = self.element_pruner.prune(self.state.element_tree, include_attributes=self.include_attributes)
+            elements_text = pruned.text
+        else:
+            elements_text = self.state.element_tree.clickable_elements_to_string(include_attributes=self.include_attributes)
 
         has_content_above = (self.state.pixels_above or 0) > 0
         has_content_below = (self.state.pixels_below or 0) > 0
@@ -162,12 +170,18 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
                 elements_text = f'{elements_text}\n[End of page]'
         else:
             elements_text = 'empty page'
+        if pruned and pruned.omitted:
+            elements_text = f'{elements_text}\n... {pruned.summary(self.element_pruner.max_viewports)} - scroll or close the dialog to see them ...'
+
+        hints = self.step_info.add_infos
+        if self.step_info.loop_hint:
+            hints = f"{hints}\n{self.step_info.loop_hint}" if hints else self.step_info.loop_hint
 
         state_description = f"""
 {step_info_description}
 1. Task: {self.step_info.task}. 
 2. Hints(Optional): 
-{self.step_info.add_infos}
+{hints}
 3. Memory: 
 {self.step_info.memory}
 4. Current url: {self.state.url}
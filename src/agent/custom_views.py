@@ -15,6 +15,7 @@ class CustomAgentStepInfo:
     memory: str
     task_progress: str
     future_plans: str
+    loop_hint: str = ""
 
 
 class CustomAgentBrain(BaseModel):
@@ -0,0 +1,215 @@
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from browser_use.dom.views import DOMBaseNode, DOMElementNode, DOMTextNode
+
+logger = logging.getLogger(__name__)
+
+# same estimate as the message manager
+CHARS_PER_TOKEN = 3
+
+DIALOG_ROLES = {"dialog", "alertdialog"}
+
+
+def _is_modal(node: DOMElementNode) -> bool:
+    """Content outside a modal dialog is inert while it is open"""
+    return node.attributes.get("aria-modal") == "true" or (node.tag_name == "dialog" and "open" in node.attributes)
+
+
+def _is_overlay(node: DOMElementNode) -> bool:
+    return _is_modal(node) or node.attributes.get("role") in DIALOG_ROLES
+
+
+@dataclass
+class PrunedElements:
+    text: str
+    total: int = 0
+    omitted_above: int = 0
+    omitted_below: int = 0
+    omitted_occluded: int = 0
+
+    @property
+    def omitted(self) -> int:
+        return self.omitted_above + self.omitted_below + self.omitted_occluded
+
+    def summary(self, max_viewports: float) -> str:
+        """One line for the prompt about what is not listed"""
+        parts = []
+        if self.omitted_above:
+            parts.append(f"{self.omitted_above} more than {max_viewports:g} viewports above")
+        if self.omitted_below:
+            parts.append(f"{self.omitted_below} more than {max_viewports:g} viewports below")
+        if self.omitted_occluded:
+            parts.append(f"{self.omitted_occluded} hidden behind a dialog")
+        return f"{self.omitted} interactive elements not listed: {', '.join(parts)}"
+
+
+@dataclass
+class ElementPruningStats:
+    states: int = 0
+    elements_total: int = 0
+    elements_omitted: int = 0
+    chars_before: int = 0
+    chars_after: int = 0
+
+    @property
+    def tokens_saved_estimate(self) -> int:
+        return (self.chars_before - self.chars_after) // CHARS_PER_TOKEN
+
+    def to_dict(self) -> dict:
+        return {
+            "states": self.states,
+            "elements_total": self.elements_total,
+            "elements_omitted": self.elements_omitted,
+            "chars_before": self.chars_before,
+            "chars_after": self.chars_after,
+            "tokens_saved_estimate": self.tokens_saved_estimate,
+        }
+
+
+class ElementPruner:
+    """
+    Drop interactive elements the agent can't use right now from the prompt.
+
+    Kept: elements within `max_viewports` viewports above or below the visible one. Dropped: elements
+    outside an open modal dialog, and elements whose box lies completely inside a visible dialog they
+    are not part of. Boxes are checked with NumPy over all elements at once. Elements in iframes have
+    coordinates relative to the iframe and are always kept. Indices are not changed, pruned elements
+    stay in the selector map.
+    """
+
+    def __init__(self, max_viewports: float = 1.0, drop_occluded: bool = True):
+        self.max_viewports = max_viewports
+        self.drop_occluded = drop_occluded
+        self.stats = ElementPruningStats()
+
+    def _collect(self, root: DOMElementNode):
+        """Element nodes with their boxes and the dialogs they are in, in document order"""
+        nodes: List[DOMElementNode] = []
+        boxes = []
+        in_iframe = []
+        inside = []  # indices of the overlays each node is in
+        overlays: List[int] = []
+        viewport = root.viewport_info
+
+        def visit(node: DOMElementNode, iframe: bool, overlay_path: tuple):
+            nonlocal viewport
+            index = len(nodes)
+            nodes.append(node)
+            coordinates = node.page_coordinates
+            if coordinates is not None:
+                boxes.append((coordinates.top_left.x, coordinates.top_left.y,
+                              coordinates.bottom_right.x, coordinates.bottom_right.y))
+            else:
+                boxes.append((np.nan, np.nan, np.nan, np.nan))
+            if viewport is None and node.viewport_info is not None and not iframe:
+                viewport = node.viewport_info
+            in_iframe.append(iframe)
+            inside.append(overlay_path)
+            if _is_overlay(node) and node.is_visible and not iframe:
+                overlay_path = overlay_path + (len(overlays),)
+                overlays.append(index)
+            for child in node.children:
+                if isinstance(child, DOMElementNode):
+                    visit(child, iframe or node.tag_name == "iframe", overlay_path)
+
+        visit(root, False, ())
+        return nodes, np.array(boxes, dtype=np.float64).reshape(-1, 4), np.array(in_iframe), inside, overlays, viewport
+
+    def _hidden(self, root: DOMElementNode):
+        """Per element node: 0 shown, 1 above, 2 below, 3 occluded"""
+        nodes, boxes, in_iframe, inside, overlays, viewport = self._collect(root)
+        hidden = np.zeros(len(nodes), dtype=np.int8)
+        if viewport is None or not len(nodes):
+            return nodes, hidden
+
+        has_box = ~np.isnan(boxes).any(axis=1) & ~in_iframe
+        band_top = viewport.scroll_y - self.max_viewports * viewport.height
+        band_bottom = viewport.scroll_y + (1 + self.max_viewports) * viewport.height
+        hidden[has_box & (boxes[:, 3] < band_top)] = 1
+        hidden[has_box & (boxes[:, 1] > band_bottom)] = 2
+
+        if self.drop_occluded and overlays:
+            # membership[i, j]: node i is inside overlay j
+            membership = np.zeros((len(nodes), len(overlays)), dtype=bool)
+            for i, path in enumerate(inside):
+                membership[i, list(path)] = True
+            membership[overlays, np.arange(len(overlays))] = True
+
+            modal = np.array([_is_modal(nodes[index]) for index in overlays])
+            occluded = np.zeros(len(nodes), dtype=bool)
+            if modal.any():
+                occluded |= ~membership[:, modal].any(axis=1) & ~in_iframe
+            overlay_boxes = boxes[overlays]
+            covered = (
+                    (boxes[:, None, 0] >= overlay_boxes[None, :, 0])
+                    & (boxes[:, None, 1] >= overlay_boxes[None, :, 1])
+                    & (boxes[:, None, 2] <= overlay_boxes[None, :, 2])
+                    & (boxes[:, None, 3] <= overlay_boxes[None, :, 3])
+            )
+            occluded |= (covered & ~membership).any(axis=1) & has_box
+            hidden[occluded & (hidden == 0)] = 3
+        return nodes, hidden
+
+    def prune(self, root: DOMElementNode, include_attributes: Optional[List[str]] = None) -> PrunedElements:
+        """Same format as `clickable_elements_to_string`, without the pruned elements and their text"""
+        include_attributes = include_attributes or []
+        nodes, hidden = self._hidden(root)
+        hidden_by_node = {id(node): int(flag) for node, flag in zip(nodes, hidden)}
+
+        result = PrunedElements(text="")
+        lines = []
+        # length of the lines left out, with their line breaks, instead of rendering the full list again
+        pruned_chars = 0
+
+        def element_line(node: DOMElementNode) -> str:
+            attributes_str = ''
+            if include_attributes:
+                attributes_str = ' ' + ' '.join(
+                    f'{key}="{value}"' for key, value in node.attributes.items() if key in include_attributes
+                )
+            return (f'[{node.highlight_index}]<{node.tag_name}{attributes_str}>'
+                    f'{node.get_all_text_till_next_clickable_element()}</{node.tag_name}>')
+
+        def process_node(node: DOMBaseNode):
+            nonlocal pruned_chars
+            if isinstance(node, DOMElementNode):
+                flag = hidden_by_node.get(id(node), 0)
+                if node.highlight_index is not None:
+                    result.total += 1
+                    if flag == 1:
+                        result.omitted_above += 1
+                    elif flag == 2:
+                        result.omitted_below += 1
+                    elif flag == 3:
+                        result.omitted_occluded += 1
+                    if flag:
+                        pruned_chars += len(element_line(node)) + 1
+                    else:
+                        lines.append(element_line(node))
+                for child in node.children:
+                    process_node(child)
+            elif isinstance(node, DOMTextNode):
+                if not node.has_parent_with_highlight_index():
+                    if hidden_by_node.get(id(node.parent), 0):
+                        pruned_chars += len(node.text) + 3
+                    else:
+                        lines.append(f'[]{node.text}')
+
+        process_node(root)
+        result.text = '\n'.join(lines)
+        if pruned_chars and not lines:
+            # no line break between kept and pruned lines
+            pruned_chars -= 1
+
+        self.stats.states += 1
+        self.stats.elements_total += result.total
+        self.stats.elements_omitted += result.omitted
+        self.stats.chars_before += len(result.text) + pruned_chars
+        self.stats.chars_after += len(result.text)
+        if result.omitted:
+            logger.debug(f"✂️ Pruned {result.omitted}/{result.total} elements, "
+                         f"{pruned_chars // CHARS_PER_TOKEN} tokens saved")
+        return result
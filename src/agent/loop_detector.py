@@ -0,0 +1,147 @@
+import hashlib
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional, Tuple
+
+from browser_use.browser.views import BrowserState
+
+logger = logging.getLogger(__name__)
+
+# (url, element digest, action digest)
+StepKey = Tuple[str, str, str]
+
+LOOP_HINT = (
+    "WARNING: You are looping. The last steps repeated the same pages and actions without making progress. "
+    "Do NOT repeat the previous actions. Try a different approach (another link, search query, tab or scroll "
+    "position), or call done with the information gathered so far if the task cannot be completed."
+)
+
+
+@dataclass
+class LoopStatus:
+    """Result of feeding one step into the loop detector"""
+
+    is_looping: bool = False
+    reason: str = ""
+    # 0: nothing detected, 1: hint should be injected, 2: run should be aborted
+    level: int = 0
+
+
+@dataclass
+class LoopDetectorStats:
+    cycles_detected: int = 0
+    no_progress_detected: int = 0
+    hints_injected: int = 0
+    aborted: bool = False
+    abort_reason: str = ""
+    aborted_at_step: Optional[int] = None
+    steps_saved: int = 0
+
+
+class LoopDetector:
+    """
+    Detect cycles and no-progress streaks over recent (url, element-digest, action) tuples.
+
+    The first detection asks the agent to inject a "you are looping" hint. If the agent keeps
+    looping for `abort_after` more flagged steps after the hint, the run should be aborted.
+    """
+
+    def __init__(
+            self,
+            window_size: int = 12,
+            max_cycle_length: int = 3,
+            min_cycle_repeats: int = 2,
+            max_no_progress_steps: int = 5,
+            abort_after: int = 2,
+    ):
+        self.window_size = window_size
+        self.max_cycle_length = max_cycle_length
+        self.min_cycle_repeats = min_cycle_repeats
+        self.max_no_progress_steps = max_no_progress_steps
+        self.abort_after = abort_after
+
+        self._history: Deque[StepKey] = deque(maxlen=window_size)
+        self._last_state_key: Optional[Tuple[str, str]] = None
+        self._no_progress_streak = 0
+        self._flagged_since_hint = 0
+        self.hint_active = False
+        self.stats = LoopDetectorStats()
+
+    @staticmethod
+    def element_digest(state: BrowserState) -> str:
+        """Cheap digest of the interactive elements of a page"""
+        hasher = hashlib.md5()
+        for index in sorted(state.selector_map.keys()):
+            node = state.selector_map[index]
+            hasher.update(f"{index}:{node.tag_name}:{node.xpath};".encode("utf-8"))
+        hasher.update(f"{state.pixels_above}:{state.pixels_below}".encode("utf-8"))
+        return hasher.hexdigest()
+
+    @staticmethod
+    def action_digest(actions: List[dict]) -> str:
+        return hashlib.md5(repr(actions).encode("utf-8")).hexdigest()
+
+    def _find_cycle(self) -> int:
+        """Return the length of a cycle repeated at the end of the window, 0 if none"""
+        history = list(self._history)
+        for cycle_len in range(1, self.max_cycle_length + 1):
+            # a single repeated step needs one more repetition to count as a loop
+            repeats = self.min_cycle_repeats + 1 if cycle_len == 1 else self.min_cycle_repeats
+            needed = cycle_len * repeats
+            if len(history) < needed:
+                continue
+            tail = history[-needed:]
+            pattern = tail[-cycle_len:]
+            if all(tail[i] == pattern[i % cycle_len] for i in range(needed)):
+                return cycle_len
+        return 0
+
+    def record(self, url: str, element_digest: str, actions: List[dict], made_progress: bool = False) -> LoopStatus:
+        """
+        Feed one finished step into the detector.
+
+        :param made_progress: True if the step produced something new (e.g. extracted content),
+            which resets the no-progress streak even if the page did not change.
+        """
+        key = (url, element_digest, self.action_digest(actions))
+        self._history.append(key)
+
+        state_key = (url, element_digest)
+        if made_progress or state_key != self._last_state_key:
+            self._no_progress_streak = 0
+        else:
+            self._no_progress_streak += 1
+        self._last_state_key = state_key
+
+        reason = ""
+        cycle_len = self._find_cycle()
+        if cycle_len:
+            self.stats.cycles_detected += 1
+            reason = f"repeated the same {cycle_len} step(s) over and over"
+        elif self._no_progress_streak >= self.max_no_progress_steps:
+            self.stats.no_progress_detected += 1
+            reason = f"no progress for {self._no_progress_streak} consecutive steps"
+
+        if not reason:
+            # the agent broke out of the loop (or never was in one)
+            self.hint_active = False
+            self._flagged_since_hint = 0
+            return LoopStatus()
+
+        if not self.hint_active:
+            self.hint_active = True
+            self._flagged_since_hint = 0
+            self.stats.hints_injected += 1
+            return LoopStatus(is_looping=True, reason=reason, level=1)
+
+        self._flagged_since_hint += 1
+        if self._flagged_since_hint >= self.abort_after:
+            return LoopStatus(is_looping=True, reason=reason, level=2)
+        return LoopStatus(is_looping=True, reason=reason, level=1)
+
+    def mark_aborted(self, reason: str, step: int, max_steps: int) -> None:
+        self.stats.aborted = True
+        self.stats.abort_reason = reason
+        self.stats.aborted_at_step = step
+        self.stats.steps_saved = max(max_steps - step, 0)
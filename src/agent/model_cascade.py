@@ -0,0 +1,129 @@
+import logging
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+logger = logging.getLogger(__name__)
+
+
+def get_model_name(llm: BaseChatModel) -> str:
+    """Best effort name of a langchain chat model"""
+    for attr in ("model_name", "model"):
+        name = getattr(llm, attr, None)
+        if isinstance(name, str) and name:
+            return name
+    return llm.__class__.__name__
+
+
+@dataclass
+class ModelUsage:
+    steps: int = 0
+    failed_steps: int = 0
+    total_latency: float = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.steps if self.steps else 0.0
+
+
+@dataclass
+class CascadeStats:
+    usage: Dict[str, ModelUsage] = field(default_factory=dict)
+    escalations: Dict[str, int] = field(default_factory=dict)
+    deescalations: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "usage": {
+                name: {**asdict(usage), "avg_latency": round(usage.avg_latency, 3)}
+                for name, usage in self.usage.items()
+            },
+            "escalations": dict(self.escalations),
+            "deescalations": self.deescalations,
+        }
+
+
+class ModelCascade:
+    """
+    Cheap-first model cascade for the agent.
+
+    Steps run on the small model by default. The cascade escalates to the large model when a response
+    cannot be parsed, the previous action failed, the agent loops or the model reports low confidence,
+    and drops back to the small model after `deescalate_after` successful steps on the large model.
+    """
+
+    def __init__(
+            self,
+            small_llm: BaseChatModel,
+            large_llm: BaseChatModel,
+            deescalate_after: int = 3,
+    ):
+        self.small_llm = small_llm
+        self.large_llm = large_llm
+        self.deescalate_after = deescalate_after
+
+        self.small_model_name = get_model_name(small_llm)
+        self.large_model_name = get_model_name(large_llm)
+        if self.small_model_name == self.large_model_name:
+            self.small_model_name += " (small)"
+            self.large_model_name += " (large)"
+
+        self.escalated = False
+        self._pending_escalation: Optional[str] = None
+        self._successful_steps_on_large = 0
+        self.stats = CascadeStats()
+
+    @property
+    def current_llm(self) -> BaseChatModel:
+        return self.large_llm if self.escalated else self.small_llm
+
+    @property
+    def current_model_name(self) -> str:
+        return self.large_model_name if self.escalated else self.small_model_name
+
+    def escalate(self, reason: str) -> None:
+        """Request the large model for the next step"""
+        if self._pending_escalation is None:
+            self._pending_escalation = reason
+
+    def record_call(self, latency: float) -> None:
+        usage = self.stats.usage.setdefault(self.current_model_name, ModelUsage())
+        usage.steps += 1
+        usage.total_latency += latency
+
+    def on_step_end(self, success: bool) -> None:
+        """Update the cascade level once a step (LLM call plus actions) has finished"""
+        if not success:
+            usage = self.stats.usage.setdefault(self.current_model_name, ModelUsage())
+            usage.failed_steps += 1
+
+        if self._pending_escalation:
+            reason = self._pending_escalation
+            self._pending_escalation = None
+            self.stats.escalations[reason] = self.stats.escalations.get(reason, 0) + 1
+            if not self.escalated:
+                logger.info(f"⬆️ Escalating to {self.large_model_name} ({reason})")
+            self.escalated = True
+            self._successful_steps_on_large = 0
+            return
+
+        if not self.escalated:
+            return
+
+        if success:
+            self._successful_steps_on_large += 1
+        else:
+            self._successful_steps_on_large = 0
+
+        if self._successful_steps_on_large >= self.deescalate_after:
+            logger.info(f"⬇️ Dropping back to {self.small_model_name} after "
+                        f"{self._successful_steps_on_large} successful steps")
+            self.escalated = False
+            self._successful_steps_on_large = 0
+            self.stats.deescalations += 1
+
+    def log_stats(self) -> None:
+        for name, usage in self.stats.usage.items():
+            logger.info(f"📊 {name}: {usage.steps} steps, {usage.failed_steps} failed, "
+                        f"avg latency {usage.avg_latency:.2f}s")
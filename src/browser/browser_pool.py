@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+from browser_use.browser.browser import BrowserConfig
+from browser_use.browser.context import BrowserContextConfig
+
+from .custom_browser import CustomBrowser
+from .custom_context import CustomBrowserContext
+from .http_cache import HttpDiskCache
+from .resource_policy import ResourcePolicy
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BrowserPoolStats:
+    browsers_launched: int = 0
+    contexts_created: int = 0
+    peak_contexts: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "browsers_launched": self.browsers_launched,
+            "contexts_created": self.contexts_created,
+            "peak_contexts": self.peak_contexts,
+        }
+
+
+class BrowserPool:
+    """
+    A few long lived browsers that hand out short lived contexts.
+
+    Launching Chromium takes seconds and hundreds of MB, a context takes milliseconds. Parallel agents
+    each get their own context (own cookies, tabs and storage) on a shared browser. At most
+    `max_contexts_per_browser` contexts run on one browser, callers wait once every browser is full.
+    Browsers are launched lazily, up to `max_browsers`, and stay open until `close`.
+    """
+
+    def __init__(
+            self,
+            browser_config: BrowserConfig = BrowserConfig(),
+            max_browsers: int = 1,
+            max_contexts_per_browser: int = 3,
+            context_config: Optional[BrowserContextConfig] = None,
+            resource_policy: Optional[ResourcePolicy] = None,
+            http_cache: Optional[HttpDiskCache] = None,
+    ):
+        self.browser_config = browser_config
+        self.max_browsers = max_browsers
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.context_config = context_config or BrowserContextConfig()
+        self.resource_policy = resource_policy
+        self.http_cache = http_cache
+
+        self.browsers: List[CustomBrowser] = []
+        self._active: Dict[int, int] = {}  # id(browser) -> open contexts
+        self._slots = asyncio.Semaphore(max_browsers * max_contexts_per_browser)
+        self._lock = asyncio.Lock()
+        self.stats = BrowserPoolStats()
+
+    @property
+    def active_contexts(self) -> int:
+        return sum(self._active.values())
+
+    async def _pick_browser(self) -> CustomBrowser:
+        async with self._lock:
+            available = [browser for browser in self.browsers
+                         if self._active[id(browser)] < self.max_contexts_per_browser]
+            if available:
+                browser = min(available, key=lambda b: self._active[id(b)])
+            else:
+                browser = CustomBrowser(config=self.browser_config)
+                # launch now, concurrent contexts on a browser that is not started yet would launch it twice
+                await browser.get_playwright_browser()
+                self.browsers.append(browser)
+                self._active[id(browser)] = 0
+                self.stats.browsers_launched += 1
+                logger.info(f"🌐 Browser pool launched browser {len(self.browsers)}/{self.max_browsers}")
+            self._active[id(browser)] += 1
+            self.stats.peak_contexts = max(self.stats.peak_contexts, self.active_contexts)
+            return browser
+
+    @asynccontextmanager
+    async def context(self) -> AsyncIterator[CustomBrowserContext]:
+        """A fresh context on one of the pooled browsers, closed on exit"""
+        async with self._slots:
+            browser = await self._pick_browser()
+            browser_context = None
+            try:
+                browser_context = await browser.new_context(
+                    config=self.context_config,
+                    resource_policy=self.resource_policy,
+                    http_cache=self.http_cache,
+                )
+                self.stats.contexts_created += 1
+                yield browser_context
+            finally:
+                if browser_context is not None:
+                    try:
+                        await browser_context.close()
+                    except Exception as e:
+                        logger.debug(f"Failed to close pooled context: {e}")
+                self._active[id(browser)] -= 1
+
+    async def close(self):
+        for browser in self.browsers:
+            await browser.close()
+        if self.browsers:
+            logger.info(f"🌐 Browser pool closed: {self.stats.browsers_launched} browser(s) served "
+                        f"{self.stats.contexts_created} contexts (peak {self.stats.peak_contexts} at once)")
+        self.browsers = []
+        self._active = {}
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Deque, List, Optional
+
+from browser_use.browser.browser import Browser
+from browser_use.browser.context import BrowserContext
+
+logger = logging.getLogger(__name__)
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a local process from /proc, None if it is not readable (remote browser, no procfs)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+@dataclass
+class BrowserHealthSample:
+    timestamp: float
+    tasks_served: int
+    process_count: int = 0
+    browser_rss_mb: Optional[float] = None
+    renderer_rss_mb: Optional[float] = None  # sum over all renderer processes
+    max_renderer_rss_mb: Optional[float] = None
+    total_rss_mb: Optional[float] = None
+    open_pages: int = 0
+    hung_pages: int = 0
+
+
+@dataclass
+class RecycleEvent:
+    timestamp: float
+    reason: str
+    tasks_served: int
+    total_rss_mb: Optional[float] = None
+
+
+@dataclass
+class SupervisorThresholds:
+    max_total_rss_mb: float = 3072
+    max_renderer_rss_mb: float = 1536
+    max_tasks: int = 100
+    max_hung_pages: int = 0
+    hung_page_timeout: float = 5.0
+
+
+class BrowserSupervisor:
+    """
+    Watch the health of a long lived browser and decide when it should be recycled.
+
+    Process ids come from CDP `SystemInfo.getProcessInfo`, their memory from /proc. Pages that don't
+    answer a trivial evaluate within `hung_page_timeout` count as hung. `check` is meant to be called
+    between runs, the caller closes the browser and reports it with `record_recycle`.
+    """
+
+    def __init__(self, thresholds: Optional[SupervisorThresholds] = None, max_samples: int = 500):
+        self.thresholds = thresholds or SupervisorThresholds()
+        self.tasks_served = 0
+        self.samples: Deque[BrowserHealthSample] = deque(maxlen=max_samples)
+        self.recycles: List[RecycleEvent] = []
+
+    def task_finished(self):
+        self.tasks_served += 1
+
+    def browser_closed(self):
+        """The browser was closed normally (not recycled), the next one starts fresh"""
+        self.tasks_served = 0
+
+    async def _process_rss(self, browser: Browser, sample: BrowserHealthSample):
+        playwright_browser = browser.playwright_browser
+        if playwright_browser is None:
+            return
+        cdp = await playwright_browser.new_browser_cdp_session()
+        try:
+            info = await cdp.send("SystemInfo.getProcessInfo")
+        finally:
+            await cdp.detach()
+
+        processes = info.get("processInfo", [])
+        sample.process_count = len(processes)
+        total = 0.0
+        renderers = []
+        for process in processes:
+            rss = read_rss_mb(process["id"])
+            if rss is None:
+                continue
+            total += rss
+            if process.get("type") == "browser":
+                sample.browser_rss_mb = round(rss, 1)
+            elif process.get("type") == "renderer":
+                renderers.append(rss)
+        if total:
+            sample.total_rss_mb = round(total, 1)
+        if renderers:
+            sample.renderer_rss_mb = round(sum(renderers), 1)
+            sample.max_renderer_rss_mb = round(max(renderers), 1)
+
+    async def _count_hung_pages(self, browser_context: BrowserContext, sample: BrowserHealthSample):
+        session = browser_context.session
+        if session is None:
+            return
+        pages = session.context.pages
+        sample.open_pages = len(pages)
+
+        async def responds(page) -> bool:
+            try:
+                await asyncio.wait_for(page.evaluate("1"), self.thresholds.hung_page_timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+            except Exception:
+                # closed or crashed pages are not hung, they are gone
+                return True
+
+        results = await asyncio.gather(*[responds(page) for page in pages])
+        sample.hung_pages = results.count(False)
+
+    async def sample(self, browser: Browser, browser_context: Optional[BrowserContext] = None) -> BrowserHealthSample:
+        sample = BrowserHealthSample(timestamp=time.time(), tasks_served=self.tasks_served)
+        try:
+            await self._process_rss(browser, sample)
+        except Exception as e:
+            logger.debug(f"Failed to read browser processes: {e}")
+        if browser_context is not None:
+            try:
+                await self._count_hung_pages(browser_context, sample)
+            except Exception as e:
+                logger.debug(f"Failed to check pages: {e}")
+        self.samples.append(sample)
+        return sample
+
+    def recycle_reason(self, sample: BrowserHealthSample) -> Optional[str]:
+        thresholds = self.thresholds
+        if sample.total_rss_mb is not None and sample.total_rss_mb > thresholds.max_total_rss_mb:
+            return f"total RSS {sample.total_rss_mb:.0f} MB > {thresholds.max_total_rss_mb:.0f} MB"
+        if sample.max_renderer_rss_mb is not None and sample.max_renderer_rss_mb > thresholds.max_renderer_rss_mb:
+            return f"renderer RSS {sample.max_renderer_rss_mb:.0f} MB > {thresholds.max_renderer_rss_mb:.0f} MB"
+        if sample.hung_pages > thresholds.max_hung_pages:
+            return f"{sample.hung_pages} hung page(s)"
+        if self.tasks_served >= thresholds.max_tasks:
+            return f"served {self.tasks_served} tasks"
+        return None
+
+    async def check(self, browser: Browser, browser_context: Optional[BrowserContext] = None) -> Optional[str]:
+        """Sample the browser and return why it should be recycled, None if it is healthy"""
+        sample = await self.sample(browser, browser_context)
+        return self.recycle_reason(sample)
+
+    def record_recycle(self, reason: str):
+        last = self.samples[-1] if self.samples else None
+        self.recycles.append(RecycleEvent(
+            timestamp=time.time(),
+            reason=reason,
+            tasks_served=self.tasks_served,
+            total_rss_mb=last.total_rss_mb if last else None,
+        ))
+        logger.info(f"♻️ Recycling browser after {self.tasks_served} tasks: {reason}")
+        self.tasks_served = 0
+
+    def metrics(self, last_samples: int = 100) -> dict:
+        samples = list(self.samples)[-last_samples:]
+        return {
+            "tasks_served": self.tasks_served,
+            "thresholds": asdict(self.thresholds),
+            "latest": asdict(samples[-1]) if samples else None,
+            "samples": [asdict(sample) for sample in samples],
+            "recycles": [asdict(event) for event in self.recycles],
+        }
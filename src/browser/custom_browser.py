@@ -1,5 +1,6 @@
 import asyncio
 import pdb
+from typing import Optional
 
 from playwright.async_api import Browser as PlaywrightBrowser
 from playwright.async_api import (
@@ -11,10 +12,11 @@ from playwright.async_api import (
 )
 from browser_use.browser.browser import Browser
 from browser_use.browser.context import BrowserContext, BrowserContextConfig
-from playwright.async_api import BrowserContext as PlaywrightBrowserContext
 import logging
 
 from .custom_context import CustomBrowserContext
+from .http_cache import HttpDiskCache
+from .resource_policy import ResourcePolicy
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,9 @@ class CustomBrowser(Browser):
 
     async def new_context(
         self,
-        config: BrowserContextConfig = BrowserContextConfig()
+        config: BrowserContextConfig = BrowserContextConfig(),
+        resource_policy: Optional[ResourcePolicy] = None,
+        http_cache: Optional[HttpDiskCache] = None
     ) -> CustomBrowserContext:
-        return CustomBrowserContext(config=config, browser=self)
+        return CustomBrowserContext(config=config, browser=self, resource_policy=resource_policy,
+                                    http_cache=http_cache)
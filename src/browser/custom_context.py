@@ -1,19 +1,369 @@
+import asyncio
 import json
 import logging
 import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
 
 from browser_use.browser.browser import Browser
 from browser_use.browser.context import BrowserContext, BrowserContextConfig
+from browser_use.browser.views import BrowserError, BrowserState, TabInfo, URLNotAllowedError
+from browser_use.dom.service import DomService
+from browser_use.dom.views import DOMState
 from playwright.async_api import Browser as PlaywrightBrowser
 from playwright.async_api import BrowserContext as PlaywrightBrowserContext
+from playwright.async_api import Page, Route
+
+from .dom_cache import (
+    DOM_WATCH_JS,
+    REMEMBER_HIGHLIGHTS_JS,
+    RESTORE_HIGHLIGHTS_JS,
+    CachedDomState,
+    DomCacheStats,
+    get_dom_cache_key,
+)
+from .http_cache import HttpDiskCache, resolve_failed_route
+from .page_settle import PageSettleDetector, SettleStats
+from .resource_policy import ResourcePolicy
+from .storage_profiles import find_login_wall, is_profile_site
 
 logger = logging.getLogger(__name__)
 
+SCROLL_INFO_JS = """
+() => [window.scrollY, window.innerHeight, document.documentElement.scrollHeight]
+"""
+
+
+@dataclass
+class StateCaptureStats:
+    captures: int = 0
+    total_time: float = 0.0
+    part_times: Dict[str, float] = field(default_factory=dict)  # summed per part
+    part_counts: Dict[str, int] = field(default_factory=dict)
+    screenshots_skipped: int = 0
+
+    def record(self, timings: Dict[str, float]):
+        self.captures += 1
+        self.total_time += timings.get("total", 0.0)
+        for part, seconds in timings.items():
+            if part != "total":
+                self.part_times[part] = self.part_times.get(part, 0.0) + seconds
+                self.part_counts[part] = self.part_counts.get(part, 0) + 1
+
+    def to_dict(self) -> dict:
+        return {
+            "captures": self.captures,
+            "average_time": round(self.total_time / self.captures, 3) if self.captures else 0.0,
+            "average_part_times": {part: round(seconds / self.part_counts[part], 3)
+                                   for part, seconds in self.part_times.items()},
+            "screenshots_skipped": self.screenshots_skipped,
+        }
+
+
+@dataclass
+class CustomBrowserContextConfig(BrowserContextConfig):
+    """
+    storage_state: None
+        Playwright storage state (dict or path) the context starts with, e.g. a saved storage profile.
+        Ignored when an existing context is reused (cdp / own chrome instance), it has its own state.
+
+    settle_detection: True
+        Wait until requests, DOM and screenshots stopped changing for minimum_wait_page_load_time
+        (at most maximum_wait_page_load_time) instead of waiting for network idle plus a fixed time.
+        Pages that keep changing once their requests finished (carousels, tickers) are given up on after
+        wait_for_network_idle_page_load_time + minimum_wait_page_load_time, the old fixed wait.
+
+    settle_visual_check: True
+        Also compare downscaled screenshots, catches animations and late rendering
+    """
+
+    storage_state: Optional[Union[str, Dict]] = None
+    settle_detection: bool = True
+    settle_visual_check: bool = True
+
+
+class _StorageStateBrowser:
+    """Playwright browser whose new_context starts from a storage state"""
+
+    def __init__(self, browser: PlaywrightBrowser, storage_state: Union[str, Dict]):
+        self._browser = browser
+        self._storage_state = storage_state
+
+    def __getattr__(self, name):
+        return getattr(self._browser, name)
+
+    async def new_context(self, **kwargs) -> PlaywrightBrowserContext:
+        return await self._browser.new_context(storage_state=self._storage_state, **kwargs)
+
 
 class CustomBrowserContext(BrowserContext):
     def __init__(
         self,
         browser: "Browser",
-        config: BrowserContextConfig = BrowserContextConfig()
+        config: BrowserContextConfig = BrowserContextConfig(),
+        resource_policy: Optional[ResourcePolicy] = None,
+        http_cache: Optional[HttpDiskCache] = None,
+        dom_cache: bool = True,
+    ):
+        super(CustomBrowserContext, self).__init__(browser=browser, config=config)
+        self.resource_policy = resource_policy
+        self.http_cache = http_cache
+        # the playwright context our route handler is registered on
+        self._routed_context: Optional[PlaywrightBrowserContext] = None
+        # reuse the extracted DOM while the page did not change
+        self.dom_cache = dom_cache
+        self.dom_cache_stats = DomCacheStats()
+        self._cached_dom: Optional[CachedDomState] = None
+        # sites of the storage profile used by this run, a login wall on one of them means the profile is stale
+        self.login_wall_sites: List[str] = []
+        self.login_wall: Optional[str] = None
+        self.settle_stats = SettleStats()
+        # the agent turns this off when nothing looks at the screenshot (no vision, no GIF, no live view)
+        self.capture_screenshots = True
+        # seconds per part of the last state capture, they run concurrently so they don't add up to "total"
+        self.last_state_timings: Dict[str, float] = {}
+        self.state_capture_stats = StateCaptureStats()
+
+    async def _create_context(self, browser: PlaywrightBrowser) -> PlaywrightBrowserContext:
+        storage_state = getattr(self.config, "storage_state", None)
+        if storage_state:
+            # BrowserContext._create_context has no hook for new_context arguments
+            browser = _StorageStateBrowser(browser, storage_state)
+        context = await super()._create_context(browser)
+        if self.dom_cache:
+            await context.add_init_script(DOM_WATCH_JS)
+        await self._update_route(context)
+        return context
+
+    @property
+    def _needs_route(self) -> bool:
+        # no route at all if nothing intercepts requests, routing disables the HTTP cache of the browser
+        return bool((self.resource_policy and self.resource_policy.is_active) or self.http_cache)
+
+    async def _handle_route(self, route: Route):
+        continued = False
+        try:
+            if self.resource_policy and await self.resource_policy.handle(route):
+                return
+            if self.http_cache and await self.http_cache.handle(route):
+                return
+            continued = True
+            await route.continue_()
+        except Exception as e:
+            # page closed while the request was in flight, or a handler failed: never leave the request hanging
+            logger.debug(f'Failed to handle request {route.request.url}: {e}')
+            await resolve_failed_route(route, abort=continued)
+
+    async def _update_route(self, context: PlaywrightBrowserContext):
+        if self._needs_route and self._routed_context is None:
+            await context.route("**/*", self._handle_route)
+            self._routed_context = context
+        elif not self._needs_route and self._routed_context is not None:
+            await self._remove_route()
+
+    async def _remove_route(self):
+        try:
+            await self._routed_context.unroute("**/*", self._handle_route)
+        except Exception as e:
+            logger.debug(f'Failed to remove route: {e}')
+        self._routed_context = None
+
+    async def set_request_handling(
+            self,
+            resource_policy: Optional[ResourcePolicy] = None,
+            http_cache: Optional[HttpDiskCache] = None,
     ):
-        super(CustomBrowserContext, self).__init__(browser=browser, config=config)
\ No newline at end of file
+        """Switch the resource policy and HTTP cache, e.g. per run on a context that is kept open"""
+        self.resource_policy = resource_policy
+        self.http_cache = http_cache
+        if self.session is not None:
+            await self._update_route(self.session.context)
+        # otherwise applied when the context is created
+
+    async def _wait_for_page_and_frames_load(self, timeout_overwrite: Optional[float] = None):
+        """Wait until the page settled, return as soon as it is stable"""
+        if not getattr(self.config, "settle_detection", True):
+            return await super()._wait_for_page_and_frames_load(timeout_overwrite)
+
+        try:
+            page = await self.get_current_page()
+            detector = PageSettleDetector(
+                page,
+                max_wait=self.config.maximum_wait_page_load_time,
+                quiet_window=timeout_overwrite or self.config.minimum_wait_page_load_time,
+                visual=getattr(self.config, "settle_visual_check", True),
+                # a page that never goes quiet costs no more than the fixed waits did
+                max_changing_wait=self.config.wait_for_network_idle_page_load_time
+                                  + self.config.minimum_wait_page_load_time,
+            )
+            result = await detector.wait()
+            self.settle_stats.record(result)
+            if result.settled:
+                logger.debug(f'Page settled in {result.elapsed:.2f}s (last change: {result.reason})')
+            elif result.changing:
+                logger.debug(f'Page still changing after {result.elapsed:.2f}s ({result.reason}), going on')
+            else:
+                logger.debug(f'Page did not settle within {result.elapsed:.2f}s ({result.reason})')
+
+            # Check if the loaded URL is allowed
+            await self._check_and_handle_navigation(page)
+        except URLNotAllowedError as e:
+            raise e
+        except Exception:
+            logger.warning('Page load failed, continuing...')
+
+    def reset_settle_stats(self):
+        self.settle_stats = SettleStats()
+
+    async def _update_state(self, focus_element: int = -1) -> BrowserState:
+        """Update and return state, the DOM extraction is skipped if the page did not change"""
+        session = await self.get_session()
+
+        # Check if current page is still valid, if not switch to another available page
+        try:
+            page = await self.get_current_page()
+            # Test if page is still accessible
+            await page.evaluate('1')
+        except Exception as e:
+            logger.debug(f'Current page is no longer accessible: {str(e)}')
+            # Get all available pages
+            pages = self._available_pages(session)
+            if pages:
+                session.current_page = pages[-1]
+                page = session.current_page
+                logger.debug(f'Switched to page: {await page.title()}')
+            else:
+                raise BrowserError('Browser closed: no valid pages available')
+
+        timings = {}
+
+        async def timed(part, coroutine):
+            start = time.monotonic()
+            try:
+                return await coroutine
+            finally:
+                timings[part] = time.monotonic() - start
+
+        async def dom_and_screenshot() -> Tuple[DOMState, Optional[str]]:
+            if not self.capture_screenshots:
+                return await timed('dom', self._get_dom_state(page, focus_element)), None
+            if self.config.highlight_elements:
+                # the screenshot shows the highlights drawn by the extraction, so it has to come after it
+                content = await timed('dom', self._get_dom_state(page, focus_element))
+                return content, await timed('screenshot', self.take_screenshot())
+            return tuple(await asyncio.gather(
+                timed('dom', self._get_dom_state(page, focus_element)),
+                timed('screenshot', self.take_screenshot()),
+            ))
+
+        start = time.monotonic()
+        try:
+            (content, screenshot_b64), (pixels_above, pixels_below), title, tabs = await asyncio.gather(
+                dom_and_screenshot(),
+                timed('scroll', self._get_scroll_info(page)),
+                timed('title', page.title()),
+                timed('tabs', self._get_tabs_info(session)),
+            )
+            if self.login_wall is None and is_profile_site(page.url, self.login_wall_sites):
+                self.login_wall = await find_login_wall(page)
+                if self.login_wall:
+                    logger.info(f'🔑 Login wall detected: {self.login_wall}')
+
+            timings['total'] = time.monotonic() - start
+            self.last_state_timings = timings
+            self.state_capture_stats.record(timings)
+            if not self.capture_screenshots:
+                self.state_capture_stats.screenshots_skipped += 1
+            logger.debug('State captured in ' + ', '.join(f'{part} {seconds:.3f}s' for part, seconds in timings.items()))
+
+            self.current_state = BrowserState(
+                element_tree=content.element_tree,
+                selector_map=content.selector_map,
+                url=page.url,
+                title=title,
+                tabs=tabs,
+                screenshot=screenshot_b64,
+                pixels_above=pixels_above,
+                pixels_below=pixels_below,
+            )
+
+            return self.current_state
+        except Exception as e:
+            logger.error(f'Failed to update state: {str(e)}')
+            # Return last known good state if available
+            if hasattr(self, 'current_state'):
+                return self.current_state
+            raise
+
+    @staticmethod
+    async def _get_scroll_info(page: Page) -> Tuple[int, int]:
+        # one round trip instead of three
+        scroll_y, viewport_height, total_height = await page.evaluate(SCROLL_INFO_JS)
+        return scroll_y, total_height - (scroll_y + viewport_height)
+
+    def _available_pages(self, session) -> List[Page]:
+        """The tabs this context works with"""
+        return session.context.pages
+
+    async def _get_tabs_info(self, session) -> List[TabInfo]:
+        pages = self._available_pages(session)
+        titles = await asyncio.gather(*[page.title() for page in pages])
+        return [TabInfo(page_id=page_id, url=page.url, title=title)
+                for page_id, (page, title) in enumerate(zip(pages, titles))]
+
+    def reset_state_capture_stats(self):
+        self.state_capture_stats = StateCaptureStats()
+
+    async def _get_dom_state(self, page: Page, focus_element: int = -1) -> DOMState:
+        # only full extractions are cached, focus_element highlights a single element before an action
+        key = None
+        if self.dom_cache and focus_element == -1:
+            try:
+                key = await get_dom_cache_key(page)
+            except Exception as e:
+                logger.debug(f'Failed to read DOM cache key: {e}')
+
+        cached = self._cached_dom
+        if key is not None and cached is not None and cached.page is page and cached.key == key:
+            # actions remove the highlights, put the same overlays back
+            if not self.config.highlight_elements or await page.evaluate(RESTORE_HIGHLIGHTS_JS):
+                self.dom_cache_stats.hits += 1
+                logger.debug(f'♻️ DOM unchanged, reusing {len(cached.dom_state.selector_map)} elements')
+                return cached.dom_state
+
+        await self.remove_highlights()
+        start = time.monotonic()
+        dom_service = DomService(page)
+        content = await dom_service.get_clickable_elements(
+            focus_element=focus_element,
+            viewport_expansion=self.config.viewport_expansion,
+            highlight_elements=self.config.highlight_elements,
+        )
+        if key is not None:
+            self.dom_cache_stats.misses += 1
+            self.dom_cache_stats.extraction_time += time.monotonic() - start
+            if self.config.highlight_elements:
+                await page.evaluate(REMEMBER_HIGHLIGHTS_JS)
+            # the key was read before the extraction, mutations during it invalidate the entry
+            self._cached_dom = CachedDomState(key=key, page=page, dom_state=content)
+        return content
+
+    def reset_dom_cache_stats(self):
+        self.dom_cache_stats = DomCacheStats()
+
+    async def close(self):
+        if self.dom_cache and self.dom_cache_stats.hits + self.dom_cache_stats.misses:
+            logger.info(f"♻️ DOM cache hit rate {self.dom_cache_stats.hit_rate:.0%} "
+                        f"({self.dom_cache_stats.hits} hits, {self.dom_cache_stats.misses} misses)")
+        self._cached_dom = None
+        if self._routed_context is not None:
+            if self.resource_policy:
+                self.resource_policy.log_stats()
+            if self.http_cache:
+                self.http_cache.log_stats()
+            if self.config._force_keep_context_alive or self.browser.config.cdp_url:
+                # the context outlives us, don't leave our route behind
+                await self._remove_route()
+            self._routed_context = None
+        await super().close()
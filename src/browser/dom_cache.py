@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from browser_use.dom.views import DOMState
+from playwright.async_api import Page
+
+HIGHLIGHT_CONTAINER_ID = "playwright-highlight-container"
+
+# Installed in every frame of every page. Counts DOM mutations (and state changes that are not
+# mutations, like typing into an input) in `window.__buDomWatch.version`. The highlight overlays of
+# browser_use are ignored, so drawing or removing them does not invalidate the cache.
+DOM_WATCH_JS = """
+(() => {
+    if (window.__buDomWatch) return;
+    const HIGHLIGHT_CONTAINER_ID = '%s';
+    const HIGHLIGHT_ATTRIBUTE = 'browser-user-highlight-id';
+    const state = {docId: Math.random().toString(36).slice(2), version: 0, highlights: null};
+    window.__buDomWatch = state;
+
+    const bump = () => {
+        state.version++;
+        try {
+            // same origin iframes also invalidate the page
+            if (window.top !== window && window.top.__buDomWatch) window.top.__buDomWatch.version++;
+        } catch (e) {}
+    };
+    const isHighlight = (node) => !!node && node.nodeType === 1 &&
+        (node.id === HIGHLIGHT_CONTAINER_ID || !!node.closest('#' + HIGHLIGHT_CONTAINER_ID));
+    const isRelevant = (mutation) => {
+        if (mutation.type === 'attributes' && mutation.attributeName === HIGHLIGHT_ATTRIBUTE) return false;
+        if (isHighlight(mutation.target)) return false;
+        if (mutation.type === 'childList') {
+            const nodes = [...mutation.addedNodes, ...mutation.removedNodes];
+            if (nodes.length && nodes.every(isHighlight)) return false;
+        }
+        return true;
+    };
+
+    new MutationObserver((mutations) => {
+        for (const mutation of mutations) {
+            if (isRelevant(mutation)) {
+                bump();
+                return;
+            }
+        }
+    }).observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+
+    // changes that are not DOM mutations: form values, hover / focus styles, inner scrolling, animations
+    for (const type of ['input', 'change', 'pointerover', 'focusin', 'scroll', 'transitionend', 'animationend']) {
+        window.addEventListener(type, bump, true);
+    }
+})();
+""" % HIGHLIGHT_CONTAINER_ID
+
+# Everything the extracted tree depends on besides the DOM itself
+DOM_CACHE_KEY_JS = """
+() => {
+    const state = window.__buDomWatch;
+    if (!state) return null;
+    return [state.docId, state.version, window.scrollX, window.scrollY, window.innerWidth, window.innerHeight];
+}
+"""
+
+# Keep a reference to the highlight overlays of a full extraction, remove_highlights only detaches them
+REMEMBER_HIGHLIGHTS_JS = """
+() => {
+    const state = window.__buDomWatch;
+    if (state) state.highlights = document.getElementById('%s');
+}
+""" % HIGHLIGHT_CONTAINER_ID
+
+# Put the remembered overlays back (e.g. after an action removed them), return false if they are gone
+RESTORE_HIGHLIGHTS_JS = """
+() => {
+    const state = window.__buDomWatch;
+    if (!state) return false;
+    const current = document.getElementById('%s');
+    if (current && current !== state.highlights) current.remove();
+    if (!state.highlights) return true;
+    if (!state.highlights.isConnected) document.body.appendChild(state.highlights);
+    return true;
+}
+""" % HIGHLIGHT_CONTAINER_ID
+
+DomCacheKey = Tuple
+
+
+@dataclass
+class DomCacheStats:
+    hits: int = 0
+    misses: int = 0
+    extraction_time: float = 0.0  # seconds spent in DOM extraction on misses
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def time_saved_estimate(self) -> float:
+        return self.hits * self.extraction_time / self.misses if self.misses else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "extraction_time": round(self.extraction_time, 3),
+            "time_saved_estimate": round(self.time_saved_estimate, 3),
+        }
+
+
+@dataclass
+class CachedDomState:
+    key: DomCacheKey
+    page: Page
+    dom_state: DOMState
+
+
+async def get_dom_cache_key(page: Page) -> Optional[DomCacheKey]:
+    """Current cache key of the page, installs the watcher if the page was opened before it was registered"""
+    key = await page.evaluate(DOM_CACHE_KEY_JS)
+    if key is None:
+        await page.evaluate(DOM_WATCH_JS)
+        return None
+    return tuple(key)
@@ -0,0 +1,302 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from playwright.async_api import Route
+
+logger = logging.getLogger(__name__)
+
+# Static assets that are worth keeping between runs. Documents and API calls are never cached.
+CACHEABLE_RESOURCE_TYPES = {"script", "stylesheet", "font", "image"}
+MAX_ENTRY_BYTES = 10 * 1024 * 1024
+# response headers that must not be replayed
+_DROPPED_HEADERS = {"set-cookie", "content-encoding", "content-length", "transfer-encoding", "connection"}
+# share of the time since Last-Modified a response without a lifetime of its own stays fresh
+HEURISTIC_FRESHNESS_FRACTION = 0.1
+
+
+def _cache_directives(cache_control: str) -> Dict[str, Optional[str]]:
+    directives = {}
+    for directive in cache_control.lower().split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            directives[name] = value.strip('" ') or None
+    return directives
+
+
+def _parse_seconds(value: Optional[str]) -> Optional[int]:
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers: Dict[str, str], heuristic_max_age: float, now: Optional[float] = None) -> float:
+    """
+    Seconds a response may be served without revalidation, 0 if it must not be stored.
+
+    Follows the response's Cache-Control max-age or Expires. A response without either gets 10% of the
+    time since its Last-Modified date, like browsers do, at most `heuristic_max_age`. We never revalidate,
+    so no-cache and must-revalidate without an explicit lifetime are not stored.
+    """
+    now = time.time() if now is None else now
+    directives = _cache_directives(headers.get("cache-control", ""))
+    if {"no-store", "no-cache", "private"} & directives.keys() or headers.get("vary", "").strip() == "*":
+        return 0
+    age = _parse_seconds(headers.get("age")) or 0
+    date = _parse_http_date(headers.get("date")) or now
+    if "max-age" in directives:
+        return max((_parse_seconds(directives["max-age"]) or 0) - age, 0)
+    if "expires" in headers:
+        # an invalid date means already expired
+        expires = _parse_http_date(headers["expires"])
+        return max(expires - date - age, 0) if expires is not None else 0
+    if "must-revalidate" in directives:
+        return 0
+    last_modified = _parse_http_date(headers.get("last-modified"))
+    if last_modified is not None:
+        return min(max((date - last_modified) * HEURISTIC_FRESHNESS_FRACTION - age, 0), heuristic_max_age)
+    return heuristic_max_age
+
+
+def vary_key(response_headers: Dict[str, str], request_headers: Dict[str, str]) -> Dict[str, str]:
+    """The request header values the response varies on"""
+    names = [name.strip().lower() for name in response_headers.get("vary", "").split(",") if name.strip()]
+    return {name: request_headers.get(name, "") for name in names}
+
+
+async def resolve_failed_route(route: Route, abort: bool = False):
+    """Let a request whose handling failed go to the network, or abort it, so the page doesn't wait for it"""
+    if not abort:
+        try:
+            await route.continue_()
+            return
+        except Exception as e:
+            logger.debug(f"Failed to continue {route.request.url}: {e}")
+    try:
+        await route.abort()
+    except Exception as e:
+        # already handled, or the page is gone
+        logger.debug(f"Failed to abort {route.request.url}: {e}")
+
+
+@dataclass
+class HttpCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stored: int = 0
+    bytes_served: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hit_ratio, 3),
+            "stored": self.stored,
+            "bytes_served": self.bytes_served,
+        }
+
+
+class HttpDiskCache:
+    """
+    On-disk cache of static GET responses shared by all browser contexts using the same directory.
+
+    Chromium's own disk cache is per profile and playwright contexts are incognito, so every new
+    context downloads the same CDN assets again. This cache is served from a route handler.
+    Entries are served while fresh by their Cache-Control or Expires headers (`max_age` for responses
+    without either) and only to requests with the same values of the headers they Vary on.
+    Entries are evicted least recently used first (by file mtime) once `max_size_mb` is exceeded.
+    """
+
+    def __init__(self, cache_dir: str = "./tmp/http_cache", max_size_mb: float = 512, max_age: float = 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age = max_age
+        os.makedirs(cache_dir, exist_ok=True)
+        self.stats = HttpCacheStats()
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def set_max_size(self, max_size_mb: float):
+        """Change the size limit, evicting entries right away if the cache is over the new one"""
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        if self._size > self.max_size_bytes:
+            self._evict()
+
+    def _paths(self, url: str) -> Tuple[str, str]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".body"), os.path.join(self.cache_dir, key + ".json")
+
+    def _entries(self):
+        """(body path, size, last use) of every entry"""
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".body"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def reset_stats(self):
+        self.stats = HttpCacheStats()
+
+    @staticmethod
+    def is_cacheable_request(route: Route) -> bool:
+        request = route.request
+        return (
+                request.method == "GET"
+                and request.resource_type in CACHEABLE_RESOURCE_TYPES
+                and request.url.startswith(("http://", "https://"))
+                and "authorization" not in request.headers
+        )
+
+    @staticmethod
+    def is_cacheable_response(status: int, headers: Dict[str, str], body: bytes) -> bool:
+        return (
+                status == 200
+                and "set-cookie" not in headers
+                and 0 < len(body) <= MAX_ENTRY_BYTES
+        )
+
+    def _read(self, url: str, request_headers: Dict[str, str]) -> Optional[Tuple[dict, bytes]]:
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("url") != url or time.time() > meta.get("expires_at", 0):
+                return None
+            vary = meta.get("vary", {})
+            if vary != {name: request_headers.get(name, "") for name in vary}:
+                return None
+            with open(body_path, "rb") as f:
+                body = f.read()
+            # LRU: the mtime is the last use
+            os.utime(body_path)
+            return meta, body
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, url: str, status: int, headers: Dict[str, str], body: bytes, lifetime: float,
+               vary: Dict[str, str]):
+        body_path, meta_path = self._paths(url)
+        stored_at = time.time()
+        headers = {name: value for name, value in headers.items() if name.lower() not in _DROPPED_HEADERS}
+        # write to temp files first, several processes may share the directory
+        suffix = f".{os.getpid()}.tmp"
+        try:
+            # the entry is overwritten, its old body no longer counts
+            old_size = os.path.getsize(body_path)
+        except OSError:
+            old_size = 0
+        with open(body_path + suffix, "wb") as f:
+            f.write(body)
+        with open(meta_path + suffix, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "status": status, "headers": headers, "stored_at": stored_at,
+                       "expires_at": stored_at + lifetime, "vary": vary}, f)
+        os.replace(body_path + suffix, body_path)
+        os.replace(meta_path + suffix, meta_path)
+        self._size += len(body) - old_size
+        if self._size > self.max_size_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Delete the least recently used entries until the cache is at 90% of its size limit"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_size_bytes * 0.9
+        removed = 0
+        for body_path, size, _ in entries:
+            if self._size <= target:
+                break
+            for path in (body_path, body_path[:-len(".body")] + ".json"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size -= size
+            removed += 1
+        logger.debug(f"HTTP cache evicted {removed} entries, {self._size / 1e6:.1f} MB left")
+
+    async def handle(self, route: Route) -> bool:
+        """Serve or fetch-and-store a cacheable request, return False if the request is not cacheable"""
+        if not self.is_cacheable_request(route):
+            return False
+        url = route.request.url
+        request_headers = await route.request.all_headers()
+
+        cached = await asyncio.to_thread(self._read, url, request_headers)
+        if cached is not None:
+            meta, body = cached
+            self.stats.hits += 1
+            self.stats.bytes_served += len(body)
+            await route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+            return True
+
+        self.stats.misses += 1
+        try:
+            response = await route.fetch()
+            body = await response.body()
+        except Exception as e:
+            # DNS or connection error, let the browser report it for the request itself
+            logger.debug(f"Failed to fetch {url}: {e}")
+            await resolve_failed_route(route)
+            return True
+        lifetime = freshness_lifetime(response.headers, self.max_age)
+        if lifetime > 0 and self.is_cacheable_response(response.status, response.headers, body):
+            try:
+                await asyncio.to_thread(self._write, url, response.status, response.headers, body, lifetime,
+                                        vary_key(response.headers, request_headers))
+                self.stats.stored += 1
+            except OSError as e:
+                logger.debug(f"Failed to cache {url}: {e}")
+        await route.fulfill(response=response, body=body)
+        return True
+
+    def log_stats(self):
+        logger.info(f"💾 HTTP cache hit ratio {self.stats.hit_ratio:.0%} ({self.stats.hits} hits, "
+                    f"{self.stats.misses} misses, {self.stats.bytes_served / 1e6:.1f} MB served from disk)")
+
+
+_caches: Dict[str, HttpDiskCache] = {}
+
+# cache directories requested through the API must be inside the app's data directory
+DATA_DIR = "./tmp"
+
+
+def validate_cache_dir(cache_dir: str, data_dir: str = DATA_DIR) -> str:
+    """Return the cache directory, raise ValueError if it is not inside `data_dir`"""
+    root = os.path.realpath(data_dir)
+    # resolves .. and symlinks
+    path = os.path.realpath(cache_dir)
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise ValueError(f"HTTP cache directory must be a directory under {data_dir}: {cache_dir}")
+    return cache_dir
+
+
+def get_http_cache(cache_dir: str = "./tmp/http_cache", max_size_mb: float = 512) -> HttpDiskCache:
+    """One cache per directory and process, shared by all contexts, with the latest size limit"""
+    cache_dir = os.path.abspath(cache_dir)
+    if cache_dir not in _caches:
+        _caches[cache_dir] = HttpDiskCache(cache_dir, max_size_mb=max_size_mb)
+    else:
+        _caches[cache_dir].set_max_size(max_size_mb)
+    return _caches[cache_dir]
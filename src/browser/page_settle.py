@@ -0,0 +1,206 @@
+import asyncio
+import io
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional, Set
+
+import numpy as np
+from PIL import Image
+from playwright.async_api import Page, Request
+
+from .dom_cache import DOM_WATCH_JS
+
+logger = logging.getLogger(__name__)
+
+# Requests that stay open by design and never mean the page is still loading
+IGNORED_RESOURCE_TYPES = {"websocket", "eventsource", "media", "manifest"}
+IGNORED_URL_PATTERNS = ("analytics", "tracking", "telemetry", "beacon", "doubleclick", "hotjar", "heartbeat")
+
+DOM_VERSION_JS = "() => window.__buDomWatch ? window.__buDomWatch.version : null"
+
+FRAME_SIZE = (128, 96)
+
+
+def downscale_frame(image_bytes: bytes, size=FRAME_SIZE) -> np.ndarray:
+    """Small grayscale version of a screenshot, enough to see content appear or move"""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return np.asarray(image.convert("L").resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def frame_difference(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute pixel difference of two downscaled frames, 0 (same) to 1"""
+    if a.shape != b.shape:
+        return 1.0
+    return float(np.abs(a - b).mean() / 255.0)
+
+
+@dataclass
+class SettleResult:
+    settled: bool
+    elapsed: float
+    reason: str  # what changed last, or why we gave up
+    frames_compared: int = 0
+    # gave up because the page kept changing after its requests finished
+    changing: bool = False
+
+
+@dataclass
+class SettleStats:
+    waits: int = 0
+    timeouts: int = 0
+    changing: int = 0
+    total_time: float = 0.0
+
+    def record(self, result: SettleResult):
+        self.waits += 1
+        self.total_time += result.elapsed
+        if result.changing:
+            self.changing += 1
+        elif not result.settled:
+            self.timeouts += 1
+
+    @property
+    def average_time(self) -> float:
+        return self.total_time / self.waits if self.waits else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "changing": self.changing,
+            "total_time": round(self.total_time, 3),
+            "average_time": round(self.average_time, 3),
+        }
+
+
+class PageSettleDetector:
+    """
+    Wait until a page stopped changing instead of sleeping a fixed time.
+
+    The page is settled once, for `quiet_window` seconds, no request was in flight or finished, the DOM
+    mutation counter of DOM_WATCH_JS did not move and (with `visual`) consecutive downscaled screenshots
+    differ by less than `visual_threshold`. Screenshots are only taken while network and DOM are quiet,
+    they catch what the other signals miss: animations, image decoding, canvas. Gives up after `max_wait`,
+    or once DOM or screenshots kept changing for `max_changing_wait` seconds after the network went quiet:
+    carousels, tickers and spinners never settle and are as loaded as they get.
+    """
+
+    def __init__(
+            self,
+            page: Page,
+            max_wait: float = 5.0,
+            quiet_window: float = 0.5,
+            visual: bool = True,
+            visual_threshold: float = 0.005,
+            poll_interval: float = 0.1,
+            stuck_request_timeout: float = 3.0,
+            max_changing_wait: Optional[float] = 1.5,
+    ):
+        self.page = page
+        self.max_wait = max_wait
+        self.quiet_window = quiet_window
+        self.visual = visual
+        self.visual_threshold = visual_threshold
+        self.poll_interval = poll_interval
+        # long polling and streaming requests are ignored once they were open this long
+        self.stuck_request_timeout = stuck_request_timeout
+        self.max_changing_wait = max_changing_wait
+        self._pending: dict = {}
+        self._last_network_activity = 0.0
+
+    def _is_relevant(self, request: Request) -> bool:
+        if request.resource_type in IGNORED_RESOURCE_TYPES:
+            return False
+        url = request.url.lower()
+        if url.startswith(("data:", "blob:")):
+            return False
+        return not any(pattern in url for pattern in IGNORED_URL_PATTERNS)
+
+    def _on_request(self, request: Request):
+        if self._is_relevant(request):
+            self._pending[request] = time.monotonic()
+            self._last_network_activity = time.monotonic()
+
+    def _on_request_done(self, request: Request):
+        if self._pending.pop(request, None) is not None:
+            self._last_network_activity = time.monotonic()
+
+    def _in_flight(self, now: float) -> Set[Request]:
+        return {request for request, started in self._pending.items() if now - started < self.stuck_request_timeout}
+
+    async def _dom_version(self) -> Optional[int]:
+        version = await self.page.evaluate(DOM_VERSION_JS)
+        if version is None:
+            # page opened before the watcher was registered
+            await self.page.evaluate(DOM_WATCH_JS)
+        return version
+
+    async def _frame(self, timeout: float) -> np.ndarray:
+        screenshot = await self.page.screenshot(type="jpeg", quality=40, timeout=max(timeout, 0.1) * 1000)
+        return await asyncio.to_thread(downscale_frame, screenshot)
+
+    async def wait(self) -> SettleResult:
+        page = self.page
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+
+        start = time.monotonic()
+        last_change = start
+        network_quiet_since = start
+        reason = "start"
+        dom_version = None
+        previous_frame = None
+        frames_compared = 0
+        try:
+            while True:
+                now = time.monotonic()
+                if now - start >= self.max_wait:
+                    return SettleResult(False, now - start, f"timeout, last change: {reason}", frames_compared)
+
+                if self._in_flight(now):
+                    last_change, reason, previous_frame = now, "network", None
+                    network_quiet_since = now
+                elif self._last_network_activity > last_change:
+                    last_change, reason, previous_frame = self._last_network_activity, "network", None
+                network_quiet_since = max(network_quiet_since, self._last_network_activity)
+
+                try:
+                    version = await self._dom_version()
+                except Exception:
+                    # navigation destroyed the execution context
+                    version = None
+                    last_change, reason, previous_frame = time.monotonic(), "navigation", None
+                if version != dom_version:
+                    if dom_version is not None:
+                        last_change, reason, previous_frame = time.monotonic(), "dom", None
+                    dom_version = version
+
+                quiet = time.monotonic() - last_change
+                visual = self.visual
+                if visual and reason != "navigation" and quiet >= self.poll_interval:
+                    try:
+                        frame = await self._frame(self.max_wait - (time.monotonic() - start))
+                    except Exception as e:
+                        logger.debug(f"Screenshot failed, settling without visual check: {e}")
+                        visual = self.visual = False
+                    if visual and previous_frame is not None:
+                        frames_compared += 1
+                        if frame_difference(previous_frame, frame) > self.visual_threshold:
+                            last_change, reason = time.monotonic(), "visual"
+                    if visual:
+                        previous_frame = frame
+                    quiet = time.monotonic() - last_change
+
+                if quiet >= self.quiet_window and (not visual or frames_compared):
+                    return SettleResult(True, time.monotonic() - start, reason, frames_compared)
+                if (self.max_changing_wait is not None and reason in ("dom", "visual")
+                        and time.monotonic() - network_quiet_since >= self.max_changing_wait):
+                    return SettleResult(False, time.monotonic() - start, f"keeps changing: {reason}",
+                                        frames_compared, changing=True)
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            page.remove_listener("request", self._on_request)
+            page.remove_listener("requestfinished", self._on_request_done)
+            page.remove_listener("requestfailed", self._on_request_done)
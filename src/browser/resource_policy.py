@@ -0,0 +1,153 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import Request, Route
+
+logger = logging.getLogger(__name__)
+
+PRESETS = ("none", "block_media", "block_third_party", "allowlist")
+# the default of runs: block_media when the model does not look at screenshots, none when it does
+AUTO_PRESET = "auto"
+
+MEDIA_RESOURCE_TYPES = {"image", "media", "font"}
+
+# Rough median transfer sizes per resource type (HTTP Archive). Blocked requests are never sent, so
+# their real size is unknown: the bytes saved are an estimate from these, not a measurement.
+AVERAGE_RESOURCE_BYTES = {
+    "image": 25_000,
+    "media": 500_000,
+    "font": 35_000,
+    "script": 20_000,
+    "stylesheet": 15_000,
+    "xhr": 5_000,
+    "fetch": 5_000,
+    "document": 30_000,
+    "other": 5_000,
+}
+
+# second level labels that are part of the public suffix (co.uk, com.au, ...)
+_SECOND_LEVEL_SUFFIXES = {"co", "com", "net", "org", "gov", "edu", "ac"}
+
+
+def site_of(url_or_host: str) -> str:
+    """Approximate registrable domain (eTLD+1) of a URL or host name"""
+    if "://" in url_or_host:
+        host = urlparse(url_or_host).hostname
+    elif ":" in url_or_host:
+        # data:, blob:, about: ...
+        return ""
+    else:
+        host = url_or_host
+    if not host:
+        return ""
+    labels = host.lower().rstrip(".").split(".")
+    if len(labels) >= 3 and labels[-2] in _SECOND_LEVEL_SUFFIXES and len(labels[-1]) == 2:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+@dataclass
+class ResourcePolicyStats:
+    requests_total: int = 0
+    requests_blocked: int = 0
+    blocked_by_type: Dict[str, int] = field(default_factory=dict)
+    bytes_saved_estimate: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "requests_total": self.requests_total,
+            "requests_blocked": self.requests_blocked,
+            "blocked_by_type": dict(self.blocked_by_type),
+            "bytes_saved_estimate": self.bytes_saved_estimate,
+        }
+
+
+class ResourcePolicy:
+    """
+    Decide which requests of a browser context are aborted.
+
+    Presets:
+        none: load everything (no routing, so the HTTP cache keeps working)
+        block_media: block images, media and fonts
+        block_third_party: block media plus sub-resources from other sites than the page
+        allowlist: block media plus sub-resources from sites not in `allowed_domains`
+
+    Main frame navigations are never blocked, the agent decides where to go.
+    """
+
+    def __init__(
+            self,
+            preset: str = "none",
+            allowed_domains: Optional[Iterable[str]] = None,
+            block_resource_types: Optional[Iterable[str]] = None,
+    ):
+        if preset not in PRESETS:
+            raise ValueError(f"Unknown resource policy preset: {preset}, use one of {PRESETS}")
+        self.preset = preset
+        self.allowed_sites = {site_of(domain.strip()) for domain in (allowed_domains or []) if domain.strip()}
+        if block_resource_types is not None:
+            self.block_resource_types = set(block_resource_types)
+        else:
+            self.block_resource_types = set() if preset == "none" else set(MEDIA_RESOURCE_TYPES)
+        self.stats = ResourcePolicyStats()
+
+    @classmethod
+    def from_config(cls, preset: Optional[str], allowed_domains: Optional[str] = None,
+                    use_vision: bool = True) -> Optional["ResourcePolicy"]:
+        """
+        Build a policy from UI / API values, `allowed_domains` is comma separated. The "auto" preset
+        blocks media for runs without vision, images and fonts are of no use to them.
+        """
+        if preset == AUTO_PRESET:
+            preset = "none" if use_vision else "block_media"
+        if not preset or preset == "none":
+            return None
+        return cls(preset=preset, allowed_domains=(allowed_domains or "").split(","))
+
+    @property
+    def is_active(self) -> bool:
+        return self.preset != "none" or bool(self.block_resource_types)
+
+    def block_reason(self, request: Request) -> Optional[str]:
+        """Return why the request should be blocked, None to let it through"""
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            return None
+        if request.resource_type in self.block_resource_types:
+            return request.resource_type
+        if self.preset not in ("block_third_party", "allowlist"):
+            return None
+
+        request_site = site_of(request.url)
+        if not request_site:
+            # data:, blob: ...
+            return None
+        if self.preset == "allowlist":
+            return None if request_site in self.allowed_sites else "not_allowed"
+        try:
+            page_site = site_of(request.frame.page.url)
+        except Exception:
+            return None
+        if page_site and request_site != page_site and request_site not in self.allowed_sites:
+            return "third_party"
+        return None
+
+    async def handle(self, route: Route) -> bool:
+        """Abort the request if the policy blocks it, return True if it was aborted"""
+        request = route.request
+        self.stats.requests_total += 1
+        reason = self.block_reason(request)
+        if reason is None:
+            return False
+        self.stats.requests_blocked += 1
+        self.stats.blocked_by_type[reason] = self.stats.blocked_by_type.get(reason, 0) + 1
+        self.stats.bytes_saved_estimate += AVERAGE_RESOURCE_BYTES.get(
+            request.resource_type, AVERAGE_RESOURCE_BYTES["other"])
+        await route.abort("blockedbyclient")
+        return True
+
+    def log_stats(self):
+        logger.info(f"🚫 Resource policy '{self.preset}': blocked {self.stats.requests_blocked}/"
+                    f"{self.stats.requests_total} requests, an estimated {self.stats.bytes_saved_estimate / 1e6:.1f} MB "
+                    f"saved (typical sizes of the blocked resource types, not measured)")
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional, Set
+
+from browser_use.browser.context import BrowserContext
+from playwright.async_api import CDPSession, Page
+
+from ..utils.frame_bus import FrameBus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScreencastStats:
+    frames_received: int = 0
+    frames_published: int = 0
+    frames_unchanged: int = 0
+    page_switches: int = 0
+
+
+class PageScreencast:
+    """
+    Live view of the agent's current page using the CDP `Page.startScreencast` API.
+
+    Chromium pushes JPEG frames only when the page changes. Every frame is acknowledged (which lets
+    Chromium send the next one), in order, once the previous frame was consumed and at most `max_fps`
+    times per second, so a slow consumer throttles the screencast instead of queueing frames.
+    """
+
+    def __init__(
+            self,
+            browser_context: BrowserContext,
+            max_fps: float = 5,
+            max_width: int = 1280,
+            max_height: int = 1100,
+            quality: int = 60,
+    ):
+        self.browser_context = browser_context
+        self.max_fps = max_fps
+        self.max_width = max_width
+        self.max_height = max_height
+        self.quality = quality
+
+        self.latest_frame: Optional[str] = None  # base64 encoded JPEG
+        self.stats = ScreencastStats()
+
+        self._page: Optional[Page] = None
+        self._cdp: Optional[CDPSession] = None
+        self._frame_hash: Optional[int] = None
+        self._new_frame = asyncio.Event()
+        self._consumed = asyncio.Event()
+        self._consumed.set()
+        self._last_ack = 0.0
+        self._ack_lock = asyncio.Lock()
+        self._ack_tasks: Set[asyncio.Task] = set()
+
+    def _target_page(self) -> Optional[Page]:
+        session = self.browser_context.session
+        if session is None or session.current_page is None or session.current_page.is_closed():
+            return None
+        return session.current_page
+
+    async def _follow_current_page(self) -> bool:
+        """(Re)attach the screencast to the agent's current page, return False if there is none"""
+        page = self._target_page()
+        if page is None:
+            return False
+        if page is self._page and self._cdp is not None:
+            return True
+
+        await self._detach()
+        self._page = page
+        self._cdp = await page.context.new_cdp_session(page)
+        self._cdp.on("Page.screencastFrame", self._on_frame)
+        await self._cdp.send("Page.startScreencast", {
+            "format": "jpeg",
+            "quality": self.quality,
+            "maxWidth": self.max_width,
+            "maxHeight": self.max_height,
+            "everyNthFrame": 1,
+        })
+        self.stats.page_switches += 1
+        logger.debug(f"📺 Screencast attached to {page.url}")
+        return True
+
+    def _on_frame(self, params: dict):
+        self.stats.frames_received += 1
+        data = params["data"]
+        frame_hash = hash(data)
+        if frame_hash == self._frame_hash:
+            self.stats.frames_unchanged += 1
+        else:
+            self._frame_hash = frame_hash
+            self.latest_frame = data
+            self.stats.frames_published += 1
+            self._consumed.clear()
+            self._new_frame.set()
+
+        # an unacknowledged frame counts against Chromium's limit, so no ack may be dropped
+        ack_task = asyncio.create_task(self._ack(self._cdp, params["sessionId"]))
+        self._ack_tasks.add(ack_task)
+        ack_task.add_done_callback(self._ack_tasks.discard)
+
+    async def _ack(self, cdp: CDPSession, session_id: int):
+        # backpressure: wait for the consumer, then respect the max fps
+        async with self._ack_lock:
+            await self._consumed.wait()
+            delay = self._last_ack + 1 / self.max_fps - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_ack = time.monotonic()
+        try:
+            await cdp.send("Page.screencastFrameAck", {"sessionId": session_id})
+        except Exception as e:
+            logger.debug(f"Screencast ack failed: {e}")
+
+    async def next_frame(self, timeout: float = 1.0) -> Optional[str]:
+        """
+        Wait for a frame that differs from the last one returned.
+
+        :return: the base64 JPEG, or None if there is no page yet or nothing changed within `timeout`
+        """
+        try:
+            if not await self._follow_current_page():
+                await asyncio.sleep(timeout)
+                return None
+        except Exception as e:
+            logger.debug(f"Failed to start screencast: {e}")
+            await self._detach()
+            await asyncio.sleep(timeout)
+            return None
+
+        try:
+            await asyncio.wait_for(self._new_frame.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._new_frame.clear()
+        self._consumed.set()
+        return self.latest_frame
+
+    async def publish_to(self, frame_bus: FrameBus, timeout: float = 0.5):
+        """Publish frames to the run's frame bus until it is closed"""
+        while not frame_bus.closed:
+            data = await self.next_frame(timeout)
+            if data is not None:
+                frame_bus.publish(data, source="screencast", image_format="jpeg",
+                                  url=self._page.url if self._page else None)
+
+    async def _detach(self):
+        # acks of the old session would go nowhere
+        for ack_task in list(self._ack_tasks):
+            ack_task.cancel()
+        self._ack_tasks.clear()
+        if self._cdp is not None:
+            try:
+                await self._cdp.send("Page.stopScreencast")
+                await self._cdp.detach()
+            except Exception:
+                # page or context already closed
+                pass
+        self._cdp = None
+        self._page = None
+
+    async def stop(self):
+        await self._detach()
+        logger.debug(f"📺 Screencast stopped: {self.stats}")
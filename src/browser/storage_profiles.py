@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import re
+import time
+from typing import List, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import BrowserContext as PlaywrightBrowserContext
+from playwright.async_api import Page
+
+logger = logging.getLogger(__name__)
+
+PROFILE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+LOGIN_URL_PATTERN = re.compile(r"/(login|log-in|signin|sign-in|sign_in|sso|auth|authenticate)([/?#.]|$)", re.IGNORECASE)
+
+# A visible password field is the most reliable sign of a login form across sites
+LOGIN_WALL_JS = """
+() => [...document.querySelectorAll('input[type="password"]')].some((el) => {
+    const rect = el.getBoundingClientRect();
+    const style = window.getComputedStyle(el);
+    return rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+})
+"""
+
+
+def profile_sites(state: dict) -> List[str]:
+    """Hosts the storage state holds cookies or storage for"""
+    sites = {cookie.get("domain", "").lstrip(".").lower() for cookie in state.get("cookies", [])}
+    sites.update((urlparse(origin.get("origin", "")).hostname or "").lower() for origin in state.get("origins", []))
+    sites.discard("")
+    return sorted(sites)
+
+
+def is_profile_site(url: str, sites: List[str]) -> bool:
+    """Whether the url is on one of the sites, subdomains and parent domains included"""
+    host = (urlparse(url).hostname or "").lower()
+    return bool(host) and any(host == site or host.endswith("." + site) or site.endswith("." + host)
+                              for site in sites)
+
+
+async def find_login_wall(page: Page) -> Optional[str]:
+    """Return why the page looks like a login wall, None if it does not"""
+    if LOGIN_URL_PATTERN.search(urlparse(page.url).path):
+        return f"login url {page.url}"
+    try:
+        if await page.evaluate(LOGIN_WALL_JS):
+            return f"password field on {page.url}"
+    except Exception as e:
+        logger.debug(f"Failed to check for a login wall: {e}")
+    return None
+
+
+class StorageProfileStore:
+    """
+    Named snapshots of a context's storage state (cookies, localStorage and IndexedDB).
+
+    A profile is saved after a successful run and handed to the next context as `storage_state`,
+    so the agent starts logged in. Profiles older than `max_age` or whose cookies all expired are
+    not loaded. Files are only readable by the current user, they contain session cookies.
+    """
+
+    def __init__(self, profiles_dir: str = "./tmp/storage_profiles", max_age: float = 7 * 24 * 3600):
+        self.profiles_dir = profiles_dir
+        self.max_age = max_age
+
+    def path(self, name: str) -> str:
+        if not PROFILE_NAME_PATTERN.match(name or ""):
+            raise ValueError(f"Invalid storage profile name: {name!r}, use letters, digits, '_', '-' and '.'")
+        return os.path.join(self.profiles_dir, f"{name}.json")
+
+    def _read(self, name: str) -> Optional[dict]:
+        try:
+            with open(self.path(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Unreadable storage profile '{name}': {e}")
+            return None
+
+    def load(self, name: str) -> Optional[dict]:
+        """Storage state of a fresh profile, None if there is none"""
+        profile = self._read(name)
+        if profile is None:
+            return None
+        age = time.time() - profile.get("saved_at", 0)
+        if age > self.max_age:
+            self.invalidate(name, f"older than {self.max_age / 3600:.0f}h")
+            return None
+
+        state = profile["state"]
+        now = time.time()
+        cookies = state.get("cookies", [])
+        # -1 marks session cookies
+        fresh_cookies = [cookie for cookie in cookies if cookie.get("expires", -1) == -1 or cookie["expires"] > now]
+        if cookies and not fresh_cookies:
+            self.invalidate(name, "all cookies expired")
+            return None
+        state = {**state, "cookies": fresh_cookies}
+        logger.info(f"🔑 Using storage profile '{name}' ({len(fresh_cookies)} cookies, "
+                    f"{len(state.get('origins', []))} origins, saved {age / 3600:.1f}h ago)")
+        return state
+
+    async def save(self, name: str, context: PlaywrightBrowserContext, url: str = ""):
+        path = self.path(name)
+        try:
+            state = await context.storage_state(indexed_db=True)
+        except TypeError:
+            # playwright < 1.51 can't snapshot IndexedDB
+            state = await context.storage_state()
+        os.makedirs(self.profiles_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"name": name, "saved_at": time.time(), "url": url, "state": state}, f)
+        os.replace(tmp_path, path)
+        logger.info(f"🔑 Saved storage profile '{name}' ({len(state.get('cookies', []))} cookies)")
+
+    def invalidate(self, name: str, reason: str = ""):
+        try:
+            os.remove(self.path(name))
+            logger.info(f"🔑 Invalidated storage profile '{name}'{': ' + reason if reason else ''}")
+        except FileNotFoundError:
+            pass
+
+    def list_profiles(self) -> List[dict]:
+        if not os.path.isdir(self.profiles_dir):
+            return []
+        profiles = []
+        for filename in sorted(os.listdir(self.profiles_dir)):
+            if not filename.endswith(".json"):
+                continue
+            profile = self._read(filename[:-len(".json")])
+            if profile is None:
+                continue
+            age = time.time() - profile.get("saved_at", 0)
+            profiles.append({
+                "name": profile.get("name"),
+                "saved_at": profile.get("saved_at"),
+                "url": profile.get("url", ""),
+                "cookies": len(profile["state"].get("cookies", [])),
+                "origins": len(profile["state"].get("origins", [])),
+                "fresh": age <= self.max_age,
+            })
+        return profiles
@@ -0,0 +1,195 @@
+import asyncio
+import copy
+import logging
+from typing import List, Optional
+
+from browser_use.browser.browser import Browser
+from browser_use.browser.context import BrowserContextConfig, BrowserSession
+from browser_use.browser.views import BrowserError, TabInfo
+from playwright.async_api import Browser as PlaywrightBrowser
+from playwright.async_api import BrowserContext as PlaywrightBrowserContext
+from playwright.async_api import Page
+
+from .custom_context import CustomBrowserContext
+from .http_cache import HttpDiskCache
+from .resource_policy import ResourcePolicy
+
+logger = logging.getLogger(__name__)
+
+# set on a shared playwright context once it got the init scripts, so later tab contexts don't add them again
+_PREPARED_MARKER = "_bu_tab_contexts_prepared"
+# set on the browser, tab contexts starting at once must not each launch or connect to it
+_INIT_LOCK = "_bu_tab_contexts_init_lock"
+
+
+class TabBrowserContext(CustomBrowserContext):
+    """
+    A browser context that only owns its tabs.
+
+    A browser attached over CDP (the user's own Chrome) has one default context holding the user's
+    logins. Agents sharing it each get their own tab there and only see, switch to and close the tabs
+    they opened, and popups of those. The resource policy and HTTP cache are routed on those tabs only,
+    the user's own tabs load as usual and stay out of the shared disk cache. Closing this context closes
+    its tabs, the browser context and the user's other tabs stay. On a browser we launched ourselves it
+    behaves like CustomBrowserContext.
+    """
+
+    def __init__(
+            self,
+            browser: Browser,
+            config: BrowserContextConfig = BrowserContextConfig(),
+            resource_policy: Optional[ResourcePolicy] = None,
+            http_cache: Optional[HttpDiskCache] = None,
+            dom_cache: bool = True,
+    ):
+        self.shared_context = bool(browser.config.cdp_url or browser.config.chrome_instance_path)
+        if self.shared_context:
+            config = copy.copy(config)
+            config._force_keep_context_alive = True
+        super().__init__(browser=browser, config=config, resource_policy=resource_policy,
+                         http_cache=http_cache, dom_cache=dom_cache)
+        self._own_pages: List[Page] = []
+        self._routed_pages: List[Page] = []
+        self._page_listener = None
+
+    async def _create_context(self, browser: PlaywrightBrowser) -> PlaywrightBrowserContext:
+        if self.shared_context and browser.contexts and getattr(browser.contexts[0], _PREPARED_MARKER, False):
+            context = browser.contexts[0]
+            await self._update_route(context)
+            return context
+        context = await super()._create_context(browser)
+        if self.shared_context:
+            setattr(context, _PREPARED_MARKER, True)
+        return context
+
+    async def _update_route(self, context: PlaywrightBrowserContext):
+        if not self.shared_context:
+            return await super()._update_route(context)
+        for page in self._own_pages:
+            await self._update_page_route(page)
+
+    async def _update_page_route(self, page: Page):
+        try:
+            if self._needs_route and page not in self._routed_pages:
+                await page.route("**/*", self._handle_route)
+                self._routed_pages.append(page)
+            elif not self._needs_route and page in self._routed_pages:
+                self._routed_pages.remove(page)
+                await page.unroute("**/*", self._handle_route)
+        except Exception as e:
+            # tab closed meanwhile
+            logger.debug(f'Failed to update the route of a tab: {e}')
+
+    async def _add_own_page(self, page: Page):
+        self._own_pages.append(page)
+        await self._update_page_route(page)
+
+    def _init_lock(self) -> asyncio.Lock:
+        lock = getattr(self.browser, _INIT_LOCK, None)
+        if lock is None:
+            lock = asyncio.Lock()
+            setattr(self.browser, _INIT_LOCK, lock)
+        return lock
+
+    async def _initialize_session(self):
+        if not self.shared_context:
+            async with self._init_lock():
+                await self.browser.get_playwright_browser()
+            return await super()._initialize_session()
+        # the browser is started and its shared context prepared once, by the first tab context
+        async with self._init_lock():
+            playwright_browser = await self.browser.get_playwright_browser()
+            context = await self._create_context(playwright_browser)
+        self._add_new_page_listener(context)
+        # never take over a tab of the user or of another agent
+        page = await context.new_page()
+        await self._add_own_page(page)
+        self.session = BrowserSession(
+            context=context,
+            current_page=page,
+            cached_state=self._get_initial_state(page),
+        )
+        return self.session
+
+    def _add_new_page_listener(self, context: PlaywrightBrowserContext):
+        if not self.shared_context:
+            return super()._add_new_page_listener(context)
+
+        async def on_page(page: Page):
+            try:
+                opener = await page.opener()
+            except Exception:
+                opener = None
+            if opener not in self._own_pages:
+                return
+            await self._add_own_page(page)
+            await page.wait_for_load_state()
+            logger.debug(f'New tab opened by our tab: {page.url}')
+            if self.session is not None:
+                self.session.current_page = page
+
+        self._page_listener = on_page
+        context.on('page', on_page)
+
+    def _available_pages(self, session) -> List[Page]:
+        if not self.shared_context:
+            return super()._available_pages(session)
+        self._own_pages = [page for page in self._own_pages if not page.is_closed()]
+        return list(self._own_pages)
+
+    async def get_tabs_info(self) -> List[TabInfo]:
+        return await self._get_tabs_info(await self.get_session())
+
+    async def switch_to_tab(self, page_id: int) -> None:
+        if not self.shared_context:
+            return await super().switch_to_tab(page_id)
+        session = await self.get_session()
+        pages = self._available_pages(session)
+        if page_id >= len(pages):
+            raise BrowserError(f'No tab found with page_id: {page_id}')
+        page = pages[page_id]
+        if not self._is_url_allowed(page.url):
+            raise BrowserError(f'Cannot switch to tab with non-allowed URL: {page.url}')
+        session.current_page = page
+        await page.bring_to_front()
+        await page.wait_for_load_state()
+
+    async def create_new_tab(self, url: Optional[str] = None) -> None:
+        if not self.shared_context:
+            return await super().create_new_tab(url)
+        if url and not self._is_url_allowed(url):
+            raise BrowserError(f'Cannot create new tab with non-allowed URL: {url}')
+        session = await self.get_session()
+        page = await session.context.new_page()
+        await self._add_own_page(page)
+        session.current_page = page
+        await page.wait_for_load_state()
+        if url:
+            await page.goto(url)
+            await self._wait_for_page_and_frames_load(timeout_overwrite=1)
+
+    async def close_current_tab(self):
+        if not self.shared_context:
+            return await super().close_current_tab()
+        session = await self.get_session()
+        await session.current_page.close()
+        pages = self._available_pages(session)
+        if pages:
+            await self.switch_to_tab(0)
+        else:
+            # keep a tab of our own to work in
+            await self.create_new_tab()
+
+    async def close(self):
+        if self.shared_context and self.session is not None:
+            if self._page_listener is not None:
+                self.session.context.remove_listener('page', self._page_listener)
+                self._page_listener = None
+            for page in self._available_pages(self.session):
+                try:
+                    await page.close()
+                except Exception as e:
+                    logger.debug(f'Failed to close tab: {e}')
+            self._own_pages = []
+            self._routed_pages = []
+        await super().close()
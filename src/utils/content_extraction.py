@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+from main_content_extractor import MainContentExtractor
+from playwright.async_api import Page
+
+logger = logging.getLogger(__name__)
+
+# pages smaller than this are extracted in the event loop, shipping them to a worker costs more
+INLINE_MAX_CHARS = 20000
+
+# Chromium shows PDFs in a viewer whose HTML is only an <embed>, page.content() has none of the text
+IS_PDF_JS = """() => document.contentType === 'application/pdf'
+    || document.querySelector('embed[type="application/pdf"]') !== null"""
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def extract_markdown(html: str) -> str:
+    """Main content of a page as markdown, runs in a worker process"""
+    return MainContentExtractor.extract(html=html, output_format="markdown")
+
+
+def format_extracted_content(title: str, url: str, content: str) -> str:
+    """Same layout as the jina reader, the record prompt reads title and url from it"""
+    return f"Title: {title}\n\nURL Source: {url}\n\nMarkdown Content:\n{content}"
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Worker processes shared by all extractions of this server"""
+    global _process_pool
+    if _process_pool is None:
+        max_workers = int(os.getenv("CONTENT_EXTRACTION_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+        # spawn: the server process runs playwright threads, forking it is not safe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info(f"📄 Started content extraction pool with {max_workers} workers")
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+@dataclass
+class ContentExtractionStats:
+    extractions: int = 0
+    jina_extractions: int = 0
+    pdf_extractions: int = 0
+    pooled_extractions: int = 0
+    total_time: float = 0.0
+    html_chars: int = 0
+    markdown_chars: int = 0
+
+    @property
+    def average_time(self) -> float:
+        return self.total_time / self.extractions if self.extractions else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "extractions": self.extractions,
+            "jina_extractions": self.jina_extractions,
+            "pdf_extractions": self.pdf_extractions,
+            "pooled_extractions": self.pooled_extractions,
+            "total_time": round(self.total_time, 3),
+            "average_time": round(self.average_time, 3),
+            "html_chars": self.html_chars,
+            "markdown_chars": self.markdown_chars,
+        }
+
+
+class ContentExtractor:
+    """
+    Extract the main content of the current page as markdown.
+
+    By default the HTML of the page the agent is on is converted locally, large pages in a process
+    pool so the event loop keeps serving the other agents. With `use_jina_reader` the page is loaded
+    through r.jina.ai first and the agent navigates back afterwards, the previous behavior.
+    PDFs always go through r.jina.ai, the browser's PDF viewer has no text to extract.
+    """
+
+    def __init__(self, use_jina_reader: bool = False, inline_max_chars: int = INLINE_MAX_CHARS):
+        self.use_jina_reader = use_jina_reader
+        self.inline_max_chars = inline_max_chars
+        self.stats = ContentExtractionStats()
+
+    async def markdown_from_html(self, html: str) -> str:
+        if len(html) <= self.inline_max_chars:
+            return extract_markdown(html)
+        self.stats.pooled_extractions += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(get_process_pool(), extract_markdown, html)
+        except BrokenProcessPool:
+            logger.warning("⚠️ Content extraction pool died, extracting in a thread")
+            shutdown_process_pool()
+            return await asyncio.to_thread(extract_markdown, html)
+
+    async def _extract_with_jina(self, page: Page) -> str:
+        await page.goto(f"https://r.jina.ai/{page.url}")
+        try:
+            return await self.markdown_from_html(await page.content())
+        finally:
+            # go back to org url
+            await page.go_back()
+
+    @staticmethod
+    async def is_pdf(page: Page) -> bool:
+        if urlparse(page.url).path.lower().endswith(".pdf"):
+            return True
+        try:
+            return await page.evaluate(IS_PDF_JS)
+        except Exception as e:
+            logger.debug(f"Failed to check for a PDF viewer: {e}")
+            return False
+
+    async def extract(self, page: Page) -> str:
+        start = time.monotonic()
+        is_pdf = await self.is_pdf(page)
+        if self.use_jina_reader or is_pdf:
+            content = await self._extract_with_jina(page)
+            self.stats.jina_extractions += 1
+            if is_pdf:
+                self.stats.pdf_extractions += 1
+        else:
+            html = await page.content()
+            self.stats.html_chars += len(html)
+            content = format_extracted_content(await page.title(), page.url, await self.markdown_from_html(html))
+        self.stats.extractions += 1
+        self.stats.markdown_chars += len(content)
+        self.stats.total_time += time.monotonic() - start
+        return content
+
+    def log_stats(self):
+        if self.stats.extractions:
+            logger.info(f"📄 Extracted {self.stats.extractions} pages in {self.stats.average_time:.2f}s on average "
+                        f"({self.stats.pooled_extractions} in the process pool, "
+                        f"{self.stats.jina_extractions} through jina reader, {self.stats.pdf_extractions} of them PDFs)")
@@ -4,7 +4,9 @@ from dotenv import load_dotenv
 
 load_dotenv()
 import asyncio
+import contextlib
 import os
+import time
 import sys
 import logging
 from pprint import pprint
@@ -18,13 +20,21 @@ from browser_use.browser.browser import BrowserConfig, Browser
 from browser_use.agent.views import ActionResult
 from browser_use.browser.context import BrowserContext
 from browser_use.controller.service import Controller, DoneAction
-from main_content_extractor import MainContentExtractor
 from langchain.schema import SystemMessage, HumanMessage
 from json_repair import repair_json
 from src.agent.custom_prompts import CustomSystemPrompt, CustomAgentMessagePrompt
 from src.controller.custom_controller import CustomController
+from src.browser.browser_pool import BrowserPool
+from src.browser.tab_context import TabBrowserContext
+from src.utils.content_extraction import ContentExtractor
+from src.utils.research_index import ResearchIndex
+from src.utils.research_session import ResearchSession, validate_research_id
+from src.utils.text_chunking import ChunkingStats, TokenCounter, split_by_tokens
+from src.utils.near_duplicates import NearDuplicateFilter
+from src.utils.information_gain import InformationGainTracker, filter_repeated_queries
+from src.utils.page_cache import CONTENT_HASH_PATTERN, PageCache, content_hash
+from src.utils.secrets import SecretStore
 from src.browser.custom_browser import CustomBrowser
-from src.browser.custom_context import BrowserContextConfig, BrowserContext
 from browser_use.browser.context import (
     BrowserContextConfig,
     BrowserContextWindowSize,
@@ -34,7 +44,9 @@ logger = logging.getLogger(__name__)
 
 
 async def deep_research(task, llm, agent_state=None, **kwargs):
-    task_id = str(uuid4())
+    # continue the research saved under this id instead of starting a new one
+    resume_task_id = kwargs.get("resume_task_id", None)
+    task_id = validate_research_id(resume_task_id or kwargs.get("task_id", None) or str(uuid4()))
     save_dir = kwargs.get("save_dir", os.path.join(f"./tmp/deep_research/{task_id}"))
     logger.info(f"Save Deep Research at: {save_dir}")
     os.makedirs(save_dir, exist_ok=True)
@@ -43,12 +55,16 @@ async def deep_research(task, llm, agent_state=None, **kwargs):
     max_query_num = kwargs.get("max_query_num", 3)
 
     use_own_browser = kwargs.get("use_own_browser", False)
+    # optional ResourcePolicy, shared by all browser contexts of this research
+    resource_policy = kwargs.get("resource_policy", None)
+    # optional HttpDiskCache shared with the other runs
+    http_cache = kwargs.get("http_cache", None)
+    if http_cache:
+        http_cache.reset_stats()
     extra_chromium_args = []
     cdp_url = kwargs.get("chrome_cdp", None)
     if use_own_browser:
         cdp_url = os.getenv("CHROME_CDP", kwargs.get("chrome_cdp", None))
-        # TODO: if use own browser, max query num must be 1 per iter, how to solve it?
-        max_query_num = 1
         chrome_path = os.getenv("CHROME_PATH", None)
         if chrome_path == "":
             chrome_path = None
@@ -65,34 +81,86 @@ async def deep_research(task, llm, agent_state=None, **kwargs):
                 extra_chromium_args=extra_chromium_args,
             )
         )
-        browser_context = await browser.new_context()
+        browser_pool = None
+        # parallel query agents each work in their own tabs of the user's browser, keeping its logins
+        tab_slots = asyncio.Semaphore(kwargs.get("max_browser_contexts", max_query_num))
+
+        @contextlib.asynccontextmanager
+        async def query_context():
+            async with tab_slots:
+                tab_context = TabBrowserContext(
+                    browser=browser,
+                    config=BrowserContextConfig(),
+                    resource_policy=resource_policy,
+                    http_cache=http_cache,
+                )
+                try:
+                    yield tab_context
+                finally:
+                    await tab_context.close()
     else:
         browser = None
-        browser_context = None
+        # parallel query agents get their own context on a shared browser for the whole research
+        browser_pool = BrowserPool(
+            browser_config=BrowserConfig(
+                headless=kwargs.get("headless", False),
+                disable_security=kwargs.get("disable_security", True),
+            ),
+            max_browsers=1,
+            max_contexts_per_browser=kwargs.get("max_browser_contexts", max_query_num),
+            resource_policy=resource_policy,
+            http_cache=http_cache,
+        )
+        query_context = browser_pool.context
 
     controller = CustomController()
+    # local extraction from the page's DOM, use_jina_reader goes through r.jina.ai as before
+    content_extractor = ContentExtractor(use_jina_reader=kwargs.get("use_jina_reader", False))
+    # extracted pages and their summaries, shared with the other agents, iterations and researches
+    page_cache = None
+    if kwargs.get("page_cache", True):
+        page_cache = PageCache(ttl=kwargs.get("page_cache_ttl_hours", 24) * 3600)
+        page_cache.prune()
+
+    def extracted_message(content):
+        if page_cache:
+            # the recording stage finds the cached summaries of this page by its hash
+            return f'Extracted page content:\n Content Hash: {content_hash(content)}\n {content}\n'
+        return f'Extracted page content:\n {content}\n'
 
     @controller.registry.action(
         'Extract page content to get the pure markdown.',
     )
     async def extract_content(browser: BrowserContext):
         page = await browser.get_current_page()
-        # use jina reader
-        url = page.url
-
-        jina_url = f"https://r.jina.ai/{url}"
-        await page.goto(jina_url)
-        output_format = 'markdown'
-        content = MainContentExtractor.extract(  # type: ignore
-            html=await page.content(),
-            output_format=output_format,
-        )
-        # go back to org url
-        await page.go_back()
-        msg = f'Extracted page content:\n {content}\n'
+        content = page_cache.get(page.url) if page_cache else None
+        if content is None:
+            content = await content_extractor.extract(page)
+            if page_cache:
+                page_cache.put(page.url, content)
+        msg = extracted_message(content)
         logger.info(msg)
         return ActionResult(extracted_content=msg)
 
+    if page_cache:
+        @controller.registry.action(
+            'Extract the content of a url as pure markdown, without visiting it if it was extracted before. '
+            'Prefer it over opening a search result and calling extract_content.',
+        )
+        async def extract_url_content(url: str, browser: BrowserContext):
+            content = page_cache.get(url)
+            if content is None:
+                page = await browser.get_current_page()
+                await page.goto(url)
+                await page.wait_for_load_state()
+                content = await content_extractor.extract(page)
+                page_cache.put(url, content)
+                if page.url != url:
+                    page_cache.put(page.url, content)
+            msg = extracted_message(content)
+            logger.info(msg)
+            return ActionResult(extracted_content=msg)
+
     search_system_prompt = f"""
     You are a **Deep Researcher**, an AI agent specializing in in-depth information gathering and research using a web browser with **automated execution capabilities**. Your expertise lies in formulating comprehensive research plans and executing them meticulously to fulfill complex user requests. You will analyze user instructions, devise a detailed research plan, and determine the necessary search queries to gather the required information.
 
@@ -181,136 +249,451 @@ Provide your output as a JSON formatted list. Each item in the list must adhere
     search_iteration = 0
     max_search_iterations = kwargs.get("max_search_iterations", 10)  # Limit search iterations to prevent infinite loop
     use_vision = kwargs.get("use_vision", False)
+    # chunks summarized at once, and whether recording runs while the next iteration plans and browses
+    record_semaphore = asyncio.Semaphore(kwargs.get("record_concurrency", 4))
+    overlap_recording = kwargs.get("overlap_recording", True)
 
     history_query = []
     history_infos = []
+    # prompts get the most relevant records within this budget instead of all of them
+    context_token_budget = kwargs.get("context_token_budget", 8000)
+    research_index = ResearchIndex()
+    # pages longer than this are summarized in parts and merged
+    max_chunk_tokens = kwargs.get("max_chunk_tokens", 32000)
+    token_counter = TokenCounter(llm)
+    chunking_stats = ChunkingStats()
+    recorded_keys = set()
+    # summaries differing in at most this many of 64 SimHash bits and sharing 90% of their word pairs are
+    # near duplicates, None keeps them all
+    near_duplicate_distance = kwargs.get("near_duplicate_distance", 4)
+    near_duplicate_filter = NearDuplicateFilter(near_duplicate_distance) if near_duplicate_distance is not None else None
+    # stop when iterations add fewer new records and sources per query than this, `patience` times in a row,
+    # None searches until the planner stops or max_search_iterations
+    min_information_gain = kwargs.get("min_information_gain", 1.0)
+    gain_tracker = InformationGainTracker(min_information_gain if min_information_gain is not None else 0.0,
+                                          kwargs.get("information_gain_patience", 2))
+    # planned queries sharing this many of their terms with an earlier one are not searched again, None keeps them
+    query_similarity_threshold = kwargs.get("query_similarity_threshold", 0.8)
+
+    def record_key(info):
+        if not isinstance(info, dict):
+            return json.dumps(info, sort_keys=True)
+        summary = " ".join(str(info.get("summary_content", "")).lower().split())
+        return str(info.get("url", "")).strip().lower(), summary
+
+    session = ResearchSession(save_dir, task, history_query, history_infos)
+    if resume_task_id and session.load():
+        task = session.task
+        search_iteration = session.search_iteration
+        for info in history_infos:
+            recorded_keys.add(record_key(info))
+        research_index.add(history_infos)
+        if near_duplicate_filter:
+            near_duplicate_filter.seed(history_infos)
+        gain_tracker.seed(history_infos)
+    elif resume_task_id:
+        logger.warning(f"⚠️ No saved session for {resume_task_id}, starting the research over")
+
+    async def summarize_part(record_prompt):
+        """Records from one prompt, None when the answer can't be parsed"""
+        async with record_semaphore:
+            ai_record_msg = await llm.ainvoke(record_messages[:1] + [HumanMessage(content=record_prompt)])
+        if hasattr(ai_record_msg, "reasoning_content"):
+            logger.info("🤯 Start Record Deep Thinking: ")
+            logger.info(ai_record_msg.reasoning_content)
+            logger.info("🤯 End Record Deep Thinking")
+        try:
+            new_record_infos = json.loads(repair_json(ai_record_msg.content))
+        except Exception as e:
+            logger.warning(f"Failed to parse recorded information: {e}")
+            return None
+        return new_record_infos if isinstance(new_record_infos, list) else [new_record_infos]
+
+    async def record_page(search_iteration, query_plan, query_task, page_text, digest=None):
+        """Summarize the parts of a page in parallel (map), then merge their records (reduce)"""
+        if digest:
+            cached_records = page_cache.get_records(digest, task)
+            if cached_records is not None:
+                return cached_records
+        parts = await asyncio.to_thread(split_by_tokens, page_text, max_chunk_tokens, token_counter)
+        chunking_stats.pages += 1
+        chunking_stats.split_pages += len(parts) > 1
+        chunking_stats.chunks += len(parts)
+        chunking_stats.chars_total += sum(len(part) for part in parts)
+
+        history_infos_ = research_index.context(query_task + ' ' + page_text[:2000], context_token_budget)
+        record_prompts = [
+            f"User Instruction:{task}. \nPrevious Recorded Information:\n {history_infos_}\n Current Search Iteration: {search_iteration}\n Current Search Plan:\n{query_plan}\n Current Search Query:\n {query_task}\n Current Search Results{f' (part {i + 1} of {len(parts)})' if len(parts) > 1 else ''}: {part}\n "
+            for i, part in enumerate(parts)
+        ]
+        part_infos = await asyncio.gather(*[summarize_part(record_prompt) for record_prompt in record_prompts])
+        for part, infos in zip(parts, part_infos):
+            if infos is None:
+                chunking_stats.failed_chunks += 1
+            else:
+                chunking_stats.chars_summarized += len(part)
+        new_record_infos = [info for infos in part_infos if infos for info in infos]
+
+        if len(parts) > 1 and len(new_record_infos) > 1:
+            reduce_prompt = f"User Instruction:{task}. \n Current Search Query:\n {query_task}\n The records below were extracted from consecutive parts of the same source. Merge them into one list in the same JSON format: combine records about the same facts, keep every distinct data point and figure and keep url and title.\n Records:\n {json.dumps(new_record_infos, indent=4)}\n "
+            merged_infos = await summarize_part(reduce_prompt)
+            if merged_infos:
+                new_record_infos = merged_infos
+        if digest and None not in part_infos:
+            page_cache.put_records(digest, task, new_record_infos)
+        return new_record_infos
+
+    async def record_iteration(search_iteration, query_plan, query_tasks, query_results, previous_recording):
+        """Summarize all pages of one iteration concurrently and merge them in order, without duplicates"""
+        query_result_dir = os.path.join(save_dir, "query_results")
+        os.makedirs(query_result_dir, exist_ok=True)
+        pages = []
+        for i in range(len(query_tasks)):
+            query_result = query_results[i]
+            if not query_result:
+                continue
+            querr_save_path = os.path.join(query_result_dir, f"{search_iteration}-{i}.md")
+            logger.info(f"save query: {query_tasks[i]} at {querr_save_path}")
+            with open(querr_save_path, "w", encoding="utf-8") as fw:
+                fw.write(f"Query: {query_tasks[i]}\n")
+                fw.write(query_result)
+            # one extracted page each, long pages are split by record_page
+            for query_result_ in query_result.split("Extracted page content:"):
+                if query_result_:
+                    hash_match = CONTENT_HASH_PATTERN.search(query_result_) if page_cache else None
+                    pages.append((query_tasks[i], query_result_, hash_match.group(1) if hash_match else None))
+
+        # the previous iteration's records go first and are part of "Previous Recorded Information"
+        if previous_recording:
+            await previous_recording
+        start_time = time.time()
+        chunk_infos = await asyncio.gather(*[record_page(search_iteration, query_plan, query_task, page_text, digest)
+                                             for query_task, page_text, digest in pages])
+        new_infos = []
+        for new_record_infos in chunk_infos:
+            for info in new_record_infos:
+                key = record_key(info)
+                if key in recorded_keys:
+                    if near_duplicate_filter:
+                        near_duplicate_filter.add_exact_duplicate()
+                    continue
+                if near_duplicate_filter and not near_duplicate_filter.add(info):
+                    continue
+                recorded_keys.add(key)
+                history_infos.append(info)
+                research_index.add([info])
+                new_infos.append(info)
+        logger.info(f"📝 Recorded {len(new_infos)} new items from {len(pages)} pages of iteration {search_iteration} "
+                    f"in {time.time() - start_time:.1f}s")
+        gain_tracker.add(search_iteration, len(query_tasks), len(new_infos), gain_tracker.count_new_urls(new_infos))
+        session.complete_recording(search_iteration)
+
+    async def plan_queries():
+        """Plan the next queries from what was found so far"""
+        history_query_ = json.dumps(history_query, indent=4)
+        history_infos_ = research_index.context(" ".join([task] + history_query[-max_query_num:]),
+                                                context_token_budget)
+        query_prompt = f"This is search {search_iteration} of {max_search_iterations} maximum searches allowed.\n User Instruction:{task} \n Previous Queries:\n {history_query_} \n Previous Search Results:\n {history_infos_}\n"
+        search_messages.append(HumanMessage(content=query_prompt))
+        ai_query_msg = await llm.ainvoke(search_messages[:1] + search_messages[1:][-1:])
+        search_messages.append(ai_query_msg)
+        if hasattr(ai_query_msg, "reasoning_content"):
+            logger.info("🤯 Start Search Deep Thinking: ")
+            logger.info(ai_query_msg.reasoning_content)
+            logger.info("🤯 End Search Deep Thinking")
+        ai_query_content = ai_query_msg.content.replace("```json", "").replace("```", "")
+        ai_query_content = repair_json(ai_query_content)
+        ai_query_content = json.loads(ai_query_content)
+        query_plan = ai_query_content["plan"]
+        logger.info(f"Current Iteration {search_iteration} Planing:")
+        logger.info(query_plan)
+        query_tasks = ai_query_content["queries"]
+        if query_tasks and query_similarity_threshold is not None:
+            query_tasks, repeated_queries = filter_repeated_queries(query_tasks, history_query,
+                                                                    query_similarity_threshold)
+            if repeated_queries:
+                gain_tracker.stats.repeated_queries += len(repeated_queries)
+                logger.info(f"🔁 Skipping queries searched before: {repeated_queries}")
+                if not query_tasks:
+                    gain_tracker.stop("only repeated queries were planned", search_iteration - 1,
+                                      max_search_iterations)
+        if query_tasks:
+            query_tasks = query_tasks[:max_query_num]
+            history_query.extend(query_tasks)
+            logger.info("Query tasks:")
+            logger.info(query_tasks)
+        return query_plan, query_tasks
+
+    report_kwargs = dict(
+        token_budget=kwargs.get("report_token_budget", 32000),
+        # called with the partial report while it is written
+        progress_callback=kwargs.get("report_callback", None),
+        parallel_sections=kwargs.get("parallel_report_sections", False),
+        max_concurrency=kwargs.get("record_concurrency", 4),
+    )
+    pending_recording = None
+    stopped = False
     try:
-        while search_iteration < max_search_iterations:
+        # finish what an interrupted run left: record iterations whose agents all finished
+        for iteration in session.unrecorded_iterations():
+            data = session.iterations[iteration]
+            pending_recording = asyncio.create_task(record_iteration(
+                iteration, data["plan"], data["queries"], session.query_results(iteration), pending_recording))
+        interrupted_iteration = session.incomplete_iteration()
+        if interrupted_iteration:
+            search_iteration = interrupted_iteration - 1
+
+        while not session.finished and search_iteration < max_search_iterations:
             search_iteration += 1
             logger.info(f"Start {search_iteration}th Search...")
-            history_query_ = json.dumps(history_query, indent=4)
-            history_infos_ = json.dumps(history_infos, indent=4)
-            query_prompt = f"This is search {search_iteration} of {max_search_iterations} maximum searches allowed.\n User Instruction:{task} \n Previous Queries:\n {history_query_} \n Previous Search Results:\n {history_infos_}\n"
-            search_messages.append(HumanMessage(content=query_prompt))
-            ai_query_msg = llm.invoke(search_messages[:1] + search_messages[1:][-1:])
-            search_messages.append(ai_query_msg)
-            if hasattr(ai_query_msg, "reasoning_content"):
-                logger.info("🤯 Start Search Deep Thinking: ")
-                logger.info(ai_query_msg.reasoning_content)
-                logger.info("🤯 End Search Deep Thinking")
-            ai_query_content = ai_query_msg.content.replace("```json", "").replace("```", "")
-            ai_query_content = repair_json(ai_query_content)
-            ai_query_content = json.loads(ai_query_content)
-            query_plan = ai_query_content["plan"]
-            logger.info(f"Current Iteration {search_iteration} Planing:")
-            logger.info(query_plan)
-            query_tasks = ai_query_content["queries"]
-            if not query_tasks:
-                break
+            # 1. Plan, or pick up the queries of the interrupted iteration
+            if search_iteration == interrupted_iteration:
+                query_plan = session.iterations[search_iteration]["plan"]
+                query_tasks = session.iterations[search_iteration]["queries"]
+                query_results = session.query_results(search_iteration)
+                logger.info(f"Resuming iteration {search_iteration}, "
+                            f"{query_results.count(None)}/{len(query_tasks)} queries left")
             else:
-                query_tasks = query_tasks[:max_query_num]
-                history_query.extend(query_tasks)
-                logger.info("Query tasks:")
-                logger.info(query_tasks)
+                if gain_tracker.deciding and pending_recording and not pending_recording.done():
+                    # the gain of the last iteration decides whether to go on
+                    await pending_recording
+                if gain_tracker.converged:
+                    gain_tracker.stop(f"information gain below {gain_tracker.min_gain} for "
+                                      f"{gain_tracker.patience} iterations", search_iteration - 1, max_search_iterations)
+                    break
+                query_plan, query_tasks = await plan_queries()
+                if not query_tasks:
+                    if not gain_tracker.stats.stopped_early:
+                        gain_tracker.stop("no more queries were planned", search_iteration - 1, max_search_iterations)
+                    break
+                session.start_iteration(search_iteration, query_plan, query_tasks)
+                query_results = [None] * len(query_tasks)
 
             # 2. Perform Web Search and Auto exec
             # Parallel BU agents
             add_infos = "1. Please click on the most relevant link to get information and go deeper, instead of just staying on the search page. \n" \
                         "2. When opening a PDF file, please remember to extract the content using extract_content instead of simply opening it for the user to view.\n"
-            if use_own_browser:
-                agent = CustomAgent(
-                    task=query_tasks[0],
-                    llm=llm,
-                    add_infos=add_infos,
-                    browser=browser,
-                    browser_context=browser_context,
-                    use_vision=use_vision,
-                    system_prompt_class=CustomSystemPrompt,
-                    agent_prompt_class=CustomAgentMessagePrompt,
-                    max_actions_per_step=5,
-                    controller=controller
-                )
-                agent_result = await agent.run(max_steps=kwargs.get("max_steps", 10))
-                query_results = [agent_result]
-                # Manually close all tab
-                session = await browser_context.get_session()
-                pages = session.context.pages
-                await browser_context.create_new_tab()
-                for page_id, page in enumerate(pages):
-                    await page.close()
 
-            else:
-                agents = [CustomAgent(
-                    task=task,
-                    llm=llm,
-                    add_infos=add_infos,
-                    browser=browser,
-                    browser_context=browser_context,
-                    use_vision=use_vision,
-                    system_prompt_class=CustomSystemPrompt,
-                    agent_prompt_class=CustomAgentMessagePrompt,
-                    max_actions_per_step=5,
-                    controller=controller,
-                ) for task in query_tasks]
-                query_results = await asyncio.gather(
-                    *[agent.run(max_steps=kwargs.get("max_steps", 10)) for agent in agents])
+            async def run_query_agent(index, query_task):
+                async with query_context() as agent_context:
+                    agent = CustomAgent(
+                        task=query_task,
+                        llm=llm,
+                        add_infos=add_infos,
+                        browser=agent_context.browser,
+                        browser_context=agent_context,
+                        use_vision=use_vision,
+                        system_prompt_class=CustomSystemPrompt,
+                        agent_prompt_class=CustomAgentMessagePrompt,
+                        max_actions_per_step=5,
+                        controller=controller,
+                    )
+                    agent_result = await agent.run(max_steps=kwargs.get("max_steps", 10))
+                query_results[index] = agent_result.final_result()
+                # a stopped agent did not finish its query, it runs again on resume
+                if not (agent_state and agent_state.is_stop_requested()):
+                    session.complete_query(search_iteration, index, query_results[index])
+
+            # let the other agents finish and save their results before raising
+            agent_errors = await asyncio.gather(*[run_query_agent(index, query_task)
+                                                  for index, query_task in enumerate(query_tasks)
+                                                  if query_results[index] is None], return_exceptions=True)
+            for agent_error in agent_errors:
+                if isinstance(agent_error, Exception):
+                    raise agent_error
 
             if agent_state and agent_state.is_stop_requested():
                 # Stop
+                stopped = True
                 break
-            # 3. Summarize Search Result
-            query_result_dir = os.path.join(save_dir, "query_results")
-            os.makedirs(query_result_dir, exist_ok=True)
-            for i in range(len(query_tasks)):
-                query_result = query_results[i].final_result()
-                if not query_result:
-                    continue
-                querr_save_path = os.path.join(query_result_dir, f"{search_iteration}-{i}.md")
-                logger.info(f"save query: {query_tasks[i]} at {querr_save_path}")
-                with open(querr_save_path, "w", encoding="utf-8") as fw:
-                    fw.write(f"Query: {query_tasks[i]}\n")
-                    fw.write(query_result)
-                # split query result in case the content is too long
-                query_results_split = query_result.split("Extracted page content:")
-                for qi, query_result_ in enumerate(query_results_split):
-                    if not query_result_:
-                        continue
-                    else:
-                        # TODO: limit content lenght: 128k tokens, ~3 chars per token
-                        query_result_ = query_result_[:128000 * 3]
-                    history_infos_ = json.dumps(history_infos, indent=4)
-                    record_prompt = f"User Instruction:{task}. \nPrevious Recorded Information:\n {history_infos_}\n Current Search Iteration: {search_iteration}\n Current Search Plan:\n{query_plan}\n Current Search Query:\n {query_tasks[i]}\n Current Search Results: {query_result_}\n "
-                    record_messages.append(HumanMessage(content=record_prompt))
-                    ai_record_msg = llm.invoke(record_messages[:1] + record_messages[-1:])
-                    record_messages.append(ai_record_msg)
-                    if hasattr(ai_record_msg, "reasoning_content"):
-                        logger.info("🤯 Start Record Deep Thinking: ")
-                        logger.info(ai_record_msg.reasoning_content)
-                        logger.info("🤯 End Record Deep Thinking")
-                    record_content = ai_record_msg.content
-                    record_content = repair_json(record_content)
-                    new_record_infos = json.loads(record_content)
-                    history_infos.extend(new_record_infos)
+            # 3. Summarize Search Result, overlapping with planning and browsing of the next iteration
+            pending_recording = asyncio.create_task(
+                record_iteration(search_iteration, query_plan, query_tasks, query_results, pending_recording))
+            if not overlap_recording:
+                await pending_recording
             if agent_state and agent_state.is_stop_requested():
                 # Stop
+                stopped = True
                 break
 
+        if pending_recording:
+            await pending_recording
+        if not stopped:
+            session.finish()
         logger.info("\nFinish Searching, Start Generating Report...")
+        if resource_policy:
+            resource_policy.log_stats()
+        if http_cache:
+            http_cache.log_stats()
+        content_extractor.log_stats()
+        logger.info(f"📝 Summarized {chunking_stats.pages} pages in {chunking_stats.chunks} chunks, "
+                    f"{chunking_stats.split_pages} pages split, coverage {chunking_stats.coverage:.1%}")
+        with open(os.path.join(save_dir, "chunking_stats.json"), "w", encoding="utf-8") as fw:
+            json.dump(chunking_stats.to_dict(), fw, indent=4)
+        if near_duplicate_filter:
+            near_duplicate_filter.log_stats()
+            with open(os.path.join(save_dir, "dedup_stats.json"), "w", encoding="utf-8") as fw:
+                json.dump(near_duplicate_filter.stats.to_dict(), fw, indent=4)
+        gain_tracker.log_stats()
+        with open(os.path.join(save_dir, "information_gain_stats.json"), "w", encoding="utf-8") as fw:
+            json.dump(gain_tracker.stats.to_dict(), fw, indent=4)
+        if page_cache:
+            page_cache.log_stats()
+            with open(os.path.join(save_dir, "page_cache_stats.json"), "w", encoding="utf-8") as fw:
+                json.dump(page_cache.stats.to_dict(), fw, indent=4)
 
         # 5. Report Generation in Markdown (or JSON if you prefer)
-        return await generate_final_report(task, history_infos, save_dir, llm)
+        return await generate_final_report(task, history_infos, save_dir, llm, **report_kwargs)
 
     except Exception as e:
         logger.error(f"Deep research Error: {e}")
-        return await generate_final_report(task, history_infos, save_dir, llm, str(e))
+        if pending_recording:
+            # keep what the last iteration recorded
+            try:
+                await pending_recording
+            except Exception as record_error:
+                logger.error(f"Recording Error: {record_error}")
+        return await generate_final_report(task, history_infos, save_dir, llm, str(e), **report_kwargs)
     finally:
         if browser:
             await browser.close()
-        if browser_context:
-            await browser_context.close()
+        if browser_pool:
+            await browser_pool.close()
         logger.info("Browser closed.")
 
-async def generate_final_report(task, history_infos, save_dir, llm, error_msg=None):
+def clean_report(report_content):
+    """Drop reasoning and the code fence some models wrap the report in"""
+    if "<think>" in report_content:
+        report_content = report_content.split("</think>", 1)[1] if "</think>" in report_content else ""
+    report_content = re.sub(r"^```\s*markdown\s*|^\s*```|```\s*$", "", report_content, flags=re.MULTILINE)
+    return report_content.strip()
+
+
+class ReportStream:
+    """
+    The report while it is written: rewritten to `final_report.md` and handed to `progress_callback`
+    at most every `interval` seconds, so the UI and the API can show it before the LLM is done.
+    Secrets the agents came across are masked in both.
+    """
+
+    def __init__(self, path, progress_callback=None, header="", interval=0.5):
+        self.path = path
+        self.progress_callback = progress_callback
+        self.header = header
+        self.interval = interval
+        self._last_update = 0.0
+
+    def _write(self, report_content):
+        report_content = SecretStore().mask(report_content)
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(report_content)
+        if self.progress_callback:
+            try:
+                self.progress_callback(report_content)
+            except Exception as e:
+                logger.debug(f"Report progress callback failed: {e}")
+        return report_content
+
+    def update(self, partial_content):
+        if time.monotonic() - self._last_update >= self.interval:
+            self._last_update = time.monotonic()
+            self._write(self.header + partial_content)
+
+    def finish(self, report_content):
+        return self._write(report_content)
+
+
+async def stream_report_part(llm, messages, on_update):
+    """Stream one LLM answer, on_update gets the text so far after every chunk"""
+    content = ""
+    async for chunk in llm.astream(messages):
+        if isinstance(chunk.content, str):
+            content += chunk.content
+        on_update(content)
+    return content
+
+
+async def write_report_sections(task, history_infos, llm, report_stream, token_budget, max_concurrency=4):
+    """
+    Plan an outline, draft its sections concurrently and stitch them together with one reference list.
+    Returns None if no outline could be planned.
+    """
+    # one number per source for all sections, so citations line up once stitched
+    sources = {}
+    numbered_infos = []
+    for info in history_infos:
+        if isinstance(info, dict):
+            source = (info.get("title", "unknown"), info.get("url", "unknown"))
+            info = {**info, "source": sources.setdefault(source, len(sources) + 1)}
+        numbered_infos.append(info)
+    research_index = ResearchIndex(numbered_infos)
+
+    outline_prompt = f"User Instruction:{task} \n Search Information:\n {research_index.context(task, token_budget // 2, max_titles=500)}"
+    outline_msg = await llm.ainvoke([SystemMessage(content=outline_system_prompt), HumanMessage(content=outline_prompt)])
+    try:
+        outline = json.loads(repair_json(clean_report(outline_msg.content)))
+        title = outline["title"]
+        sections = [section for section in outline["sections"] if section.get("heading")]
+    except Exception as e:
+        logger.warning(f"Failed to plan report outline, writing the report in one pass: {e}")
+        return None
+    if not sections:
+        return None
+    logger.info(f"📝 Writing {len(sections)} report sections in parallel")
+
+    drafts = [""] * len(sections)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    outline_text = "\n".join(f"- {section['heading']}" for section in sections)
+
+    def stitched():
+        return f"# {title}\n\n" + "\n\n".join(clean_report(draft) for draft in drafts if draft)
+
+    async def write_section(index, section):
+        query = f"{section['heading']} {section.get('focus', '')}"
+        section_prompt = f"User Instruction:{task} \n Report Outline:\n{outline_text}\n Current Section: {section['heading']}\n Section Focus: {section.get('focus', '')}\n Search Information:\n {research_index.context(query, token_budget, max_titles=200)}"
+        messages = [SystemMessage(content=section_system_prompt), HumanMessage(content=section_prompt)]
+
+        def on_update(text):
+            drafts[index] = text
+            report_stream.update(stitched())
+
+        async with semaphore:
+            drafts[index] = await stream_report_part(llm, messages, on_update)
+
+    await asyncio.gather(*[write_section(index, section) for index, section in enumerate(sections)])
+
+    report_content = stitched()
+    cited = sorted({int(number) for number in re.findall(r"\[(\d+)\]", report_content)})
+    source_by_number = {number: source for source, number in sources.items()}
+    references = [f"[{number}] {source_by_number[number][0]} ({source_by_number[number][1]})"
+                  for number in cited if number in source_by_number]
+    if references:
+        report_content += "\n\n## References\n\n" + "\n".join(references)
+    return report_content
+
+
+outline_system_prompt = """
+You are a **Deep Researcher** planning a report. Given the user's instruction and the gathered information, output the report's title and its sections as JSON, and nothing else:
+
+```json
+{"title": "Report title", "sections": [{"heading": "Section heading", "focus": "What this section covers and which findings belong in it"}]}
+```
+
+Use 3 to 8 sections that together fully answer the instruction, starting with an introduction and ending with a conclusion. Do not add a references section.
+"""
+
+section_system_prompt = """
+You are a **Deep Researcher** and a professional report writer writing **one section** of a larger Markdown report. Other writers write the other sections of the outline at the same time.
+
+*   Start with the section heading as a `##` heading and write only this section, covering its focus in depth with the key data and figures from the Search Information. Use tables and sub headings where they help.
+*   Do not repeat what belongs to other sections of the outline and do not write an introduction or conclusion for the whole report unless this section is one.
+*   Cite sources inline with the number in their `source` field, e.g. `[3]`. Do not add a references list, it is added to the report for you.
+*   Output only the Markdown of the section.
+"""
+
+
+async def generate_final_report(task, history_infos, save_dir, llm, error_msg=None, token_budget=None,
+                                progress_callback=None, parallel_sections=False, max_concurrency=4):
     """Generate report from collected information with error handling"""
     try:
         logger.info("\nAttempting to generate final report from collected data...")
@@ -346,35 +729,38 @@ async def generate_final_report(task, history_infos, save_dir, llm, error_msg=No
 2. **Search Information:** Information gathered from the search queries.
         """
 
-        history_infos_ = json.dumps(history_infos, indent=4)
         record_json_path = os.path.join(save_dir, "record_infos.json")
         logger.info(f"save All recorded information at {record_json_path}")
         with open(record_json_path, "w") as fw:
             json.dump(history_infos, fw, indent=4)
-        report_prompt = f"User Instruction:{task} \n Search Information:\n {history_infos_}"
-        report_messages = [SystemMessage(content=writer_system_prompt),
-                           HumanMessage(content=report_prompt)]  # New context for report generation
-        ai_report_msg = llm.invoke(report_messages)
-        if hasattr(ai_report_msg, "reasoning_content"):
-            logger.info("🤯 Start Report Deep Thinking: ")
-            logger.info(ai_report_msg.reasoning_content)
-            logger.info("🤯 End Report Deep Thinking")
-        report_content = ai_report_msg.content
-        report_content = re.sub(r"^```\s*markdown\s*|^\s*```|```\s*$", "", report_content, flags=re.MULTILINE)
-        report_content = report_content.strip()
 
+        report_header = ""
         # Add error notification to the report
         if error_msg:
-            report_content = f"## ⚠️ Research Incomplete - Partial Results\n" \
-                            f"**The research process was interrupted by an error:** {error_msg}\n\n" \
-                            f"{report_content}"
-            
+            report_header = f"## ⚠️ Research Incomplete - Partial Results\n" \
+                            f"**The research process was interrupted by an error:** {error_msg}\n\n"
         report_file_path = os.path.join(save_dir, "final_report.md")
-        with open(report_file_path, "w", encoding="utf-8") as f:
-            f.write(report_content)
+        report_stream = ReportStream(report_file_path, progress_callback, header=report_header)
+
+        report_content = None
+        if parallel_sections:
+            report_content = await write_report_sections(task, history_infos, llm, report_stream,
+                                                         token_budget or 16000, max_concurrency)
+        if report_content is None:
+            if token_budget:
+                history_infos_ = ResearchIndex(history_infos).context(task, token_budget, max_titles=500)
+            else:
+                history_infos_ = json.dumps(history_infos, indent=4)
+            report_prompt = f"User Instruction:{task} \n Search Information:\n {history_infos_}"
+            report_messages = [SystemMessage(content=writer_system_prompt),
+                               HumanMessage(content=report_prompt)]  # New context for report generation
+            report_content = await stream_report_part(llm, report_messages,
+                                                      lambda text: report_stream.update(clean_report(text)))
+        report_content = report_header + clean_report(report_content)
+        report_content = report_stream.finish(report_content)
         logger.info(f"Save Report at: {report_file_path}")
         return report_content, report_file_path
 
     except Exception as report_error:
         logger.error(f"Failed to generate partial report: {report_error}")
-        return f"Error generating report: {str(report_error)}", None
+        return SecretStore().mask(f"Error generating report: {str(report_error)}"), None
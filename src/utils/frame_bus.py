@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Frame:
+    data: str  # base64 encoded image, shared by reference with the publisher
+    version: int
+    source: str  # "step" (agent state screenshot) or "screencast"
+    image_format: str = "png"
+    step: Optional[int] = None
+    url: Optional[str] = None
+    timestamp: float = 0.0
+
+
+class FrameBus:
+    """
+    Latest-frame bus for one agent run.
+
+    Publishers (the agent's step screenshots, the screencast) hand over the base64 image they already
+    have. Subscribers (the Gradio live view, the API live view) read the latest frame, nothing is copied
+    or captured again. Slow subscribers simply skip to the newest frame.
+    """
+
+    def __init__(self):
+        self.latest: Optional[Frame] = None
+        self._version = 0
+        self._changed = asyncio.Condition()
+        self.closed = False
+        self._last_read = 0.0
+
+    def publish(
+            self,
+            data: str,
+            source: str,
+            image_format: str = "png",
+            step: Optional[int] = None,
+            url: Optional[str] = None,
+    ) -> Optional[Frame]:
+        if not data or self.closed:
+            return None
+        self._version += 1
+        self.latest = Frame(
+            data=data,
+            version=self._version,
+            source=source,
+            image_format=image_format,
+            step=step,
+            url=url,
+            timestamp=time.time(),
+        )
+        asyncio.ensure_future(self._notify())
+        return self.latest
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def wait_for_frame(self, after_version: int = 0, timeout: Optional[float] = None) -> Optional[Frame]:
+        """Return the first frame newer than `after_version`, or None on timeout / when the bus is closed"""
+        self._last_read = time.monotonic()
+        async with self._changed:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self.closed or self._version > after_version),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                return None
+        if self.latest is None or self.latest.version <= after_version:
+            return None
+        return self.latest
+
+    async def subscribe(self, timeout: Optional[float] = None) -> AsyncIterator[Optional[Frame]]:
+        """Yield every new latest frame, or None after `timeout` seconds without one, until the bus is closed"""
+        version = 0
+        while not self.closed:
+            frame = await self.wait_for_frame(version, timeout)
+            if frame is not None:
+                version = frame.version
+            yield frame
+
+    def watched(self, within: float = 30.0) -> bool:
+        """Whether a subscriber asked for a frame in the last `within` seconds"""
+        return time.monotonic() - self._last_read < within
+
+    def close(self):
+        self.closed = True
+        asyncio.ensure_future(self._notify())
@@ -0,0 +1,367 @@
+"""
+Render an agent history (screenshots plus goals) to GIF, WebP or MP4.
+
+The functions in this module are plain top-level functions so they can run in a process pool:
+the agent only hands over the base64 screenshots it already has, and all decoding, drawing
+and encoding happens off the event loop.
+"""
+import asyncio
+import base64
+import functools
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("gif", "webp", "mp4")
+LOGO_PATH = "./static/browser-use.png"
+LOGO_HEIGHT = 150
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class RenderFrame:
+    screenshot: str  # base64 encoded screenshot, decoded lazily in the renderer
+    step_number: int
+    goal_text: Optional[str] = None
+
+
+def get_render_pool(max_workers: int = 1) -> ProcessPoolExecutor:
+    """Process pool used for rendering, created on first use (i.e. after the first run)"""
+    global _render_pool
+    if _render_pool is None:
+        # spawn: the server process runs playwright threads, forking it is not safe
+        _render_pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _render_pool
+
+
+def shutdown_render_pool() -> None:
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+@functools.lru_cache(maxsize=16)
+def load_font(size: int) -> ImageFont.ImageFont:
+    """Load the first available preferred font, cached per size and process"""
+    for font_name in ['Helvetica', 'Arial', 'DejaVuSans', 'Verdana']:
+        try:
+            if platform.system() == 'Windows':
+                # Need to specify the abs font path on Windows
+                font_name = os.path.join(os.getenv('WIN_FONT_DIR', 'C:\\Windows\\Fonts'), font_name + '.ttf')
+            return ImageFont.truetype(font_name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def _decode(screenshot: str, max_width: Optional[int]) -> Image.Image:
+    image = Image.open(io.BytesIO(base64.b64decode(screenshot)))
+    image = image.convert('RGB')
+    if max_width and image.width > max_width:
+        height = int(image.height * max_width / image.width)
+        image = image.resize((max_width, height), Image.Resampling.LANCZOS)
+    return image
+
+
+def _sample_frames(frames: List[RenderFrame], max_frames: Optional[int]) -> List[RenderFrame]:
+    """Evenly pick at most `max_frames` frames, always keeping the first and the last one"""
+    if not max_frames or len(frames) <= max_frames:
+        return frames
+    if max_frames == 1:
+        return frames[-1:]
+    step = (len(frames) - 1) / (max_frames - 1)
+    return [frames[round(i * step)] for i in range(max_frames)]
+
+
+def _wrap_text(text: str, font: ImageFont.ImageFont, max_width: int) -> str:
+    words = text.split()
+    lines = []
+    current_line = []
+    for word in words:
+        current_line.append(word)
+        bbox = font.getbbox(' '.join(current_line))
+        if bbox[2] > max_width:
+            if len(current_line) == 1:
+                lines.append(current_line.pop())
+            else:
+                current_line.pop()
+                lines.append(' '.join(current_line))
+                current_line = [word]
+    if current_line:
+        lines.append(' '.join(current_line))
+    return '\n'.join(lines)
+
+
+def _load_logo(logo_path: Optional[str], scale: float) -> Optional[Image.Image]:
+    if not logo_path:
+        return None
+    try:
+        with Image.open(logo_path) as logo:
+            height = max(int(LOGO_HEIGHT * scale), 8)
+            return logo.convert('RGBA').resize((int(height * logo.width / logo.height), height),
+                                               Image.Resampling.LANCZOS)
+    except OSError as e:
+        logger.warning(f'Could not load logo: {e}')
+        return None
+
+
+def _paste_logo(image: Image.Image, logo: Optional[Image.Image], margin: int) -> Image.Image:
+    """Logo in the top right corner"""
+    if logo is not None:
+        image.paste(logo, (image.width - logo.width - margin, margin), logo)
+    return image
+
+
+def _create_task_frame(task: str, size: tuple, font: ImageFont.ImageFont, line_spacing: float) -> Image.Image:
+    """Black frame showing the task, same size as the screenshots"""
+    image = Image.new('RGB', size, (0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    margin = min(140, image.width // 10)
+    wrapped_text = _wrap_text(task, font, image.width - 2 * margin)
+    line_height = getattr(font, 'size', 12) * line_spacing
+    lines = wrapped_text.split('\n')
+    text_y = image.height // 2 - (line_height * len(lines)) / 2
+    for line in lines:
+        line_bbox = draw.textbbox((0, 0), line, font=font)
+        text_x = (image.width - (line_bbox[2] - line_bbox[0])) // 2
+        draw.text((text_x, text_y), line, font=font, fill=(255, 255, 255))
+        text_y += line_height
+    return image
+
+
+def _add_overlay(
+        image: Image.Image,
+        step_number: int,
+        goal_text: str,
+        title_font: ImageFont.ImageFont,
+        goal_font: ImageFont.ImageFont,
+        margin: int,
+) -> Image.Image:
+    """Draw the step number (bottom left) and the goal (bottom center) on the frame"""
+    draw = ImageDraw.Draw(image)
+    padding = 20
+    text_color = (255, 255, 255)
+    text_box_color = (0, 0, 0)
+
+    step_text = str(step_number)
+    step_bbox = draw.textbbox((0, 0), step_text, font=title_font)
+    step_width = step_bbox[2] - step_bbox[0]
+    step_height = step_bbox[3] - step_bbox[1]
+    x_step = margin + 10
+    y_step = image.height - margin - step_height - 10
+    draw.rounded_rectangle(
+        (x_step - padding, y_step - padding, x_step + step_width + padding, y_step + step_height + padding),
+        radius=15,
+        fill=text_box_color,
+    )
+    draw.text((x_step, y_step), step_text, font=title_font, fill=text_color)
+
+    if goal_text:
+        wrapped_goal = _wrap_text(goal_text, goal_font, image.width - 4 * margin)
+        goal_bbox = draw.multiline_textbbox((0, 0), wrapped_goal, font=goal_font)
+        goal_width = goal_bbox[2] - goal_bbox[0]
+        goal_height = goal_bbox[3] - goal_bbox[1]
+        x_goal = (image.width - goal_width) // 2
+        y_goal = y_step - goal_height - padding * 4
+        padding_goal = 25
+        draw.rounded_rectangle(
+            (x_goal - padding_goal, y_goal - padding_goal,
+             x_goal + goal_width + padding_goal, y_goal + goal_height + padding_goal),
+            radius=15,
+            fill=text_box_color,
+        )
+        draw.multiline_text((x_goal, y_goal), wrapped_goal, font=goal_font, fill=text_color, align='center')
+    return image
+
+
+def _iter_images(
+        frames: List[RenderFrame],
+        task: Optional[str],
+        show_task: bool,
+        show_goals: bool,
+        font_size: int,
+        title_font_size: int,
+        goal_font_size: int,
+        margin: int,
+        line_spacing: float,
+        max_width: Optional[int],
+        logo_path: Optional[str],
+) -> Iterator[Image.Image]:
+    """Decode and draw frames one at a time so only a couple of images are alive at once"""
+    first = _decode(frames[0].screenshot, max_width)
+    # scale fonts and margins with the output resolution
+    scale = first.width / 1280 if max_width else 1.0
+    title_font = load_font(max(int(title_font_size * scale), 8))
+    goal_font = load_font(max(int(goal_font_size * scale), 8))
+    margin = max(int(margin * scale), 4)
+    logo = _load_logo(logo_path, scale)
+
+    if show_task and task:
+        task_frame = _create_task_frame(task, first.size, load_font(max(int((font_size + 16) * scale), 8)), line_spacing)
+        yield _paste_logo(task_frame, logo, margin)
+
+    for i, frame in enumerate(frames):
+        image = first if i == 0 else _decode(frame.screenshot, max_width)
+        if image.size != first.size:
+            image = image.resize(first.size, Image.Resampling.LANCZOS)
+        if show_goals and frame.goal_text is not None:
+            image = _add_overlay(image, frame.step_number, frame.goal_text, title_font, goal_font, margin)
+        yield _paste_logo(image, logo, margin)
+
+
+def _build_palette(frames: List[RenderFrame], samples: int = 4) -> Image.Image:
+    """Adaptive palette computed once from a few downscaled screenshots and shared by all frames"""
+    picked = _sample_frames(frames, samples)
+    thumbs = [_decode(frame.screenshot, 320) for frame in picked]
+    strip = Image.new('RGB', (sum(t.width for t in thumbs), max(t.height for t in thumbs)), (0, 0, 0))
+    x = 0
+    for thumb in thumbs:
+        strip.paste(thumb, (x, 0))
+        x += thumb.width
+    return strip.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+
+
+def _write_gif(images: Iterator[Image.Image], output_path: str, duration: int, palette: Image.Image) -> None:
+    # One shared palette: no per-frame palette computation and much smaller files
+    quantized = (image.quantize(palette=palette, dither=Image.Dither.NONE) for image in images)
+    first = next(quantized)
+    first.save(
+        output_path,
+        format='GIF',
+        save_all=True,
+        append_images=quantized,
+        duration=duration,
+        loop=0,
+        optimize=True,
+    )
+
+
+def _write_webp(images: Iterator[Image.Image], output_path: str, duration: int, quality: int) -> None:
+    first = next(images)
+    first.save(
+        output_path,
+        format='WEBP',
+        save_all=True,
+        append_images=images,
+        duration=duration,
+        loop=0,
+        quality=quality,
+        method=4,
+    )
+
+
+def _write_mp4(images: Iterator[Image.Image], output_path: str, duration: int) -> None:
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        raise RuntimeError('MP4 output requires ffmpeg to be installed and on PATH')
+    first = next(images)
+    # yuv420p needs even dimensions
+    width, height = first.width - first.width % 2, first.height - first.height % 2
+    process = subprocess.Popen(
+        [
+            ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}',
+            '-framerate', f'1000/{duration}', '-i', '-',
+            '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-r', '10',
+            output_path,
+        ],
+        stdin=subprocess.PIPE,
+    )
+    try:
+        for image in itertools.chain([first], images):
+            process.stdin.write(image.crop((0, 0, width, height)).tobytes())
+    finally:
+        process.stdin.close()
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f'ffmpeg exited with code {process.returncode}')
+
+
+def render_history(
+        frames: List[RenderFrame],
+        output_path: str,
+        task: Optional[str] = None,
+        output_format: Optional[str] = None,
+        duration: int = 3000,
+        show_goals: bool = True,
+        show_task: bool = True,
+        font_size: int = 40,
+        title_font_size: int = 56,
+        goal_font_size: int = 44,
+        margin: int = 40,
+        line_spacing: float = 1.5,
+        max_frames: Optional[int] = None,
+        max_width: Optional[int] = None,
+        quality: int = 80,
+        logo_path: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Render history frames to `output_path`.
+
+    :param output_format: gif, webp or mp4. Defaults to the extension of `output_path`.
+    :param max_frames: evenly sample at most this many screenshots.
+    :param max_width: downscale frames wider than this.
+    :param logo_path: image drawn in the top right corner of every frame.
+    :return: the output path, or None if there was nothing to render.
+    """
+    frames = [frame for frame in frames if frame.screenshot]
+    if not frames:
+        logger.warning('No images found in history to render')
+        return None
+
+    output_format = (output_format or os.path.splitext(output_path)[1].lstrip('.') or 'gif').lower()
+    if output_format not in SUPPORTED_FORMATS:
+        raise ValueError(f'Unsupported output format: {output_format}, use one of {SUPPORTED_FORMATS}')
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    images = _iter_images(
+        _sample_frames(frames, max_frames),
+        task=task,
+        show_task=show_task,
+        show_goals=show_goals,
+        font_size=font_size,
+        title_font_size=title_font_size,
+        goal_font_size=goal_font_size,
+        margin=margin,
+        line_spacing=line_spacing,
+        max_width=max_width,
+        logo_path=logo_path,
+    )
+    if output_format == 'gif':
+        _write_gif(images, output_path, duration, _build_palette(frames))
+    elif output_format == 'webp':
+        _write_webp(images, output_path, duration, quality)
+    else:
+        _write_mp4(images, output_path, duration)
+
+    logger.info(f'Created {output_format.upper()} at {output_path}')
+    return output_path
+
+
+async def render_history_async(frames: List[RenderFrame], output_path: str, **kwargs) -> Optional[str]:
+    """Render in the process pool and return the output path without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_render_pool(),
+        functools.partial(render_history, frames, output_path, **kwargs),
+    )
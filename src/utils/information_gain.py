@@ -0,0 +1,118 @@
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from .page_cache import normalize_url
+from .research_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+def _query_terms(query: str) -> set:
+    # crude plural folding, "laptops review" and "laptop reviews" are the same search
+    return {term[:-1] if len(term) > 3 and term.endswith("s") else term for term in tokenize(query)}
+
+
+def query_similarity(query: str, other: str) -> float:
+    """Jaccard similarity of the two queries' terms"""
+    terms, other_terms = _query_terms(query), _query_terms(other)
+    if not terms or not other_terms:
+        return 0.0
+    return len(terms & other_terms) / len(terms | other_terms)
+
+
+def filter_repeated_queries(queries: List[str], previous: List[str],
+                            threshold: float = 0.8) -> Tuple[List[str], List[str]]:
+    """Split planned queries into new ones and ones that repeat a previous or an earlier planned query"""
+    kept, repeated = [], []
+    for query in queries:
+        if any(query_similarity(query, other) >= threshold for other in previous + kept):
+            repeated.append(query)
+        else:
+            kept.append(query)
+    return kept, repeated
+
+
+@dataclass
+class InformationGainStats:
+    iterations: List[dict] = field(default_factory=list)
+    repeated_queries: int = 0
+    stopped_early: bool = False
+    stop_reason: Optional[str] = None
+    iterations_saved: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "iterations": self.iterations,
+            "repeated_queries": self.repeated_queries,
+            "stopped_early": self.stopped_early,
+            "stop_reason": self.stop_reason,
+            "iterations_saved": self.iterations_saved,
+        }
+
+
+class InformationGainTracker:
+    """
+    Information gain of every deep research iteration, to stop once searching stops paying off.
+
+    The gain of an iteration is the number of new deduplicated records plus new source urls, per query
+    it ran. The research should stop when the gain stayed below `min_gain` for `patience` iterations
+    in a row.
+    """
+
+    def __init__(self, min_gain: float = 1.0, patience: int = 2):
+        self.min_gain = min_gain
+        self.patience = patience
+        self.stats = InformationGainStats()
+        self.low_gain_streak = 0
+        self._seen_urls = set()
+
+    def seed(self, records: List[dict]):
+        """Know the sources of records kept earlier, e.g. by a resumed research"""
+        self.count_new_urls(records)
+
+    def count_new_urls(self, records: List[dict]) -> int:
+        new_urls = 0
+        for record in records:
+            url = record.get("url") if isinstance(record, dict) else None
+            if not url or url == "unknown":
+                continue
+            url = normalize_url(url)
+            if url not in self._seen_urls:
+                self._seen_urls.add(url)
+                new_urls += 1
+        return new_urls
+
+    def add(self, iteration: int, queries: int, new_records: int, new_urls: int) -> float:
+        gain = (new_records + new_urls) / max(queries, 1)
+        self.stats.iterations.append({
+            "iteration": iteration,
+            "queries": queries,
+            "new_records": new_records,
+            "new_urls": new_urls,
+            "gain": round(gain, 4),
+        })
+        self.low_gain_streak = self.low_gain_streak + 1 if gain < self.min_gain else 0
+        logger.info(f"📈 Information gain of iteration {iteration}: {gain:.2f} per query "
+                    f"({new_records} new records, {new_urls} new sources)")
+        return gain
+
+    @property
+    def converged(self) -> bool:
+        return self.low_gain_streak >= self.patience
+
+    @property
+    def deciding(self) -> bool:
+        """The next gain decides whether to stop"""
+        return self.low_gain_streak + 1 >= self.patience
+
+    def stop(self, reason: str, last_iteration: int, max_iterations: int):
+        self.stats.stopped_early = True
+        self.stats.stop_reason = reason
+        self.stats.iterations_saved = max(max_iterations - last_iteration, 0)
+
+    def log_stats(self):
+        if self.stats.stopped_early:
+            logger.info(f"⏹️ Stopped early ({self.stats.stop_reason}), saved {self.stats.iterations_saved} iterations")
+        if self.stats.repeated_queries:
+            logger.info(f"🔁 Skipped {self.stats.repeated_queries} repeated queries")
@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import re
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional
+
+import numpy as np
+
+from .research_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# word pairs, summaries are short and a changed word should only change a few features
+SHINGLE_SIZE = 2
+
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+
+# number of set bits of every byte value
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+_BITS = np.arange(64, dtype=np.uint64)
+
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def shingles(tokens: List[str]) -> List[str]:
+    if len(tokens) < SHINGLE_SIZE:
+        return tokens
+    return [" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)]
+
+
+def simhash(text: str) -> Optional[int]:
+    """64 bit SimHash over word shingles, texts that share most shingles differ in few bits"""
+    features = shingles(tokenize(text))
+    if not features:
+        return None
+    hashes = np.fromiter((_hash64(feature) for feature in features), dtype=np.uint64, count=len(features))
+    bits = ((hashes[:, None] >> _BITS) & np.uint64(1)).astype(np.int64)
+    votes = (2 * bits - 1).sum(axis=0)
+    return int(((votes > 0).astype(np.uint64) << _BITS).sum())
+
+
+def jaccard(features: FrozenSet[str], other: FrozenSet[str]) -> float:
+    if not features or not other:
+        return 0.0
+    return len(features & other) / len(features | other)
+
+
+def numeric_tokens(text: str) -> FrozenSet[str]:
+    """The figures in a text, "1,200" and "1200" are the same figure"""
+    return frozenset(number.replace(",", "") for number in NUMBER_PATTERN.findall(text))
+
+
+def hamming_distances(fingerprint: int, fingerprints: np.ndarray) -> np.ndarray:
+    differences = np.bitwise_xor(fingerprints, np.uint64(fingerprint))
+    return _POPCOUNT[differences.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+@dataclass
+class NearDuplicateStats:
+    records: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Share of the recorded items that were dropped as duplicates"""
+        return (self.exact_duplicates + self.near_duplicates) / self.records if self.records else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "records": self.records,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "dedup_ratio": round(self.dedup_ratio, 4),
+        }
+
+
+class NearDuplicateFilter:
+    """
+    Drop recorded items whose `summary_content` is nearly the same as one that was kept.
+
+    Summaries are fingerprinted with SimHash, items whose fingerprints differ in at most `max_distance`
+    of 64 bits are candidates. SimHash of short summaries is coarse: swapping a single word changes
+    about 5 to 10 bits, whether it rewords the summary or turns "increased housing costs" into "reduced
+    housing costs". A candidate is only dropped when the two summaries also share `min_similarity` of
+    their word shingles (Jaccard), which a changed word in a short summary stays well below, and all
+    of its figures are in the item it duplicates ("range of 341 miles" and "range of 310 miles" are
+    different facts). With `merge`, the url of a dropped item is added to `other_urls` of the item it
+    duplicates.
+    """
+
+    def __init__(self, max_distance: int = 4, min_similarity: float = 0.9, merge: bool = True):
+        self.max_distance = max_distance
+        self.min_similarity = min_similarity
+        self.merge = merge
+        self.stats = NearDuplicateStats()
+        self._fingerprints = np.zeros(0, dtype=np.uint64)
+        self._records: List[dict] = []
+        self._numbers: List[FrozenSet[str]] = []
+        self._shingles: List[FrozenSet[str]] = []
+
+    def add(self, record) -> bool:
+        """Keep the record's fingerprint and return True, or return False for a near duplicate"""
+        self.stats.records += 1
+        if not isinstance(record, dict):
+            return True
+        summary = str(record.get("summary_content", ""))
+        fingerprint = simhash(summary)
+        if fingerprint is None:
+            return True
+        numbers = numeric_tokens(summary)
+        features = frozenset(shingles(tokenize(summary)))
+        if len(self._fingerprints):
+            distances = hamming_distances(fingerprint, self._fingerprints)
+            candidates = np.flatnonzero(distances <= self.max_distance)
+            for index in candidates[np.argsort(distances[candidates], kind="stable")]:
+                # a summary with figures of its own holds data the kept one doesn't
+                if numbers <= self._numbers[index] and \
+                        jaccard(features, self._shingles[index]) >= self.min_similarity:
+                    self.stats.near_duplicates += 1
+                    if self.merge:
+                        self._merge(self._records[index], record)
+                    return False
+        self._fingerprints = np.append(self._fingerprints, np.uint64(fingerprint))
+        self._records.append(record)
+        self._numbers.append(numbers)
+        self._shingles.append(features)
+        return True
+
+    def add_exact_duplicate(self):
+        """Count an item that was dropped before fingerprinting, as an exact copy of a kept one"""
+        self.stats.records += 1
+        self.stats.exact_duplicates += 1
+
+    def seed(self, records: List[dict]):
+        """Fingerprint items kept earlier, e.g. by a resumed research, without counting them"""
+        for record in records:
+            self.add(record)
+        self.stats = NearDuplicateStats()
+
+    def _merge(self, kept: dict, duplicate: dict):
+        url = duplicate.get("url")
+        if url and url != "unknown" and url != kept.get("url") and url not in kept.get("other_urls", []):
+            kept.setdefault("other_urls", []).append(url)
+
+    def log_stats(self):
+        logger.info(f"🧹 Dropped {self.stats.exact_duplicates} duplicate and {self.stats.near_duplicates} "
+                    f"near duplicate records of {self.stats.records} ({self.stats.dedup_ratio:.1%})")
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+logger = logging.getLogger(__name__)
+
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid"}
+
+CONTENT_HASH_PATTERN = re.compile(r"Content Hash: ([0-9a-f]{32})")
+
+
+def normalize_url(url: str) -> str:
+    """Same page, same key: lowercase host, no fragment, no tracking parameters, sorted query"""
+    parts = urlparse(url.strip())
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunparse((parts.scheme.lower(), parts.netloc.lower(), path, parts.params, urlencode(query), ""))
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def _key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class PageCacheStats:
+    lookups: int = 0
+    hits: int = 0
+    stores: int = 0
+    record_lookups: int = 0
+    record_hits: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_ratio": round(self.hit_ratio, 3),
+            "stores": self.stores,
+            "record_lookups": self.record_lookups,
+            "record_hits": self.record_hits,
+        }
+
+
+class PageCache:
+    """
+    Extracted pages shared by the query agents and iterations of deep research, and later researches.
+
+    `urls/` maps a normalized URL to the hash of its extracted markdown, `content/` holds the markdown by
+    hash, so mirrors and redirects share one copy. `records/` keeps what the recording stage summarized
+    from a page for one research task, a page that was summarized before is not sent to the LLM again.
+    Entries older than `ttl` seconds are ignored and removed by `prune`.
+    """
+
+    def __init__(self, cache_dir: str = "./tmp/deep_research/page_cache", ttl: float = 24 * 3600):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.stats = PageCacheStats()
+        for sub_dir in ("urls", "content", "records"):
+            os.makedirs(os.path.join(cache_dir, sub_dir), exist_ok=True)
+
+    def _path(self, sub_dir: str, name: str) -> str:
+        return os.path.join(self.cache_dir, sub_dir, name)
+
+    def _fresh(self, path: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) <= self.ttl
+        except OSError:
+            return False
+
+    def _write(self, path: str, data: str):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, url: str) -> Optional[str]:
+        """Extracted markdown of a url, None if it is not cached or expired"""
+        self.stats.lookups += 1
+        url_path = self._path("urls", f"{_key(normalize_url(url))}.json")
+        if not self._fresh(url_path):
+            return None
+        try:
+            with open(url_path, "r", encoding="utf-8") as f:
+                digest = json.load(f)["content_hash"]
+            with open(self._path("content", f"{digest}.md"), "r", encoding="utf-8") as f:
+                content = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        self.stats.hits += 1
+        logger.debug(f"📦 Page cache hit for {url}")
+        return content
+
+    def put(self, url: str, content: str) -> str:
+        digest = content_hash(content)
+        content_path = self._path("content", f"{digest}.md")
+        if self._fresh(content_path):
+            os.utime(content_path)
+        else:
+            self._write(content_path, content)
+        normalized = normalize_url(url)
+        self._write(self._path("urls", f"{_key(normalized)}.json"),
+                    json.dumps({"url": normalized, "content_hash": digest, "saved_at": time.time()}))
+        self.stats.stores += 1
+        return digest
+
+    def get_records(self, digest: str, task: str) -> Optional[List[dict]]:
+        """What the recording stage summarized from this content for this task before"""
+        self.stats.record_lookups += 1
+        records_path = self._path("records", f"{digest}-{_key(task)[:16]}.json")
+        if not self._fresh(records_path):
+            return None
+        try:
+            with open(records_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.stats.record_hits += 1
+        return records
+
+    def put_records(self, digest: str, task: str, records: List[dict]):
+        self._write(self._path("records", f"{digest}-{_key(task)[:16]}.json"), json.dumps(records))
+
+    def prune(self) -> int:
+        """Remove expired entries, returns how many"""
+        removed = 0
+        for sub_dir in ("urls", "content", "records"):
+            directory = os.path.join(self.cache_dir, sub_dir)
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if not self._fresh(path):
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
+
+    def log_stats(self):
+        logger.info(f"📦 Page cache: {self.stats.hits}/{self.stats.lookups} page hits, "
+                    f"{self.stats.record_hits}/{self.stats.record_lookups} summaries reused")
@@ -0,0 +1,134 @@
+import json
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# rough estimate, good enough to budget prompt sections
+CHARS_PER_TOKEN = 3
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it", "its",
+    "of", "on", "or", "that", "the", "this", "to", "was", "were", "will", "with", "which", "what", "how",
+}
+
+INDEXED_FIELDS = ("title", "summary_content", "thinking", "url")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+def record_text(record) -> str:
+    if isinstance(record, dict):
+        return " ".join(str(record.get(field, "")) for field in INDEXED_FIELDS)
+    return str(record)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+class ResearchIndex:
+    """
+    BM25 index over the records gathered by deep research.
+
+    Prompts get the records most relevant to what they are about, up to a token budget, instead of
+    every record so far. The records that did not make it are listed by title and url only, so the
+    LLM still knows which sources were covered.
+    """
+
+    def __init__(self, records: Optional[List[dict]] = None, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.records: List[dict] = []
+        self._postings: Dict[str, List[tuple]] = defaultdict(list)  # term -> [(record index, term frequency)]
+        self._lengths: List[int] = []
+        if records:
+            self.add(records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, records: List[dict]):
+        for record in records:
+            index = len(self.records)
+            tokens = tokenize(record_text(record))
+            for term, frequency in Counter(tokens).items():
+                self._postings[term].append((index, frequency))
+            self._lengths.append(len(tokens))
+            self.records.append(record)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every record for the query"""
+        scores = np.zeros(len(self.records), dtype=np.float64)
+        if not self.records:
+            return scores
+        lengths = np.asarray(self._lengths, dtype=np.float64)
+        average_length = max(lengths.mean(), 1.0)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (len(self.records) - len(postings) + 0.5) / (len(postings) + 0.5))
+            indices = np.fromiter((index for index, _ in postings), dtype=np.int64, count=len(postings))
+            frequencies = np.fromiter((frequency for _, frequency in postings), dtype=np.float64, count=len(postings))
+            norm = self.k1 * (1 - self.b + self.b * lengths[indices] / average_length)
+            scores[indices] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+        return scores
+
+    def select(self, query: str, token_budget: int, top_k: Optional[int] = None) -> List[int]:
+        """Indices of the best matching records that fit in the budget, in the order they were recorded"""
+        scores = self.scores(query)
+        # stable sort keeps recording order between equal scores
+        ranked = np.argsort(-scores, kind="stable")
+        selected = []
+        used = 0
+        for index in ranked[:top_k] if top_k else ranked:
+            tokens = estimate_tokens(json.dumps(self.records[index], indent=4))
+            if used + tokens > token_budget:
+                continue
+            selected.append(int(index))
+            used += tokens
+        return sorted(selected)
+
+    def context(self, query: str, token_budget: int, top_k: Optional[int] = None, max_titles: int = 100) -> str:
+        """The records as prompt text, the relevant ones in full and the rest as a list of titles"""
+        full = json.dumps(self.records, indent=4)
+        if estimate_tokens(full) <= token_budget:
+            return full
+        # titles of the remaining records take some of the budget
+        selected = self.select(query, int(token_budget * 0.8), top_k)
+        chosen = set(selected)
+        titles = []
+        seen = set()
+        for index, record in enumerate(self.records):
+            if index in chosen or not isinstance(record, dict):
+                continue
+            entry = (record.get("title", "unknown"), record.get("url", "unknown"))
+            if entry not in seen:
+                seen.add(entry)
+                titles.append(f"- {entry[0]} ({entry[1]})")
+        omitted = len(self.records) - len(selected)
+        text = json.dumps([self.records[index] for index in selected], indent=4)
+        if omitted:
+            # leave room for the header lines
+            remaining = (token_budget - estimate_tokens(text)) * CHARS_PER_TOKEN - 100
+            shown = []
+            for title in titles[:max_titles]:
+                remaining -= len(title) + 1
+                if remaining < 0:
+                    break
+                shown.append(title)
+            text += f"\n Other Recorded Sources ({omitted} records not shown):\n" + "\n".join(shown)
+            if len(titles) > len(shown):
+                text += f"\n ... and {len(titles) - len(shown)} more sources"
+        logger.debug(f"🔎 Selected {len(selected)}/{len(self.records)} records for the prompt")
+        return text
@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SESSION_FILE_NAME = "session_state.json"
+# research ids name a folder under ./tmp/deep_research, no dots or separators so they can't leave it
+RESEARCH_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+def validate_research_id(research_id: str) -> str:
+    if not RESEARCH_ID_PATTERN.match(research_id or ""):
+        raise ValueError(f"Invalid research ID: {research_id!r}, use letters, digits, '_' and '-'")
+    return research_id
+
+
+class ResearchSession:
+    """
+    Progress of one deep research, written to `session_state.json` in its folder after every stage.
+
+    Per iteration it keeps the plan, the queries, the result of every query agent that finished and
+    whether the results were recorded. `history_query` and `history_infos` are the lists deep research
+    works on, they are saved as they are and filled in place by `load`. A research resumed from this
+    state only runs the agents and stages that did not finish.
+    """
+
+    def __init__(self, save_dir: str, task: str, history_query: List[str], history_infos: List[dict]):
+        self.path = os.path.join(save_dir, SESSION_FILE_NAME)
+        self.task = task
+        self.history_query = history_query
+        self.history_infos = history_infos
+        self.search_iteration = 0
+        self.iterations: Dict[int, dict] = {}
+        self.finished = False
+
+    def save(self):
+        state = {
+            "task": self.task,
+            "updated_at": time.time(),
+            "search_iteration": self.search_iteration,
+            "finished": self.finished,
+            "history_query": self.history_query,
+            "history_infos": self.history_infos,
+            "iterations": {str(iteration): data for iteration, data in self.iterations.items()},
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        """Restore a saved session, False if there is none"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        if state.get("task") != self.task:
+            logger.warning("⚠️ Resumed session was started for a different task, continuing with the saved one")
+            self.task = state.get("task", self.task)
+        self.search_iteration = state.get("search_iteration", 0)
+        self.finished = state.get("finished", False)
+        self.history_query[:] = state.get("history_query", [])
+        self.history_infos[:] = state.get("history_infos", [])
+        self.iterations = {int(iteration): data for iteration, data in state.get("iterations", {}).items()}
+        logger.info(f"♻️ Resuming research after iteration {self.search_iteration}: "
+                    f"{len(self.history_query)} queries, {len(self.history_infos)} records")
+        return True
+
+    def start_iteration(self, iteration: int, plan: str, queries: List[str]):
+        self.search_iteration = iteration
+        self.iterations[iteration] = {"plan": plan, "queries": queries, "results": {}, "recorded": False}
+        self.save()
+
+    def complete_query(self, iteration: int, index: int, result: Optional[str]):
+        self.iterations[iteration]["results"][str(index)] = result
+        self.save()
+
+    def query_results(self, iteration: int) -> List[Optional[str]]:
+        """Results of the iteration's queries, None for the ones that did not finish"""
+        data = self.iterations[iteration]
+        return [data["results"].get(str(index)) for index in range(len(data["queries"]))]
+
+    def is_complete(self, iteration: int) -> bool:
+        data = self.iterations[iteration]
+        return all(str(index) in data["results"] for index in range(len(data["queries"])))
+
+    def complete_recording(self, iteration: int):
+        self.iterations[iteration]["recorded"] = True
+        self.save()
+
+    def unrecorded_iterations(self) -> List[int]:
+        """Iterations whose agents all finished but whose results were not recorded yet"""
+        return sorted(iteration for iteration, data in self.iterations.items()
+                      if not data["recorded"] and self.is_complete(iteration))
+
+    def incomplete_iteration(self) -> Optional[int]:
+        """The iteration that was interrupted while its agents were running"""
+        data = self.iterations.get(self.search_iteration)
+        if data is not None and not self.is_complete(self.search_iteration):
+            return self.search_iteration
+        return None
+
+    def finish(self):
+        self.finished = True
+        self.save()
@@ -0,0 +1,164 @@
+import logging
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+SECRET_ENV_PREFIX = "SENSITIVE_"
+# $SENSITIVE_* placeholders in tasks
+PLACEHOLDER_PATTERN = re.compile(r'\$SENSITIVE_[A-Za-z0-9_]*')
+# very short values would mask unrelated text everywhere
+MIN_MASK_LENGTH = 4
+
+
+class SecretStore:
+    """
+    Process wide store of the SENSITIVE_* secrets.
+
+    Values are loaded from the environment once, `refresh` picks up SENSITIVE_* variables set later
+    (.env reload, settings edited in the UI) and is called when a run starts. Placeholders are resolved
+    and values are masked in a single regex pass each, using one precompiled alternation of all secret
+    values.
+    """
+    _instance = None
+
+    def __init__(self):
+        if not hasattr(self, '_env_secrets'):
+            self._env_secrets: Dict[str, str] = {}  # SENSITIVE_NAME -> value
+            self._registered: Counter = Counter()  # (name, value) -> number of agents that registered it
+            self._masks: Dict[str, str] = {}  # value -> replacement
+            self._mask_pattern: Optional[re.Pattern] = None
+            self._log_filter = SecretMaskingFilter(self)
+            self.reload()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SecretStore, cls).__new__(cls)
+        return cls._instance
+
+    @staticmethod
+    def _read_env(environ: Mapping[str, str]) -> Dict[str, str]:
+        return {key: value for key, value in environ.items() if key.startswith(SECRET_ENV_PREFIX)}
+
+    def reload(self, environ: Optional[Mapping[str, str]] = None):
+        """(Re)load the secrets from the environment, e.g. after the .env file changed"""
+        environ = os.environ if environ is None else environ
+        self._env_secrets = self._read_env(environ)
+        self._update_masks()
+        logger.debug(f"Loaded {len(self._env_secrets)} secrets from the environment")
+
+    def _update_masks(self):
+        self._masks = {}
+        for key, value in self._env_secrets.items():
+            self._add_mask(key[len(SECRET_ENV_PREFIX):].lower(), value)
+        for name, value in self._registered:
+            self._add_mask(name, value)
+        self._compile()
+
+    def refresh(self):
+        """Reload if SENSITIVE_* variables were set, changed or removed since the last load"""
+        if self._read_env(os.environ) != self._env_secrets:
+            self.reload()
+
+    def register(self, sensitive_data: Optional[Dict[str, str]]):
+        """Mask additional secrets while they are in use, e.g. the sensitive_data passed to an agent"""
+        if not sensitive_data:
+            return
+        for name, value in sensitive_data.items():
+            self._registered[(name, value)] += 1
+            self._add_mask(name, value)
+        self._compile()
+
+    def unregister(self, sensitive_data: Optional[Dict[str, str]]):
+        """Stop masking secrets passed to register, once nobody else registered them"""
+        if not sensitive_data:
+            return
+        for name, value in sensitive_data.items():
+            self._registered[(name, value)] -= 1
+            if self._registered[(name, value)] <= 0:
+                del self._registered[(name, value)]
+        self._update_masks()
+
+    def _add_mask(self, name: str, value: str):
+        if value and len(value) >= MIN_MASK_LENGTH:
+            # same format browser_use uses for secrets in the agent messages
+            self._masks[value] = f"<secret>{name}</secret>"
+
+    def _compile(self):
+        if not self._masks:
+            self._mask_pattern = None
+            return
+        # longest first, so a secret containing another secret is masked as a whole
+        values = sorted(self._masks, key=len, reverse=True)
+        self._mask_pattern = re.compile("|".join(re.escape(value) for value in values))
+
+    @property
+    def sensitive_data(self) -> Dict[str, str]:
+        """Secrets in the format the agent expects: name without prefix (lower case) -> value"""
+        return {key[len(SECRET_ENV_PREFIX):].lower(): value for key, value in self._env_secrets.items()}
+
+    def resolve(self, text: str) -> str:
+        """Replace $SENSITIVE_* placeholders with their values, unknown placeholders are kept"""
+        if not text or "$SENSITIVE_" not in text:
+            return text
+        return PLACEHOLDER_PATTERN.sub(
+            lambda match: self._env_secrets.get(match.group(0)[1:], match.group(0)),
+            text,
+        )
+
+    def mask(self, text: str) -> str:
+        """Replace every secret value in the text with <secret>name</secret>"""
+        if not text or self._mask_pattern is None or not isinstance(text, str):
+            return text
+        return self._mask_pattern.sub(lambda match: self._masks[match.group(0)], text)
+
+    def mask_obj(self, obj: Any) -> Any:
+        """Mask all strings in nested dicts / lists / tuples, e.g. history data before it is written"""
+        if self._mask_pattern is None:
+            return obj
+        if isinstance(obj, str):
+            return self.mask(obj)
+        if isinstance(obj, dict):
+            return {key: self.mask_obj(value) for key, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self.mask_obj(value) for value in obj)
+        return obj
+
+    def install_log_masking(self, logger_names=()):
+        """
+        Mask secrets in the log output, on the handlers of the root logger and of the given loggers that
+        don't propagate to it (browser_use has its own). Call again for handlers added later.
+        """
+        for name in ("", *logger_names):
+            for handler in logging.getLogger(name).handlers:
+                if self._log_filter not in handler.filters:
+                    handler.addFilter(self._log_filter)
+
+
+class SecretMaskingFilter(logging.Filter):
+    """
+    Masks the secrets of a SecretStore in the records a handler emits. Records dropped by their level
+    never get here, so they are not formatted for nothing.
+    """
+
+    def __init__(self, store: SecretStore):
+        super().__init__()
+        self.store = store
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.store._mask_pattern is None:
+            return True
+        try:
+            message = record.getMessage()
+            args = None
+        except Exception:
+            # badly formatted call: mask the raw message, the handler reports the error as usual
+            message = str(record.msg)
+            args = record.args
+        masked = self.store.mask(message)
+        if masked != message:
+            record.msg = masked
+            record.args = args
+        return True
@@ -0,0 +1,102 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# used when the model can't count tokens
+DEFAULT_CHARS_PER_TOKEN = 3.0
+
+# split on headings first, then paragraphs, then lines
+SPLIT_PATTERNS = [
+    re.compile(r"\n(?=#{1,6}\s)"),
+    re.compile(r"\n\s*\n"),
+    re.compile(r"\n"),
+]
+
+
+class TokenCounter:
+    """Token counts with the tokenizer of the model in use, a char estimate if it has none"""
+
+    def __init__(self, llm=None):
+        self.llm = llm
+        self.available = llm is not None and hasattr(llm, "get_num_tokens")
+
+    def count(self, text: str) -> int:
+        if self.available:
+            try:
+                return self.llm.get_num_tokens(text)
+            except Exception as e:
+                logger.debug(f"Model can't count tokens, estimating from chars: {e}")
+                self.available = False
+        return int(len(text) / DEFAULT_CHARS_PER_TOKEN)
+
+    def chars_per_token(self, text: str) -> float:
+        """Chars per token of this text, counted once so the splitting itself does not call the tokenizer"""
+        tokens = self.count(text)
+        return len(text) / tokens if tokens else DEFAULT_CHARS_PER_TOKEN
+
+
+def _pack(parts: List[str], separator: str, max_chars: int) -> List[str]:
+    chunks = []
+    current = ""
+    for part in parts:
+        candidate = f"{current}{separator}{part}" if current else part
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            if current:
+                chunks.append(current)
+            current = part
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_markdown(text: str, max_chars: int, level: int = 0) -> List[str]:
+    """Split markdown into chunks of at most `max_chars`, at the coarsest boundary that fits"""
+    if len(text) <= max_chars:
+        return [text] if text.strip() else []
+    if level >= len(SPLIT_PATTERNS):
+        return [text[start:start + max_chars] for start in range(0, len(text), max_chars)]
+    separator = "\n" if level != 1 else "\n\n"
+    parts = []
+    for part in SPLIT_PATTERNS[level].split(text):
+        if len(part) > max_chars:
+            parts.extend(split_markdown(part, max_chars, level + 1))
+        elif part.strip():
+            parts.append(part)
+    return _pack(parts, separator, max_chars)
+
+
+def split_by_tokens(text: str, max_tokens: int, counter: TokenCounter) -> List[str]:
+    chars_per_token = counter.chars_per_token(text)
+    # a little headroom, the ratio varies inside the text
+    return split_markdown(text, max(int(max_tokens * chars_per_token * 0.9), 1))
+
+
+@dataclass
+class ChunkingStats:
+    pages: int = 0
+    split_pages: int = 0
+    chunks: int = 0
+    failed_chunks: int = 0
+    chars_total: int = 0
+    chars_summarized: int = 0
+
+    @property
+    def coverage(self) -> float:
+        """Share of the extracted text that made it into a summary"""
+        return self.chars_summarized / self.chars_total if self.chars_total else 1.0
+
+    def to_dict(self) -> dict:
+        return {
+            "pages": self.pages,
+            "split_pages": self.split_pages,
+            "chunks": self.chunks,
+            "failed_chunks": self.failed_chunks,
+            "chars_total": self.chars_total,
+            "chars_summarized": self.chars_summarized,
+            "coverage": round(self.coverage, 4),
+        }
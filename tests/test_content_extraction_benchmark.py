@@ -0,0 +1,98 @@
+"""
+Benchmark of the local content extraction on generated pages.
+
+Pages with an article between navigation, sidebars and footers are extracted once in the event loop
+and once through ContentExtractor's process pool, several at a time like parallel agents do. We measure
+the wall time and the longest time the event loop was blocked, and check the article text survived.
+
+    python tests/test_content_extraction_benchmark.py
+"""
+import asyncio
+import random
+import sys
+import time
+
+sys.path.append(".")
+
+PAGES = 8
+PARAGRAPHS = 300
+
+
+def generate_page(seed: int) -> str:
+    rng = random.Random(seed)
+    words = ["browser", "agent", "research", "latency", "network", "content", "report", "model", "cache", "page"]
+
+    def sentence():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(8, 20))).capitalize() + "."
+
+    nav = "".join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(60))
+    sidebar = "".join(f'<div class="ad"><a href="/promo/{i}">Promo {i}</a></div>' for i in range(40))
+    article = "".join(
+        f"<h2>Part {i}</h2>" if i % 20 == 0 else f"<p>{' '.join(sentence() for _ in range(4))}</p>"
+        for i in range(PARAGRAPHS)
+    )
+    return f"""<html><head><title>Fixture {seed}</title></head><body>
+        <header><nav><ul>{nav}</ul></nav></header>
+        <aside>{sidebar}</aside>
+        <main><article><h1>Fixture article {seed}</h1><p>Marker-{seed} opens the article.</p>{article}</article></main>
+        <footer>{nav}</footer>
+    </body></html>"""
+
+
+async def measure(extract, pages):
+    """Wall time and longest event loop stall while extracting all pages concurrently"""
+    longest_stall = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal longest_stall
+        last = time.monotonic()
+        while running:
+            await asyncio.sleep(0.005)
+            now = time.monotonic()
+            longest_stall = max(longest_stall, now - last - 0.005)
+            last = now
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    start = time.monotonic()
+    results = await asyncio.gather(*[extract(html) for html in pages])
+    elapsed = time.monotonic() - start
+    running = False
+    await ticker_task
+    return elapsed, longest_stall, results
+
+
+async def test_content_extraction_benchmark():
+    from src.utils.content_extraction import ContentExtractor, extract_markdown, shutdown_process_pool
+
+    pages = [generate_page(seed) for seed in range(PAGES)]
+    extractor = ContentExtractor()
+
+    async def in_loop(html):
+        return extract_markdown(html)
+
+    try:
+        # warm up the worker processes, their start is paid once per server
+        await extractor.markdown_from_html(pages[0])
+        results = {
+            "in event loop": await measure(in_loop, pages),
+            "process pool": await measure(extractor.markdown_from_html, pages),
+        }
+    finally:
+        shutdown_process_pool()
+
+    print(f"\n{PAGES} pages of {sum(map(len, pages)) // PAGES // 1000}k chars")
+    print(f"{'strategy':<16}{'wall time':>11}{'longest stall':>16}")
+    for name, (elapsed, stall, _) in results.items():
+        print(f"{name:<16}{elapsed:>10.2f}s{stall:>15.3f}s")
+
+    for name, (_, _, markdowns) in results.items():
+        for seed, markdown in enumerate(markdowns):
+            assert f"Marker-{seed}" in markdown, name
+            assert "Promo 1" not in markdown, name
+    assert results["process pool"][1] < results["in event loop"][1]
+
+
+if __name__ == "__main__":
+    asyncio.run(test_content_extraction_benchmark())
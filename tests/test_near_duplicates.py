@@ -0,0 +1,83 @@
+"""
+Near duplicate filtering of deep research records.
+
+    python tests/test_near_duplicates.py
+"""
+import sys
+
+import numpy as np
+
+sys.path.append(".")
+
+from src.utils.near_duplicates import NearDuplicateFilter, hamming_distances, simhash
+
+MODEL_3 = {
+    "url": "https://example.com/model-3",
+    "title": "Model 3 specs",
+    "summary_content": "The Model 3 Long Range has an EPA estimated range of 341 miles "
+                       "and accelerates from 0 to 60 mph in 4.2 seconds.",
+}
+MODEL_Y = {
+    "url": "https://example.com/model-y",
+    "title": "Model Y specs",
+    "summary_content": "The Model Y Long Range has an EPA estimated range of 310 miles "
+                       "and accelerates from 0 to 60 mph in 4.8 seconds.",
+}
+MODEL_3_COPY = {
+    "url": "https://mirror.example.org/model-3",
+    "title": "Model 3 specs",
+    "summary_content": "The Model 3 Long Range has an EPA estimated range of 341 miles "
+                       "and it accelerates from 0 to 60 mph in 4.2 seconds.",
+}
+HOUSING_UP = {
+    "url": "https://example.com/zoning",
+    "title": "Zoning policy",
+    "summary_content": "The new zoning policy increased housing costs in the city center "
+                       "over the last five years according to the report.",
+}
+HOUSING_DOWN = {
+    "url": "https://example.net/zoning",
+    "title": "Zoning policy",
+    "summary_content": "The new zoning policy reduced housing costs in the city center "
+                       "over the last five years according to the report.",
+}
+
+
+def distance(record, other):
+    return hamming_distances(simhash(record["summary_content"]),
+                             np.array([simhash(other["summary_content"])], dtype=np.uint64))[0]
+
+
+def test_different_figures_are_kept():
+    # close enough to be near duplicates by their fingerprints alone
+    near_duplicate_filter = NearDuplicateFilter(max_distance=10, min_similarity=0.0)
+    assert distance(MODEL_3, MODEL_Y) <= near_duplicate_filter.max_distance
+
+    assert near_duplicate_filter.add(dict(MODEL_3))
+    assert near_duplicate_filter.add(dict(MODEL_Y))
+    assert near_duplicate_filter.stats.near_duplicates == 0
+
+
+def test_changed_word_is_kept():
+    # "increased" and "reduced" are a few bits apart, like a reworded copy
+    assert distance(HOUSING_UP, HOUSING_DOWN) <= 10
+    for near_duplicate_filter in (NearDuplicateFilter(), NearDuplicateFilter(max_distance=10)):
+        assert near_duplicate_filter.add(dict(HOUSING_UP))
+        assert near_duplicate_filter.add(dict(HOUSING_DOWN))
+        assert near_duplicate_filter.stats.near_duplicates == 0
+
+
+def test_same_figures_are_merged():
+    near_duplicate_filter = NearDuplicateFilter()
+    kept = dict(MODEL_3)
+    assert near_duplicate_filter.add(kept)
+    assert not near_duplicate_filter.add(dict(MODEL_3_COPY))
+    assert kept["other_urls"] == [MODEL_3_COPY["url"]]
+    assert near_duplicate_filter.stats.near_duplicates == 1
+
+
+if __name__ == "__main__":
+    test_different_figures_are_kept()
+    test_changed_word_is_kept()
+    test_same_figures_are_merged()
+    print("ok")
@@ -0,0 +1,154 @@
+"""
+Benchmark of the page settle detector against fixed waits.
+
+A local server serves pages whose content shows up late (slow XHR, chained timers, fade in).
+Every strategy starts right after navigation commits, we measure how long it waited and
+whether the content was complete when it returned. `/ticker` never goes quiet, the detector
+must give up on it early instead of waiting for its timeout.
+
+    python tests/test_settle_benchmark.py
+"""
+import asyncio
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append(".")
+
+# `#content.ready` marks a fully rendered page
+FIXTURE_PAGES = {
+    "/static": """<div id="content" class="ready">Hello</div>""",
+    "/slow-xhr": """
+        <div id="content">loading...</div>
+        <script>
+            fetch('/api?delay=800').then(r => r.text()).then(text => {
+                const el = document.getElementById('content');
+                el.textContent = text;
+                el.classList.add('ready');
+            });
+        </script>""",
+    "/chained": """
+        <div id="content">loading...</div>
+        <script>
+            setTimeout(() => fetch('/api?delay=300').then(r => r.text()).then(text => {
+                setTimeout(() => {
+                    const el = document.getElementById('content');
+                    el.textContent = text;
+                    el.classList.add('ready');
+                }, 200);
+            }), 200);
+        </script>""",
+    "/fade-in": """
+        <style>#content {opacity: 0; transition: opacity 1.2s linear; font-size: 64px}</style>
+        <div id="content">Hello</div>
+        <script>
+            const el = document.getElementById('content');
+            el.addEventListener('transitionend', () => el.classList.add('ready'));
+            requestAnimationFrame(() => requestAnimationFrame(() => { el.style.opacity = 1; }));
+        </script>""",
+    "/ticker": """
+        <style>
+            .spinner {width: 40px; height: 40px; border: 6px solid #ccc; border-top-color: #333;
+                      border-radius: 50%; animation: spin 0.6s linear infinite}
+            @keyframes spin {to {transform: rotate(360deg)}}
+        </style>
+        <div id="content" class="ready">Quotes</div>
+        <div class="spinner"></div>
+        <div id="ticker">0</div>
+        <script>
+            let tick = 0;
+            setInterval(() => { document.getElementById('ticker').textContent = `price ${++tick}`; }, 150);
+        </script>""",
+}
+
+SETTLE_MAX_WAIT = 5.0
+
+FIXED_WAITS = [0.5, 1.0, 2.0]
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/api":
+            time.sleep(int(parse_qs(url.query).get("delay", ["0"])[0]) / 1000)
+            body = "loaded"
+        elif url.path in FIXTURE_PAGES:
+            body = f"<html><body>{FIXTURE_PAGES[url.path]}</body></html>"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html" if url.path != "/api" else "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def test_settle_benchmark():
+    from playwright.async_api import async_playwright
+
+    from src.browser.dom_cache import DOM_WATCH_JS
+    from src.browser.page_settle import PageSettleDetector
+
+    server = start_fixture_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def fixed_wait(seconds):
+        async def wait(page):
+            await asyncio.sleep(seconds)
+        return wait
+
+    async def settle(page):
+        await PageSettleDetector(page, max_wait=SETTLE_MAX_WAIT, quiet_window=0.5).wait()
+
+    strategies = {f"fixed {seconds}s": fixed_wait(seconds) for seconds in FIXED_WAITS}
+    strategies["settle detector"] = settle
+
+    results = {}
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context()
+        await context.add_init_script(DOM_WATCH_JS)
+        page = await context.new_page()
+        try:
+            for name, wait in strategies.items():
+                times, complete = {}, 0
+                for path in FIXTURE_PAGES:
+                    await page.goto(f"{base_url}{path}", wait_until="commit")
+                    start = time.monotonic()
+                    await wait(page)
+                    times[path] = time.monotonic() - start
+                    complete += await page.evaluate("() => !!document.querySelector('#content.ready')")
+                results[name] = (sum(times.values()) / len(times), complete, times)
+        finally:
+            await browser.close()
+            server.shutdown()
+
+    print(f"\n{'strategy':<18}{'avg wait':>10}{'complete':>12}{'ticker':>10}")
+    for name, (average, complete, times) in results.items():
+        print(f"{name:<18}{average:>9.2f}s{complete:>8}/{len(FIXTURE_PAGES)}{times['/ticker']:>9.2f}s")
+
+    settle_average, settle_complete, settle_times = results["settle detector"]
+    assert settle_complete == len(FIXTURE_PAGES)
+    # faster than the shortest fixed wait that catches every page
+    for name, (average, complete, _) in results.items():
+        if name.startswith("fixed") and complete == len(FIXTURE_PAGES):
+            assert settle_average < average, name
+    # gave up on the page that never settles instead of waiting for the timeout
+    assert settle_times["/ticker"] < SETTLE_MAX_WAIT / 2
+
+
+if __name__ == "__main__":
+    asyncio.run(test_settle_benchmark())
@@ -23,7 +23,7 @@ from webui_core import (
     stop_agent,
     stop_research_agent,
     run_with_stream,
-    run_deep_search,
+    run_deep_search_stream,
     close_global_browser
 )
 
@@ -280,6 +280,8 @@ def create_ui(config, theme_name="Ocean"):
                 with gr.Row():
                     max_search_iteration_input = gr.Number(label="Max Search Iteration", value=3, precision=0) # precision=0 ensures it's an integer
                     max_query_per_iter_input = gr.Number(label="Max Query per Iteration", value=1, precision=0) # precision=0 ensures it's an integer
+                    parallel_report_sections = gr.Checkbox(label="Write Report Sections in Parallel", value=False,
+                                                           info="Draft the sections of the report's outline at the same time")
                 with gr.Row():
                     research_button = gr.Button("▶️ Run Deep Research", variant="primary", scale=2)
                     stop_research_button = gr.Button("⏹️ Stop", variant="stop", scale=1)
@@ -348,8 +350,8 @@ def create_ui(config, theme_name="Ocean"):
                 
                 # Run Deep Research
                 research_button.click(
-                        fn=run_deep_search,
-                        inputs=[research_task_input, max_search_iteration_input, max_query_per_iter_input, llm_provider, llm_model_name, llm_num_ctx, llm_temperature, llm_base_url, llm_api_key, use_vision, use_own_browser, headless, chrome_cdp],
+                        fn=run_deep_search_stream,
+                        inputs=[research_task_input, max_search_iteration_input, max_query_per_iter_input, llm_provider, llm_model_name, llm_num_ctx, llm_temperature, llm_base_url, llm_api_key, use_vision, use_own_browser, headless, chrome_cdp, parallel_report_sections],
                         outputs=[markdown_output_display, markdown_download, stop_research_button, research_button]
                 )
                 # Bind the stop button click event after errors_output is defined
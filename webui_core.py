@@ -4,6 +4,7 @@ import asyncio
 import os
 import glob
 import json
+from dataclasses import asdict
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,46 +21,111 @@ from browser_use.browser.context import (
 from langchain_ollama import ChatOllama
 
 from src.utils.agent_state import AgentState
+from src.utils.frame_bus import FrameBus
+from src.utils.secrets import SecretStore
 from src.utils import utils
 from src.agent.custom_agent import CustomAgent
+from src.agent.model_cascade import ModelCascade
 from src.browser.custom_browser import CustomBrowser
 from src.agent.custom_prompts import CustomSystemPrompt, CustomAgentMessagePrompt
-from src.browser.custom_context import BrowserContextConfig, CustomBrowserContext
+from src.browser.custom_context import BrowserContextConfig, CustomBrowserContext, CustomBrowserContextConfig
+from src.browser.screencast import PageScreencast
+from src.browser.resource_policy import ResourcePolicy
+from src.browser.http_cache import get_http_cache
+from src.browser.browser_supervisor import BrowserSupervisor, SupervisorThresholds
+from src.browser.storage_profiles import StorageProfileStore, profile_sites
 from src.controller.custom_controller import CustomController
 from src.utils.default_config_settings import default_config, load_config_from_file, save_config_to_file, save_current_config, update_ui_from_config
-from src.utils.utils import update_model_dropdown, get_latest_files, capture_screenshot
+from src.utils.utils import update_model_dropdown, get_latest_files
 
 # Global variables for persistence
 _global_browser = None
 _global_browser_context = None
 _global_agent = None
+_global_frame_bus = None
 
 # Create the global agent state instance
 _global_agent_state = AgentState()
 
+# Recycles the browser kept open between runs when it gets unhealthy
+_browser_supervisor = BrowserSupervisor(
+    SupervisorThresholds(
+        max_total_rss_mb=float(os.getenv("BROWSER_MAX_RSS_MB", 3072)),
+        max_renderer_rss_mb=float(os.getenv("BROWSER_MAX_RENDERER_RSS_MB", 1536)),
+        max_tasks=int(os.getenv("BROWSER_MAX_TASKS", 100)),
+    )
+)
+
+# Saved logins (storage state) that runs can start from
+_storage_profiles = StorageProfileStore(
+    profiles_dir=os.getenv("STORAGE_PROFILES_DIR", "./tmp/storage_profiles"),
+    max_age=float(os.getenv("STORAGE_PROFILE_MAX_AGE_HOURS", 7 * 24)) * 3600,
+)
+
+# Secrets are loaded once and masked in all log output
+_secret_store = SecretStore()
+_secret_store.install_log_masking(("browser_use",))
+
 def resolve_sensitive_env_variables(text):
     """
     Replace environment variable placeholders ($SENSITIVE_*) with their values.
     Only replaces variables that start with SENSITIVE_.
     """
-    if not text:
-        return text
-        
-    import re
-    
-    # Find all $SENSITIVE_* patterns
-    env_vars = re.findall(r'\$SENSITIVE_[A-Za-z0-9_]*', text)
-    
-    result = text
-    for var in env_vars:
-        # Remove the $ prefix to get the actual environment variable name
-        env_name = var[1:]  # removes the $
-        env_value = os.getenv(env_name)
-        if env_value is not None:
-            # Replace $SENSITIVE_VAR_NAME with its value
-            result = result.replace(var, env_value)
-        
-    return result
+    return _secret_store.resolve(text)
+
+def get_browser_metrics(last_samples=100):
+    """Health samples and recycle events of the browser kept open between runs"""
+    return _browser_supervisor.metrics(last_samples=last_samples)
+
+async def recycle_browser_if_unhealthy():
+    """
+    Between runs: close the kept open browser if it crossed a memory / task / hung page threshold.
+    The user's own Chrome, attached over CDP or launched from its install, is never recycled.
+    """
+    global _global_browser, _global_browser_context
+
+    if _global_browser is None or _global_browser.config.cdp_url or _global_browser.config.chrome_instance_path:
+        return None
+
+    reason = await _browser_supervisor.check(_global_browser, _global_browser_context)
+    if reason:
+        _browser_supervisor.record_recycle(reason)
+        if _global_browser_context:
+            await _global_browser_context.close()
+            _global_browser_context = None
+        await _global_browser.close()
+        _global_browser = None
+    return reason
+
+def list_storage_profiles():
+    return _storage_profiles.list_profiles()
+
+def delete_storage_profile(name):
+    _storage_profiles.invalidate(name, "deleted")
+
+async def _update_storage_profile(name, history, profile_loaded):
+    """
+    After a run: save the storage state of the context if the run finished without errors (a fresh
+    login included), drop the profile if the run failed after hitting a login wall on the profile's site.
+    """
+    login_wall = _global_browser_context.login_wall
+    succeeded = history.is_done() and not history.errors()
+    if profile_loaded and login_wall and not succeeded:
+        _storage_profiles.invalidate(name, login_wall)
+        return {'name': name, 'loaded': profile_loaded, 'login_wall': login_wall, 'saved': False}
+    saved = False
+    if succeeded and _global_browser_context.session is not None:
+        try:
+            page = _global_browser_context.session.current_page
+            await _storage_profiles.save(name, _global_browser_context.session.context, url=page.url)
+            saved = True
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to save storage profile '{name}': {e}")
+    return {'name': name, 'loaded': profile_loaded, 'login_wall': login_wall, 'saved': saved}
+
+def get_current_frame_bus():
+    """Frame bus of the current (or last) agent run"""
+    return _global_frame_bus
 
 async def stop_agent():
     """Request the agent to stop and update UI with enhanced feedback"""
@@ -141,10 +207,25 @@ async def run_browser_agent(
         use_vision,
         max_actions_per_step,
         tool_calling_method,
-        chrome_cdp
+        chrome_cdp,
+        cascade_llm_provider=None,
+        cascade_llm_model_name=None,
+        cascade_llm_base_url="",
+        cascade_llm_api_key="",
+        cascade_deescalate_after=3,
+        frame_bus=None,
+        resource_policy="auto",
+        resource_allowed_domains="",
+        http_cache=False,
+        http_cache_dir="./tmp/http_cache",
+        http_cache_max_mb=512,
+        storage_profile=""
 ):
-    global _global_agent_state
+    global _global_agent_state, _global_frame_bus
     _global_agent_state.clear_stop()  # Clear any previous stop requests
+    # Latest frames of this run, shared by the live views
+    frame_bus = frame_bus or FrameBus()
+    _global_frame_bus = frame_bus
 
     try:
         # Disable recording if the checkbox is unchecked
@@ -163,6 +244,8 @@ async def run_browser_agent(
                 + glob.glob(os.path.join(save_recording_path, "*.[wW][eE][bB][mM]"))
             )
 
+        # pick up secrets set since the last run
+        _secret_store.refresh()
         task = resolve_sensitive_env_variables(task)
 
         # Run the agent
@@ -174,6 +257,17 @@ async def run_browser_agent(
             base_url=llm_base_url,
             api_key=llm_api_key,
         )
+        # Optional small model that handles steps first, `llm` is used when the cascade escalates
+        cascade_llm = None
+        if cascade_llm_provider and cascade_llm_model_name:
+            cascade_llm = utils.get_llm_model(
+                provider=cascade_llm_provider,
+                model_name=cascade_llm_model_name,
+                num_ctx=llm_num_ctx,
+                temperature=llm_temperature,
+                base_url=cascade_llm_base_url,
+                api_key=cascade_llm_api_key,
+            )
         if agent_type == "org":
             final_result, errors, model_actions, model_thoughts, trace_file, history_file = await run_org_agent(
                 llm=llm,
@@ -212,7 +306,14 @@ async def run_browser_agent(
                 use_vision=use_vision,
                 max_actions_per_step=max_actions_per_step,
                 tool_calling_method=tool_calling_method,
-                chrome_cdp=chrome_cdp
+                chrome_cdp=chrome_cdp,
+                cascade_llm=cascade_llm,
+                cascade_deescalate_after=cascade_deescalate_after,
+                frame_bus=frame_bus,
+                resource_policy=ResourcePolicy.from_config(resource_policy, resource_allowed_domains,
+                                                           use_vision=use_vision),
+                http_cache=get_http_cache(http_cache_dir, http_cache_max_mb) if http_cache else None,
+                storage_profile=storage_profile or None
             )
         else:
             raise ValueError(f"Invalid agent type: {agent_type}")
@@ -263,10 +364,15 @@ async def run_browser_agent(
                         
                         # Write the updated history data back to the file
                         with open(history_file, 'w') as f:
-                            json.dump(history_data, f, indent=2)
+                            json.dump(_secret_store.mask_obj(history_data), f, indent=2)
                     except Exception as e:
                         logger.error(f"Error updating history file with enhanced data: {str(e)}")
 
+        # Results are streamed to the UI / API, never show the resolved secrets
+        final_result, errors, model_actions, model_thoughts = _secret_store.mask_obj(
+            (final_result, errors, model_actions, model_thoughts)
+        )
+
         return (
             final_result,
             errors,
@@ -283,7 +389,7 @@ async def run_browser_agent(
     except Exception as e:
         import traceback
         traceback.print_exc()
-        errors = str(e) + "\n" + traceback.format_exc()
+        errors = _secret_store.mask(str(e) + "\n" + traceback.format_exc())
         return (
             '',                                         # final_result
             errors,                                     # errors
@@ -296,6 +402,8 @@ async def run_browser_agent(
             True,  # stop_button interactive
             True    # Re-enable run button
         )
+    finally:
+        frame_bus.close()
 
 
 async def run_org_agent(
@@ -323,6 +431,9 @@ async def run_org_agent(
         # Clear any previous stop request
         _global_agent_state.clear_stop()
 
+        # A browser kept open from a previous run is replaced if it got unhealthy
+        await recycle_browser_if_unhealthy()
+
         extra_chromium_args = [f"--window-size={window_w},{window_h}"]
         cdp_url = chrome_cdp
 
@@ -409,7 +520,7 @@ async def run_org_agent(
                 
                 # Write the updated history data back to the file
                 with open(history_file, 'w') as f:
-                    json.dump(history_data, f, indent=2)
+                    json.dump(_secret_store.mask_obj(history_data), f, indent=2)
                     
                 # Generate Cypress test for this history file
                 from src.utils.cypress_generator import generate_cypress_test
@@ -433,6 +544,7 @@ async def run_org_agent(
         return '', errors, '', '', None, None
     finally:
         _global_agent = None
+        _browser_supervisor.task_finished()
         # Handle cleanup based on persistence configuration
         if not keep_browser_open:
             if _global_browser_context:
@@ -442,6 +554,7 @@ async def run_org_agent(
             if _global_browser:
                 await _global_browser.close()
                 _global_browser = None
+            _browser_supervisor.browser_closed()
 
 async def run_custom_agent(
         llm,
@@ -460,7 +573,13 @@ async def run_custom_agent(
         use_vision,
         max_actions_per_step,
         tool_calling_method,
-        chrome_cdp
+        chrome_cdp,
+        cascade_llm=None,
+        cascade_deescalate_after=3,
+        frame_bus=None,
+        resource_policy=None,
+        http_cache=None,
+        storage_profile=None
 ):
     try:
         global _global_browser, _global_browser_context, _global_agent_state, _global_agent
@@ -468,6 +587,9 @@ async def run_custom_agent(
         # Clear any previous stop request
         _global_agent_state.clear_stop()
 
+        # A browser kept open from a previous run is replaced if it got unhealthy
+        await recycle_browser_if_unhealthy()
+
         extra_chromium_args = [f"--window-size={window_w},{window_h}"]
         cdp_url = chrome_cdp
         if use_own_browser:
@@ -497,17 +619,37 @@ async def run_custom_agent(
                 )
             )
 
+        # A browser we are attached to has its own logins, profiles are not applied to it nor saved from it
+        if storage_profile and cdp_url:
+            logger.warning(f"⚠️ Storage profile '{storage_profile}' is ignored with an existing browser")
+            storage_profile = None
+        storage_state = None
+
         if (_global_browser_context is None  or (chrome_cdp and cdp_url != "" and cdp_url != None)):
+            storage_state = _storage_profiles.load(storage_profile) if storage_profile else None
             _global_browser_context = await _global_browser.new_context(
-                config=BrowserContextConfig(
+                config=CustomBrowserContextConfig(
                     trace_path=save_trace_path if save_trace_path else None,
                     save_recording_path=save_recording_path if save_recording_path else None,
                     no_viewport=False,
                     browser_window_size=BrowserContextWindowSize(
                         width=window_w, height=window_h
                     ),
+                    storage_state=storage_state,
                 )
             )
+        elif storage_profile:
+            logger.warning(f"⚠️ Storage profile '{storage_profile}' is not applied, the browser context is kept "
+                           f"open from an earlier run; close the browser to start from the profile")
+        # Per run, the context may be kept open between runs
+        _global_browser_context.login_wall_sites = profile_sites(storage_state) if storage_state else []
+        _global_browser_context.login_wall = None
+        await _global_browser_context.set_request_handling(resource_policy=resource_policy, http_cache=http_cache)
+        if http_cache:
+            http_cache.reset_stats()
+        _global_browser_context.reset_dom_cache_stats()
+        _global_browser_context.reset_settle_stats()
+        _global_browser_context.reset_state_capture_stats()
 
 
         # Create and run agent
@@ -523,9 +665,24 @@ async def run_custom_agent(
                 system_prompt_class=CustomSystemPrompt,
                 agent_prompt_class=CustomAgentMessagePrompt,
                 max_actions_per_step=max_actions_per_step,
-                tool_calling_method=tool_calling_method
+                tool_calling_method=tool_calling_method,
+                cascade=ModelCascade(
+                    small_llm=cascade_llm,
+                    large_llm=llm,
+                    deescalate_after=cascade_deescalate_after
+                ) if cascade_llm else None,
+                frame_bus=frame_bus
             )
         history = await _global_agent.run(max_steps=max_steps)
+        if resource_policy:
+            resource_policy.log_stats()
+        if http_cache:
+            http_cache.log_stats()
+        storage_profile_info = None
+        if storage_profile:
+            storage_profile_info = await _update_storage_profile(storage_profile, history, storage_state is not None)
+        # GIF of the run, rendered in a worker process
+        history_render_path = await _global_agent.history_render_task if _global_agent.history_render_task else None
 
         history_file = os.path.join(save_agent_history_path, f"{_global_agent.agent_id}.json")
         _global_agent.save_history(history_file)
@@ -540,6 +697,28 @@ async def run_custom_agent(
                 history_data['original_prompt'] = task
                 if add_infos:
                     history_data['add_infos'] = add_infos
+                history_data['stop_reason'] = _global_agent.stop_reason
+                if _global_agent.loop_detector:
+                    history_data['loop_detection'] = asdict(_global_agent.loop_detector.stats)
+                if _global_agent.cascade:
+                    history_data['model_cascade'] = _global_agent.cascade.stats.to_dict()
+                if _global_agent.element_pruner:
+                    history_data['element_pruning'] = _global_agent.element_pruner.stats.to_dict()
+                if _global_browser_context.dom_cache:
+                    history_data['dom_cache'] = _global_browser_context.dom_cache_stats.to_dict()
+                history_data['page_settle'] = _global_browser_context.settle_stats.to_dict()
+                history_data['state_capture'] = _global_browser_context.state_capture_stats.to_dict()
+                if http_cache:
+                    history_data['http_cache'] = http_cache.stats.to_dict()
+                if storage_profile_info:
+                    history_data['storage_profile'] = storage_profile_info
+                if history_render_path:
+                    history_data['history_render'] = history_render_path
+                if resource_policy:
+                    history_data['resource_policy'] = {
+                        'preset': resource_policy.preset,
+                        **resource_policy.stats.to_dict(),
+                    }
                 
                 # Enhance history data with detailed element information for Cypress testing
                 if 'history' in history_data:
@@ -562,7 +741,7 @@ async def run_custom_agent(
                 
                 # Write the updated history data back to the file
                 with open(history_file, 'w') as f:
-                    json.dump(history_data, f, indent=2)
+                    json.dump(_secret_store.mask_obj(history_data), f, indent=2)
                     
                 # Generate Cypress test for this history file
                 from src.utils.cypress_generator import generate_cypress_test
@@ -586,6 +765,7 @@ async def run_custom_agent(
         return '', errors, '', '', None, None
     finally:
         _global_agent = None
+        _browser_supervisor.task_finished()
         # Handle cleanup based on persistence configuration
         if not keep_browser_open:
             if _global_browser_context:
@@ -595,6 +775,7 @@ async def run_custom_agent(
             if _global_browser:
                 await _global_browser.close()
                 _global_browser = None
+            _browser_supervisor.browser_closed()
 
 async def run_with_stream(
     agent_type,
@@ -620,7 +801,11 @@ async def run_with_stream(
     use_vision,
     max_actions_per_step,
     tool_calling_method,
-    chrome_cdp
+    chrome_cdp,
+    stream_max_fps=5,
+    stream_max_width=None,
+    stream_quality=60,
+    stream_screencast=True
 ):
     global _global_agent_state
     stream_vw = 80
@@ -658,6 +843,8 @@ async def run_with_stream(
     else:
         try:
             _global_agent_state.clear_stop()
+            # The agent publishes its step screenshots here, the view only subscribes
+            frame_bus = FrameBus()
             # Run the browser agent in the background
             agent_task = asyncio.create_task(
                 run_browser_agent(
@@ -684,7 +871,8 @@ async def run_with_stream(
                     use_vision=use_vision,
                     max_actions_per_step=max_actions_per_step,
                     tool_calling_method=tool_calling_method,
-                    chrome_cdp=chrome_cdp
+                    chrome_cdp=chrome_cdp,
+                    frame_bus=frame_bus
                 )
             )
 
@@ -693,19 +881,37 @@ async def run_with_stream(
             final_result = errors = model_actions = model_thoughts = ""
             latest_videos = trace = history_file = None
 
+            # Between steps, frames are pushed by the browser (CDP screencast) when the page changes
+            screencast = screencast_task = None
+            stream_max_width = stream_max_width or window_w
+            stream_max_height = int(stream_max_width * window_h // window_w)
 
-            # Periodically update the stream while the agent task is running
-            while not agent_task.done():
-                try:
-                    encoded_screenshot = await capture_screenshot(_global_browser_context)
-                    if encoded_screenshot is not None:
-                        html_content = f'<img src="data:image/jpeg;base64,{encoded_screenshot}" style="width:{stream_vw}vw; height:{stream_vh}vh ; border:1px solid #ccc;">'
-                    else:
-                        html_content = f"<h1 style='width:{stream_vw}vw; height:{stream_vh}vh'>Waiting for browser session...</h1>"
-                except Exception as e:
-                    html_content = f"<h1 style='width:{stream_vw}vw; height:{stream_vh}vh'>Waiting for browser session...</h1>"
-
-                if _global_agent_state and _global_agent_state.is_stop_requested():
+            # Update the stream while the agent task is running
+            async for frame in frame_bus.subscribe(timeout=0.5):
+                if agent_task.done():
+                    break
+                if stream_screencast and _global_browser_context is not None and (
+                        screencast is None or screencast.browser_context is not _global_browser_context):
+                    if screencast is not None:
+                        screencast_task.cancel()
+                        await screencast.stop()
+                    screencast = PageScreencast(
+                        _global_browser_context,
+                        max_fps=stream_max_fps,
+                        max_width=stream_max_width,
+                        max_height=stream_max_height,
+                        quality=stream_quality,
+                    )
+                    screencast_task = asyncio.create_task(screencast.publish_to(frame_bus))
+
+                stop_requested = _global_agent_state and _global_agent_state.is_stop_requested()
+                if frame is not None:
+                    html_content = f'<img src="data:image/{frame.image_format};base64,{frame.data}" style="width:{stream_vw}vw; height:{stream_vh}vh ; border:1px solid #ccc;">'
+                elif not stop_requested:
+                    # nothing changed on the page, keep showing the last frame
+                    continue
+
+                if stop_requested:
                     yield [
                         html_content,
                         final_result,
@@ -734,7 +940,10 @@ async def run_with_stream(
                         True,  # stop_button interactive
                         True  # Re-enable run button
                     ]
-                await asyncio.sleep(0.05)
+
+            if screencast is not None:
+                screencast_task.cancel()
+                await screencast.stop()
 
             # Once the agent task completes, get the results
             try:
@@ -783,14 +992,20 @@ async def close_global_browser():
     if _global_browser:
         await _global_browser.close()
         _global_browser = None
+    _browser_supervisor.browser_closed()
         
-async def run_deep_search(research_task, max_search_iteration_input, max_query_per_iter_input, llm_provider, llm_model_name, llm_num_ctx, llm_temperature, llm_base_url, llm_api_key, use_vision, use_own_browser, headless, chrome_cdp):
+async def run_deep_search(research_task, max_search_iteration_input, max_query_per_iter_input, llm_provider, llm_model_name, llm_num_ctx, llm_temperature, llm_base_url, llm_api_key, use_vision, use_own_browser, headless, chrome_cdp,
+                          resource_policy="auto", resource_allowed_domains="",
+                          http_cache=False, http_cache_dir="./tmp/http_cache", http_cache_max_mb=512,
+                          use_jina_reader=False, page_cache=True, resume_task_id="", research_id="",
+                          parallel_report_sections=False, report_callback=None):
     from src.utils.deep_research import deep_research
     global _global_agent_state
 
     # Clear any previous stop request
     _global_agent_state.clear_stop()
-    
+    _secret_store.refresh()
+
     llm = utils.get_llm_model(
             provider=llm_provider,
             model_name=llm_model_name,
@@ -805,11 +1020,43 @@ async def run_deep_search(research_task, max_search_iteration_input, max_query_p
                                                         use_vision=use_vision,
                                                         headless=headless,
                                                         use_own_browser=use_own_browser,
-                                                        chrome_cdp=chrome_cdp
+                                                        chrome_cdp=chrome_cdp,
+                                                        resource_policy=ResourcePolicy.from_config(
+                                                            resource_policy, resource_allowed_domains,
+                                                            use_vision=use_vision),
+                                                        http_cache=get_http_cache(http_cache_dir, http_cache_max_mb)
+                                                        if http_cache else None,
+                                                        use_jina_reader=use_jina_reader,
+                                                        page_cache=page_cache,
+                                                        resume_task_id=resume_task_id or None,
+                                                        task_id=research_id or None,
+                                                        parallel_report_sections=parallel_report_sections,
+                                                        report_callback=report_callback
                                                         )
     
     return markdown_content, file_path, "Stop", True, True
 
+async def run_deep_search_stream(research_task, max_search_iteration_input, max_query_per_iter_input, llm_provider, llm_model_name, llm_num_ctx, llm_temperature, llm_base_url, llm_api_key, use_vision, use_own_browser, headless, chrome_cdp,
+                                 parallel_report_sections=False):
+    """Like run_deep_search, shows the report while it is written"""
+    partial_report = {"content": None, "version": 0}
+
+    def on_report_progress(content):
+        partial_report["content"] = content
+        partial_report["version"] += 1
+
+    search_task = asyncio.create_task(run_deep_search(
+        research_task, max_search_iteration_input, max_query_per_iter_input, llm_provider, llm_model_name,
+        llm_num_ctx, llm_temperature, llm_base_url, llm_api_key, use_vision, use_own_browser, headless, chrome_cdp,
+        parallel_report_sections=parallel_report_sections, report_callback=on_report_progress))
+    shown_version = 0
+    while not search_task.done():
+        await asyncio.sleep(0.5)
+        if partial_report["version"] != shown_version:
+            shown_version = partial_report["version"]
+            yield partial_report["content"], None, "Stop", True, False
+    yield await search_task
+
 def list_recordings(save_recording_path):
     if not os.path.exists(save_recording_path):
         return []